@@ -2,21 +2,49 @@
 
 import os
 import sys
-import pygame
 import traceback
 import argparse
-from src.main import main
 
 def parse_arguments():
     parser = argparse.ArgumentParser(description='Q-Quest! - A Turn Based RPG')
     parser.add_argument('--debug', action='store_true', help='Enable debug mode')
+    parser.add_argument('--asset-cache-mb', type=int, default=64, help='Memory budget in MB for cached images')
+    parser.add_argument('--dirty-rects', action='store_true', help='Only redraw changed screen regions on the map and combat screens')
+    parser.add_argument('--profile-output', metavar='PATH', help='Write frame phase timings to PATH (.csv for every frame, otherwise a JSON summary) on exit')
+    parser.add_argument('--hints', action='store_true', help='Show the chance of winning and the best action in combat')
+    parser.add_argument('--seed', type=int, help='Seed for the dice, so a session can be played again')
+    parser.add_argument('--record', metavar='PATH', help='Record the seed and input of the session to PATH (.qqr)')
+    parser.add_argument('--replay', metavar='PATH', help='Play a recorded session back headless and as fast as possible, exits with status 1 if it diverges')
     return parser.parse_args()
 
-try:
+if __name__ == "__main__":
+    # Guarded so worker processes (map previews) can import this module
     args = parse_arguments()
-    main(debug_mode=args.debug)
-except Exception as e:
-    print(f"Error running game: {e}")
-    print(traceback.format_exc())
-    pygame.quit()
-    sys.exit(1)
+    if args.replay:
+        # Replays run headless, set before pygame is initialized by src.main
+        os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+        os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+    import pygame
+    from src.main import main
+    from src.replay import InputPlayer, ReplayFinished
+
+    try:
+        if args.replay:
+            replay = InputPlayer(args.replay)
+            try:
+                main(debug_mode=args.debug, asset_cache_mb=args.asset_cache_mb,
+                     dirty_rects=replay.settings.get('dirty_rects', args.dirty_rects),
+                     profile_output=args.profile_output, hints=replay.settings.get('hints', args.hints),
+                     replay=replay)
+            except (SystemExit, ReplayFinished):
+                pass
+            sys.exit(0 if replay.finish() else 1)
+
+        main(debug_mode=args.debug, asset_cache_mb=args.asset_cache_mb, dirty_rects=args.dirty_rects,
+             profile_output=args.profile_output, hints=args.hints, seed=args.seed, record_path=args.record)
+    except Exception as e:
+        print(f"Error running game: {e}")
+        print(traceback.format_exc())
+        pygame.quit()
+        sys.exit(1)
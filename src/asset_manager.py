@@ -0,0 +1,300 @@
+import os
+from collections import OrderedDict
+
+import pygame
+from PIL import Image
+
+
+class AssetManager:
+    """
+    Shared cache of loaded, converted and scaled images.
+
+    Each (path, size) pair is decoded and scaled once and kept in an LRU cache whose
+    budget is measured in decoded surface bytes. Fallback chains such as
+    icon -> image -> placeholder are resolved once and the result is remembered.
+    """
+    def __init__(self, budget_bytes=64 * 1024 * 1024):
+        """
+        Initialize the AssetManager
+
+        Args:
+            budget_bytes: Maximum number of decoded surface bytes to keep cached
+        """
+        self.budget_bytes = budget_bytes
+        self.used_bytes = 0
+        self.images = OrderedDict()
+        self.failed = set()
+        self.fallbacks = {}
+        self.packed = {}
+        self.debug_mode = False
+
+        # Counters reported in debug mode
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def set_budget(self, budget_bytes):
+        """
+        Change the memory budget, evicting images if the cache is now over it
+
+        Args:
+            budget_bytes: Maximum number of decoded surface bytes to keep cached
+        """
+        self.budget_bytes = budget_bytes
+        self._evict()
+
+    def load_image(self, path, size=None):
+        """
+        Get an image, loading and scaling it on first use
+
+        Args:
+            path: Path to the image file
+            size: Optional (width, height) to scale the image to
+
+        Returns:
+            A pygame Surface, or None if the image could not be loaded
+        """
+        if size is not None:
+            size = (int(size[0]), int(size[1]))
+        # The same file is reached through differently joined paths, e.g. "dir/images/x.png"
+        path = os.path.normpath(path)
+        key = (path, size)
+
+        image = self.images.get(key)
+        if image is not None:
+            self.hits += 1
+            self.images.move_to_end(key)
+            return image
+
+        if path in self.failed:
+            self.hits += 1
+            return None
+
+        self.misses += 1
+        try:
+            image = self._load_packed(path, size)
+            if image is None:
+                image = pygame.image.load(path)
+        except Exception as e:
+            print(f"Error loading image {path}: {e}")
+            self.failed.add(path)
+            return None
+
+        if size is not None and image.get_size() != size:
+            image = pygame.transform.scale(image, size)
+
+        # Convert to the display format so blits are fast
+        image = convert_image(image)
+
+        self.add_image(path, size, image)
+        return image
+
+    def add_image(self, path, size, image):
+        """
+        Put an already created image into the cache
+
+        Args:
+            path: Path the image was loaded from
+            size: The (width, height) it was scaled to, or None for its natural size
+            image: The pygame Surface to cache
+        """
+        path = os.path.normpath(path)
+        key = (path, size)
+        if key in self.images:
+            self.used_bytes -= surface_bytes(self.images.pop(key))
+        self.images[key] = image
+        self.used_bytes += surface_bytes(image)
+        self.failed.discard(path)
+        self._evict(keep=key)
+
+    def add_packed_images(self, images):
+        """
+        Register already decoded images, such as those in a compiled level bundle
+
+        Loading one of these paths uses the decoded image instead of reading the file,
+        and an image pre-scaled to the requested size skips scaling too.
+
+        Args:
+            images: Dictionary of (path, size) to a pygame Surface, where size is None
+                for an image at its own size
+        """
+        for (path, size), image in images.items():
+            self.packed[(os.path.normpath(os.path.abspath(path)), size)] = image
+
+    def remove_packed_images(self, keys):
+        """
+        Unregister decoded images, e.g. when the level bundle holding them is closed
+
+        Args:
+            keys: (path, size) keys the images were registered with
+        """
+        for path, size in keys:
+            self.packed.pop((os.path.normpath(os.path.abspath(path)), size), None)
+
+    def has_image(self, path, size=None):
+        """
+        Check if an image is cached or can be made from a registered decoded image
+
+        Args:
+            path: Path to the image file
+            size: Optional (width, height) the image is scaled to
+
+        Returns:
+            True if loading the image won't read the file
+        """
+        return (os.path.normpath(path), size) in self.images or self._load_packed(path, size) is not None
+
+    def load_first(self, paths, size=None):
+        """
+        Get the first image in a fallback chain that can be loaded
+
+        The chain is only walked the first time, after that the path that worked
+        (or the fact that none did) is remembered.
+
+        Args:
+            paths: Candidate image paths in order of preference, None entries are skipped
+            size: Optional (width, height) to scale the image to
+
+        Returns:
+            A pygame Surface, or None if no image in the chain could be loaded
+        """
+        chain = tuple(path for path in paths if path)
+        if chain in self.fallbacks:
+            resolved = self.fallbacks[chain]
+            return self.load_image(resolved, size) if resolved else None
+
+        for path in chain:
+            if not os.path.exists(path):
+                continue
+            image = self.load_image(path, size)
+            if image is not None:
+                self.fallbacks[chain] = path
+                return image
+
+        self.fallbacks[chain] = None
+        return None
+
+    def clear(self):
+        """
+        Drop all cached images and remembered fallbacks
+        """
+        self.images.clear()
+        self.failed.clear()
+        self.fallbacks.clear()
+        self.used_bytes = 0
+
+    def stats(self):
+        """
+        Get the cache counters
+
+        Returns:
+            Dictionary with hits, misses, evictions, image count and bytes used
+        """
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'images': len(self.images),
+            'used_bytes': self.used_bytes,
+            'budget_bytes': self.budget_bytes
+        }
+
+    def report(self):
+        """
+        Print the cache counters when debug mode is enabled
+        """
+        if self.debug_mode:
+            stats = self.stats()
+            print(f"Asset cache: {stats['hits']} hits, {stats['misses']} misses, "
+                  f"{stats['evictions']} evictions, {stats['images']} images, "
+                  f"{stats['used_bytes'] / (1024 * 1024):.1f}/{stats['budget_bytes'] / (1024 * 1024):.1f} MB")
+
+    def _load_packed(self, path, size):
+        # Find a registered decoded image, preferring one already at the requested size
+        if not self.packed:
+            return None
+        path = os.path.normpath(os.path.abspath(path))
+        image = self.packed.get((path, size))
+        if image is None:
+            image = self.packed.get((path, None))
+        return image
+
+    def _evict(self, keep=None):
+        # Drop least recently used images until we are within budget
+        while self.used_bytes > self.budget_bytes and self.images:
+            key = next(iter(self.images))
+            if key == keep:
+                # Never evict the image that was just added, even if it is over budget on its own
+                if len(self.images) == 1:
+                    break
+                self.images.move_to_end(key)
+                continue
+            self.used_bytes -= surface_bytes(self.images.pop(key))
+            self.evictions += 1
+
+
+def decode_image(path):
+    """
+    Decode an image file with Pillow, which is safe to do off the main thread
+
+    Args:
+        path: Path to the image file
+
+    Returns:
+        Tuple of (pixel format, (width, height), pixel bytes), where the format is
+        'RGB' or 'RGBA'
+    """
+    with Image.open(path) as image:
+        if image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info:
+            pixel_format = 'RGBA'
+        else:
+            pixel_format = 'RGB'
+        return pixel_format, image.size, image.convert(pixel_format).tobytes()
+
+
+def decoded_surface(decoded):
+    """
+    Create a surface from an image decoded by decode_image
+
+    Args:
+        decoded: Tuple returned by decode_image
+
+    Returns:
+        A pygame Surface using the decoded bytes as its pixels
+    """
+    pixel_format, size, data = decoded
+    return pygame.image.frombuffer(data, size, pixel_format)
+
+
+def convert_image(image):
+    """
+    Convert an image to the display format so blits are fast
+
+    Args:
+        image: A pygame Surface
+
+    Returns:
+        The converted Surface, or the same one if there is no display yet
+    """
+    if pygame.display.get_surface() is None:
+        return image
+    if image.get_flags() & pygame.SRCALPHA:
+        return image.convert_alpha()
+    return image.convert()
+
+
+def surface_bytes(surface):
+    """
+    Get the number of bytes of pixel data held by a surface
+
+    Args:
+        surface: A pygame Surface
+
+    Returns:
+        The decoded size of the surface in bytes
+    """
+    return surface.get_pitch() * surface.get_height()
+
+
+# Shared asset manager used by all screens
+asset_manager = AssetManager()
@@ -0,0 +1,272 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy
+
+from src import combat
+from src.combat import ENEMY_HEAL_HEALTH, MAX_HEALTH, CombatState, heal_amount, hit_damage, prepare_enemy
+from src.combat_solver import combat_solver
+from src.level_catalog import LEVELS_DIR, natural_key
+
+# Fights per (player, enemy) pair, the shipped levels have 10 pairs
+DEFAULT_FIGHTS = 100000
+
+# Fights still undecided after this many turns are abandoned
+MAX_TURNS = 100
+
+# Every outcome of 2d6, indexed by a uniform draw from 0-35
+TWO_D6 = numpy.add.outer(numpy.arange(1, 7), numpy.arange(1, 7)).ravel().astype(numpy.int16)
+
+
+def roll_2d6(rng, count, modifier=0):
+    """
+    Roll 2d6 + modifier for many fights at once
+
+    Args:
+        rng: numpy random Generator
+        count: Number of rolls
+        modifier: Added to every roll
+
+    Returns:
+        int16 array of totals
+    """
+    return TWO_D6[rng.integers(0, 36, count)] + numpy.int16(modifier)
+
+
+def _lookup_table(function, low, high):
+    # Table of function(value) for low <= value <= high, indexed by value - low
+    return numpy.array([function(value) for value in range(low, high + 1)], dtype=numpy.int16)
+
+
+def attack_policy(player_health, has_heal_item):
+    """
+    Always attack (vectorized combat.attack_policy)
+
+    Args:
+        player_health: Array of the player's health in each fight
+        has_heal_item: Whether the player has a healing item
+
+    Returns:
+        Bool array, True where the player heals
+    """
+    return numpy.zeros(player_health.shape, dtype=bool)
+
+
+def heal_when_low_policy(player_health, has_heal_item):
+    """
+    Heal at ENEMY_HEAL_HEALTH or less when there is a healing item (vectorized
+    combat.heal_when_low_policy)
+
+    Args:
+        player_health: Array of the player's health in each fight
+        has_heal_item: Whether the player has a healing item
+
+    Returns:
+        Bool array, True where the player heals
+    """
+    if not has_heal_item:
+        return numpy.zeros(player_health.shape, dtype=bool)
+    return player_health <= ENEMY_HEAL_HEALTH
+
+
+# Player policies by the name used on the command line
+POLICIES = {
+    'attack': attack_policy,
+    'heal-when-low': heal_when_low_policy,
+}
+
+# The same policies in the combat engine, used to work out the exact win rate
+ENGINE_POLICIES = {
+    'attack': combat.attack_policy,
+    'heal-when-low': combat.heal_when_low_policy,
+}
+
+
+def simulate(state, fights, policy=attack_policy, seed=None, max_turns=MAX_TURNS):
+    """
+    Play many fights from the same starting state at once
+
+    Follows the same rules as combat.resolve_turn, with every fight's health kept in
+    arrays. Fights that are decided drop out of the arrays, so later turns only
+    cost as much as the fights still going.
+
+    Args:
+        state: Starting CombatState, left unchanged
+        fights: Number of fights
+        policy: Vectorized policy, see POLICIES
+        seed: Seed of the random number generator, or None for a random seed
+        max_turns: Turns after which a fight is abandoned
+
+    Returns:
+        Dictionary of arrays with one entry per fight: 'winner' (0 abandoned,
+        1 player, 2 enemy), 'turns', 'player_health' and 'enemy_health'
+    """
+    rng = numpy.random.default_rng(seed)
+    player = state.player
+    enemy = state.enemy
+    has_heal_item = player.heal_modifier is not None
+
+    # Damage for every possible margin and healing for every possible heal roll,
+    # worked out with the scalar rules so both simulators always agree
+    modifiers = [player.attack_modifier, player.defense_modifier, enemy.attack_modifier, enemy.defense_modifier]
+    margin_low = 2 - 12 + min(modifiers) - max(modifiers)
+    damage_table = _lookup_table(lambda margin: hit_damage(margin, 0), margin_low, -margin_low)
+    heal_low = 2 + min(player.heal_modifier or 0, enemy.heal_modifier or 0)
+    heal_table = _lookup_table(heal_amount, heal_low, heal_low + 10 + abs((player.heal_modifier or 0) -
+                                                                        (enemy.heal_modifier or 0)))
+
+    player_health = numpy.full(fights, player.health, dtype=numpy.int16)
+    enemy_health = numpy.full(fights, enemy.health, dtype=numpy.int16)
+    turns = numpy.zeros(fights, dtype=numpy.int16)
+    winner = numpy.zeros(fights, dtype=numpy.int8)
+    active = numpy.arange(fights)
+
+    turn = 0
+    while active.size and turn < max_turns:
+        count = active.size
+        player_hp = player_health[active]
+        enemy_hp = enemy_health[active]
+
+        # Player's action
+        heal = policy(player_hp, has_heal_item)
+        attack = ~heal
+        margin = roll_2d6(rng, count, player.attack_modifier) - roll_2d6(rng, count, enemy.defense_modifier)
+        enemy_hp = numpy.where(attack, numpy.maximum(0, enemy_hp - damage_table[margin - margin_low]), enemy_hp)
+        if has_heal_item:
+            healing = heal_table[roll_2d6(rng, count, player.heal_modifier) - heal_low]
+            player_hp = numpy.where(heal, numpy.minimum(MAX_HEALTH, player_hp + healing), player_hp)
+        player_won = attack & (enemy_hp <= 0)
+
+        # Enemy's reply, unless it was defeated
+        reply = enemy_hp > 0
+        if enemy.heal_modifier is not None:
+            enemy_heal = reply & (enemy_hp <= ENEMY_HEAL_HEALTH)
+            healing = heal_table[roll_2d6(rng, count, enemy.heal_modifier) - heal_low]
+            enemy_hp = numpy.where(enemy_heal, numpy.minimum(MAX_HEALTH, enemy_hp + healing), enemy_hp)
+            reply &= ~enemy_heal
+        margin = roll_2d6(rng, count, enemy.attack_modifier) - roll_2d6(rng, count, player.defense_modifier)
+        player_hp = numpy.where(reply, numpy.maximum(0, player_hp - damage_table[margin - margin_low]), player_hp)
+        enemy_won = reply & (player_hp <= 0)
+
+        turn += 1
+        player_health[active] = player_hp
+        enemy_health[active] = enemy_hp
+        turns[active] = turn
+        winner[active[player_won]] = 1
+        winner[active[enemy_won]] = 2
+        active = active[~(player_won | enemy_won)]
+
+    return {'winner': winner, 'turns': turns, 'player_health': player_health, 'enemy_health': enemy_health}
+
+
+def summarize(results):
+    """
+    Summarise simulated fights
+
+    Args:
+        results: Arrays returned by simulate()
+
+    Returns:
+        Dictionary with the number of 'fights', 'win_rate', 'loss_rate' and
+        'abandoned_rate', the mean, median and 95th percentile of 'turns', and the
+        fraction of fights ending at each player and enemy health
+    """
+    fights = len(results['winner'])
+    winner = numpy.bincount(results['winner'], minlength=3) / fights
+    turns = results['turns']
+    return {
+        'fights': fights,
+        'win_rate': round(float(winner[1]), 4),
+        'loss_rate': round(float(winner[2]), 4),
+        'abandoned_rate': round(float(winner[0]), 4),
+        'turns_mean': round(float(turns.mean()), 3),
+        'turns_p50': int(numpy.percentile(turns, 50)),
+        'turns_p95': int(numpy.percentile(turns, 95)),
+        'player_health': _distribution(results['player_health']),
+        'enemy_health': _distribution(results['enemy_health'])
+    }
+
+
+def _distribution(health):
+    # Fraction of fights ending at each health value, leaving out ones that never happen
+    counts = numpy.bincount(health)
+    return {str(value): round(count / len(health), 4) for value, count in enumerate(counts) if count}
+
+
+def load_level_fights(levels_dir=LEVELS_DIR, level_ids=None):
+    """
+    Read the (player, enemy) pairs of every level from its level.json
+
+    Args:
+        levels_dir: Directory containing the level directories
+        level_ids: Ids of the levels to read, or None for all
+
+    Returns:
+        List of (level id, enemy name, CombatState) in level directory order
+    """
+    pairs = []
+    for name in sorted(os.listdir(levels_dir), key=natural_key):
+        level_json_path = os.path.join(levels_dir, name, "level.json")
+        if not os.path.exists(level_json_path):
+            continue
+        with open(level_json_path, 'r') as f:
+            level_data = json.load(f)
+        if level_ids and level_data.get('id') not in level_ids:
+            continue
+        for enemy_data in level_data.get('enemies', []):
+            state = CombatState.from_game(level_data.get('player', {}), prepare_enemy(dict(enemy_data)))
+            pairs.append((level_data.get('id', name), state.enemy.name, state))
+    return pairs
+
+
+def main(argv=None):
+    """
+    Simulate every fight of the installed levels and print the results
+
+    Args:
+        argv: Command line arguments, defaults to sys.argv[1:]
+    """
+    parser = argparse.ArgumentParser(description='Monte Carlo combat simulator for balancing levels')
+    parser.add_argument('--levels-dir', default=LEVELS_DIR, help='Directory containing the level directories')
+    parser.add_argument('--level', action='append', help='Id of a level to simulate (repeatable, default: all)')
+    parser.add_argument('--fights', type=int, default=DEFAULT_FIGHTS, help='Fights per player and enemy pair')
+    parser.add_argument('--policy', choices=sorted(POLICIES), default='attack', help="The player's strategy")
+    parser.add_argument('--seed', type=int, help='Seed for reproducible results')
+    parser.add_argument('--max-turns', type=int, default=MAX_TURNS, help='Turns after which a fight is abandoned')
+    parser.add_argument('--output', help='Write the results as JSON to this file')
+    args = parser.parse_args(argv)
+
+    pairs = load_level_fights(args.levels_dir, args.level)
+    if not pairs:
+        print("No fights found!")
+        return 1
+
+    results = []
+    start = time.perf_counter()
+    for i, (level_id, enemy_name, state) in enumerate(pairs):
+        # Each pair gets its own stream, so adding a level doesn't change the others
+        seed = None if args.seed is None else [args.seed, i]
+        summary = summarize(simulate(state, args.fights, POLICIES[args.policy], seed, args.max_turns))
+        summary.update({'level': level_id, 'enemy': enemy_name})
+        summary['exact_win_rate'] = round(combat_solver.policy_win_probability(state, ENGINE_POLICIES[args.policy]), 4)
+        results.append(summary)
+
+        health = ' '.join(f"{value}:{fraction * 100:.0f}%" for value, fraction in summary['player_health'].items())
+        print(f"{level_id:12} {enemy_name:20} win {summary['win_rate'] * 100:6.2f}% "
+              f"(exact {summary['exact_win_rate'] * 100:6.2f}%)  "
+              f"turns {summary['turns_mean']:5.2f} (p95 {summary['turns_p95']:2})  player health {health}")
+    elapsed = time.perf_counter() - start
+    print(f"{len(pairs) * args.fights} fights in {elapsed:.2f} s")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'policy': args.policy, 'fights': args.fights, 'results': results}, f, indent=2)
+        print(f"Results written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
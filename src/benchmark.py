@@ -0,0 +1,498 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+# Benchmarks run headless
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import pygame
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, peak RSS is not reported there
+    resource = None
+
+from src import combat_screen, game_over_screen, level_selection_screen, loot_screen, map_screen, title_screen, ui
+from src.collision import get_walkability_grid
+from src.combat import CombatState, prepare_enemy, roll_dice, simulate_fight
+from src.frame_scheduler import frame_scheduler
+from src.level_catalog import level_catalog
+from src.map_renderer import load_map
+from src.profiler import percentile
+from src.replay import HeldKeys
+from src.ui import WIDTH, HEIGHT
+
+RESULTS_VERSION = 1
+
+# Frames measured per screen, and of those, frames traced for allocations
+DEFAULT_FRAMES = 300
+ALLOCATION_FRAMES = 60
+
+# Frame length screens see, so timers and movement advance as they would at 60 FPS
+SIMULATED_FRAME_MS = 16
+
+# Slowdown beyond which a result counts as a regression, and the smallest
+# difference that counts at all (so tiny timings don't trip on noise)
+DEFAULT_THRESHOLD = 0.25
+MIN_FRAME_DIFF_MS = 0.1
+MIN_MICRO_DIFF_US = 0.5
+
+
+class _StopScreen(BaseException):
+    # Raised from the scripted event source to leave a screen's loop, a BaseException
+    # so the screens' error handling doesn't catch it
+    pass
+
+
+class ScreenDriver:
+    """
+    Runs a screen's own loop with scripted input and times every frame.
+
+    frame_scheduler.get_events and tick are replaced, so each frame is measured from
+    one tick to the next (events, update, draw and display update) and no time is
+    spent sleeping or waiting for input. The frame a screen is entered on is not
+    measured, so its setup doesn't count. pygame.mouse.get_pos and
+    pygame.key.get_pressed follow the script too.
+    """
+    def __init__(self, frames, script, trace_allocations=False):
+        """
+        Initialize the ScreenDriver
+
+        Args:
+            frames: Number of frames to run
+            script: Function taking the frame number and returning a tuple of
+                (events, mouse position, held keys)
+            trace_allocations: Whether to record allocations per frame with tracemalloc
+        """
+        self.frames = frames
+        self.script = script
+        self.trace_allocations = trace_allocations
+        self.frame = 0
+        self.frame_start = None
+        self.mouse_pos = (0, 0)
+        self.keys = HeldKeys()
+        self.times = []
+        self.allocations = []
+        self.blocks = 0
+
+    def run(self, screen_function):
+        """
+        Run a screen until the scripted frames are done, entering it again if it returns
+
+        Args:
+            screen_function: Function that runs the screen's loop
+
+        Returns:
+            Self, with times (seconds per frame) and allocations (bytes per frame) filled in
+        """
+        originals = (frame_scheduler.get_events, frame_scheduler.tick, pygame.mouse.get_pos, pygame.key.get_pressed)
+        frame_scheduler.get_events = self._get_events
+        frame_scheduler.tick = self._tick
+        pygame.mouse.get_pos = lambda: self.mouse_pos
+        pygame.key.get_pressed = lambda: self.keys
+
+        if self.trace_allocations:
+            tracemalloc.start()
+        start_blocks = sys.getallocatedblocks()
+        try:
+            while self.frame < self.frames:
+                self.frame_start = None
+                try:
+                    screen_function()
+                except _StopScreen:
+                    break
+        finally:
+            self.blocks = sys.getallocatedblocks() - start_blocks
+            if self.trace_allocations:
+                tracemalloc.stop()
+            (frame_scheduler.get_events, frame_scheduler.tick,
+             pygame.mouse.get_pos, pygame.key.get_pressed) = originals
+        return self
+
+    def _get_events(self):
+        if self.frame >= self.frames:
+            raise _StopScreen()
+
+        # Drop real events, the screen only sees the script's
+        pygame.event.get()
+        events, mouse_pos, keys = self.script(self.frame)
+        if mouse_pos is not None:
+            self.mouse_pos = mouse_pos
+        self.keys = HeldKeys(keys)
+
+        return events
+
+    def _tick(self, busy=False, animating=False):
+        if self.frame_start is not None:
+            self.times.append(time.perf_counter() - self.frame_start)
+            if self.trace_allocations:
+                self.allocations.append(tracemalloc.get_traced_memory()[1] - self.traced_start)
+            self.frame += 1
+
+        frame_scheduler.frame_time = SIMULATED_FRAME_MS
+        frame_scheduler.total_frames += 1
+
+        # The next frame starts now
+        if self.trace_allocations:
+            tracemalloc.reset_peak()
+            self.traced_start = tracemalloc.get_traced_memory()[0]
+        self.frame_start = time.perf_counter()
+
+
+def peak_rss_mb():
+    """
+    Get the peak resident set size of this process
+
+    Returns:
+        Peak RSS in MB, or None where the resource module isn't available
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes elsewhere
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def mouse_sweep(frame, rng):
+    # Mouse motion over the whole screen, so buttons and boxes are hovered in turn
+    pos = (rng.randrange(WIDTH), rng.randrange(HEIGHT))
+    return [pygame.event.Event(pygame.MOUSEMOTION, pos=pos, rel=(0, 0), buttons=(0, 0, 0))], pos
+
+
+def make_character_data(level_data):
+    """
+    Build the character data main.py passes to the map screen for a level
+
+    Args:
+        level_data: Full level definition
+
+    Returns:
+        Character data dictionary
+    """
+    character_data = json.loads(json.dumps(level_data['player']))
+    character_data['level'] = {
+        'id': level_data['id'],
+        'name': level_data['name'],
+        'path': level_data['path'],
+        'directory': level_data['directory'],
+        'starting_position': level_data['starting_position'],
+        'wall_tiles': level_data['wall_tiles'],
+        'enemies': level_data['enemies'],
+        'image': f"{level_data['directory']}/{level_data.get('player', {}).get('image', 'placeholder.png')}"
+    }
+    return character_data
+
+
+def screen_benchmarks(screen, level_data):
+    """
+    Get the screens to benchmark with their input scripts
+
+    Args:
+        screen: The display surface
+        level_data: Full definition of the level the game screens use
+
+    Returns:
+        Dictionary of name to (function that runs the screen, script factory), where the
+        script factory takes a seeded Random and returns a ScreenDriver script
+    """
+    enemy = level_data['enemies'][0] if level_data.get('enemies') else {'name': 'Dummy', 'health': 5}
+
+    def title_script(rng):
+        # Idle, only the pulsing prompt animates
+        return lambda frame: ([], None, ())
+
+    def level_selection_script(rng):
+        def script(frame):
+            events, pos = mouse_sweep(frame, rng)
+            if frame % 10 == 0:
+                events.append(pygame.event.Event(pygame.MOUSEWHEEL, x=0, y=rng.choice((-1, 1)), flipped=False))
+            return events, pos, ()
+        return script
+
+    def map_script(rng):
+        # Walk in a random direction for a few frames at a time
+        directions = (pygame.K_w, pygame.K_a, pygame.K_s, pygame.K_d)
+        held = [rng.choice(directions)]
+
+        def script(frame):
+            if frame % 8 == 0:
+                held[0] = rng.choice(directions)
+            return [], None, (held[0],)
+        return script
+
+    def combat_script(rng):
+        # Hover the action buttons and change the shown health with the number keys
+        health_keys = (pygame.K_1, pygame.K_2, pygame.K_3, pygame.K_4, pygame.K_5)
+
+        def script(frame):
+            events, pos = mouse_sweep(frame, rng)
+            return events, pos, (health_keys[(frame // 20) % len(health_keys)],)
+        return script
+
+    def hover_script(rng):
+        return lambda frame: mouse_sweep(frame, rng) + ((),)
+
+    def run_map():
+        map_screen.map_screen(screen, make_character_data(level_data))
+
+    def run_combat():
+        character_data = make_character_data(level_data)
+        character_data['current_enemy'] = dict(enemy)
+        character_data['start_combat'] = True
+        combat_screen.main_game_screen(screen, character_data)
+
+    return {
+        'title_screen': (lambda: title_screen.title_screen(screen), title_script),
+        'level_selection_screen': (lambda: level_selection_screen.level_selection_screen(screen), level_selection_script),
+        'map_screen': (run_map, map_script),
+        'combat_screen': (run_combat, combat_script),
+        'loot_screen': (lambda: loot_screen.loot_screen(screen, make_character_data(level_data), dict(enemy)), hover_script),
+        'game_over_screen': (lambda: game_over_screen.game_over_screen(screen, make_character_data(level_data), 0),
+                             hover_script),
+    }
+
+
+def benchmark_screen(run_screen, make_script, frames, seed=0):
+    """
+    Benchmark a screen: a timed run, then a shorter run traced for allocations
+
+    Args:
+        run_screen: Function that runs the screen
+        make_script: Script factory taking a seeded Random
+        frames: Number of frames to time
+        seed: Seed for the scripted input
+
+    Returns:
+        Dictionary of frame time percentiles in ms, allocations and peak RSS
+    """
+    timed = ScreenDriver(frames, make_script(random.Random(seed))).run(run_screen)
+    traced = ScreenDriver(min(frames, ALLOCATION_FRAMES), make_script(random.Random(seed)),
+                          trace_allocations=True).run(run_screen)
+
+    times = [t * 1000 for t in timed.times]
+    return {
+        'frames': len(times),
+        'mean_ms': round(sum(times) / len(times), 3) if times else 0,
+        'p50_ms': round(percentile(times, 0.50), 3),
+        'p95_ms': round(percentile(times, 0.95), 3),
+        'p99_ms': round(percentile(times, 0.99), 3),
+        'max_ms': round(max(times), 3) if times else 0,
+        'alloc_kb_per_frame': round(sum(traced.allocations) / len(traced.allocations) / 1024, 1)
+        if traced.allocations else 0,
+        'blocks_per_frame': round(timed.blocks / len(times), 1) if times else 0,
+        'peak_rss_mb': peak_rss_mb()
+    }
+
+
+def time_calls(function, min_time=0.2):
+    """
+    Time a function, calling it in batches until min_time has passed
+
+    Args:
+        function: Function taking no arguments
+        min_time: Seconds to spend timing
+
+    Returns:
+        Dictionary with the number of calls and the mean and best batch time per call in µs
+    """
+    # Size batches so each takes roughly a hundredth of min_time
+    batch = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(batch):
+            function()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time / 100 or batch >= 1 << 20:
+            break
+        batch *= 2
+
+    calls = 0
+    total = 0.0
+    best = None
+    while total < min_time:
+        start = time.perf_counter()
+        for _ in range(batch):
+            function()
+        elapsed = time.perf_counter() - start
+        calls += batch
+        total += elapsed
+        best = elapsed / batch if best is None else min(best, elapsed / batch)
+    return {'calls': calls, 'mean_us': round(total / calls * 1e6, 3), 'min_us': round(best * 1e6, 3)}
+
+
+def micro_benchmarks(screen, level_data, seed=0):
+    """
+    Time the hot paths on their own
+
+    Args:
+        screen: The display surface
+        level_data: Full definition of the level to use
+        seed: Seed for the random positions
+
+    Returns:
+        Dictionary of name to timing results (see time_calls)
+    """
+    rng = random.Random(seed)
+    map_path = os.path.join(level_data['directory'], level_data['path'])
+    tmx_data = load_map(map_path)
+    grid = get_walkability_grid(tmx_data, level_data['wall_tiles'])
+    positions = [(rng.randrange(-1, grid.width + 1), rng.randrange(-1, grid.height + 1)) for _ in range(1024)]
+    position_index = [0]
+
+    def walkable():
+        x, y = positions[position_index[0] & 1023]
+        position_index[0] += 1
+        map_screen.is_walkable(x, y, grid)
+
+    character_data = make_character_data(level_data)
+    character_data['health'] = 5
+    card_args = (screen, character_data, 30, 30, 300, 600)
+
+    def card_uncached():
+        ui.render_character_card(*card_args)
+
+    enemy_data = dict(level_data['enemies'][0]) if level_data.get('enemies') else {'name': 'Dummy', 'health': 5}
+    combat_state = CombatState.from_game(character_data, prepare_enemy(enemy_data))
+
+    results = {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        results['is_walkable'] = time_calls(walkable)
+        results['load_levels'] = time_calls(level_selection_screen.load_levels)
+        results['tmx_load'] = time_calls(lambda: load_map(map_path))
+        results['draw_character_card'] = time_calls(lambda: ui.draw_character_card(*card_args))
+        results['render_character_card'] = time_calls(card_uncached)
+        results['roll_dice'] = time_calls(lambda: roll_dice(2))
+        results['simulate_fight'] = time_calls(lambda: simulate_fight(combat_state.copy(), rng=rng))
+    return results
+
+
+def run_benchmarks(frames=DEFAULT_FRAMES, screens=None, level_id=None, verbose=False):
+    """
+    Run the screen and micro benchmarks
+
+    Args:
+        frames: Number of frames to time per screen
+        screens: Names of the screens to run, or None for all
+        level_id: Id of the level the game screens use, or None for the first level
+        verbose: Whether to show what the screens print
+
+    Returns:
+        Results dictionary, as saved to JSON
+    """
+    pygame.init()
+    screen = pygame.display.set_mode((WIDTH, HEIGHT))
+
+    levels = level_catalog.refresh()
+    entry = next((level for level in levels if level['id'] == level_id), None) if level_id else levels[0]
+    if entry is None:
+        raise ValueError(f"Level {level_id} not found")
+    with contextlib.redirect_stdout(io.StringIO()):
+        level_data = level_catalog.load_level(entry)
+
+    results = {
+        'version': RESULTS_VERSION,
+        'python': platform.python_version(),
+        'pygame': pygame.version.ver,
+        'platform': platform.platform(),
+        'level': level_data['id'],
+        'frames': frames,
+        'screens': {},
+        'micro': {}
+    }
+
+    for name, (run_screen, make_script) in screen_benchmarks(screen, level_data).items():
+        if screens and name not in screens:
+            continue
+        output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+        with output:
+            results['screens'][name] = benchmark_screen(run_screen, make_script, frames)
+        print(f"{name:24} p50 {results['screens'][name]['p50_ms']:8.3f} ms  "
+              f"p95 {results['screens'][name]['p95_ms']:8.3f} ms  p99 {results['screens'][name]['p99_ms']:8.3f} ms  "
+              f"{results['screens'][name]['alloc_kb_per_frame']:8.1f} KB/frame")
+
+    results['micro'] = micro_benchmarks(screen, level_data)
+    for name, result in results['micro'].items():
+        print(f"{name:24} mean {result['mean_us']:10.3f} µs  min {result['min_us']:10.3f} µs")
+    print(f"Peak RSS: {peak_rss_mb()} MB")
+    return results
+
+
+def compare_results(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    Compare results against a baseline run
+
+    Screens are compared on their p50 and p95 frame times and micro-benchmarks on
+    their best batch time, p99 and means move too much between runs to be useful here.
+
+    Args:
+        results: Results of this run
+        baseline: Results of the baseline run
+        threshold: Fractional slowdown counted as a regression, e.g. 0.15 for 15%
+
+    Returns:
+        List of (name, baseline value, new value) for every regression
+    """
+    regressions = []
+
+    def check(name, old, new, min_diff):
+        if old is None or new is None:
+            return
+        if new > old * (1 + threshold) and new - old > min_diff:
+            regressions.append((name, old, new))
+
+    for screen, result in results['screens'].items():
+        old = baseline.get('screens', {}).get(screen)
+        if old:
+            for metric in ('p50_ms', 'p95_ms'):
+                check(f"{screen} {metric}", old.get(metric), result[metric], MIN_FRAME_DIFF_MS)
+
+    for name, result in results['micro'].items():
+        old = baseline.get('micro', {}).get(name)
+        if old:
+            check(f"{name} min_us", old.get('min_us'), result['min_us'], MIN_MICRO_DIFF_US)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Q-Quest! headless benchmarks')
+    parser.add_argument('--frames', type=int, default=DEFAULT_FRAMES, help='Frames to time per screen')
+    parser.add_argument('--screens', help='Comma separated screens to run (default: all)')
+    parser.add_argument('--level', help='Id of the level the game screens use (default: the first level)')
+    parser.add_argument('--output', help='Write the results to this JSON file')
+    parser.add_argument('--baseline', help='Compare against the results in this JSON file')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='Slowdown counted as a regression, as a fraction (default: 0.25)')
+    parser.add_argument('--verbose', action='store_true', help="Show what the screens print")
+    args = parser.parse_args(argv)
+
+    screens = args.screens.split(',') if args.screens else None
+    results = run_benchmarks(args.frames, screens, args.level, args.verbose)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        regressions = compare_results(results, baseline, args.threshold)
+        for name, old, new in regressions:
+            print(f"REGRESSION {name}: {old} -> {new} ({(new / old - 1) * 100:+.0f}%)")
+        if regressions:
+            return 1
+        print(f"No regressions beyond {args.threshold * 100:.0f}% against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,180 @@
+import numpy
+
+# Tiled stores flip flags in the top bits of a gid
+GID_MASK = 0x1FFFFFFF
+
+
+class WalkabilityGrid:
+    """
+    Compact collision grid for a map, one byte per tile (1 = walkable, 0 = wall).
+
+    The grid is computed once when a level is loaded so walkability checks are a
+    single index, and the same grid can be used for pathfinding, minimaps and
+    validation tools.
+    """
+    def __init__(self, width, height, cells=None):
+        """
+        Initialize the WalkabilityGrid
+
+        Args:
+            width: Map width in tiles
+            height: Map height in tiles
+            cells: Optional bytearray of width * height cells in row-major order,
+                defaults to every tile being walkable
+        """
+        self.width = width
+        self.height = height
+        self.cells = cells if cells is not None else bytearray(b'\x01') * (width * height)
+
+    def is_walkable(self, x, y):
+        """
+        Check if a tile can be walked on
+
+        Args:
+            x: Tile column
+            y: Tile row
+
+        Returns:
+            True if the position is inside the map and not a wall
+        """
+        if x < 0 or y < 0 or x >= self.width or y >= self.height:
+            return False
+        return self.cells[y * self.width + x] == 1
+
+    def neighbours(self, x, y):
+        """
+        Get the walkable tiles next to a position (no diagonals)
+
+        Args:
+            x: Tile column
+            y: Tile row
+
+        Returns:
+            List of (x, y) walkable neighbouring positions
+        """
+        return [
+            (nx, ny) for nx, ny in ((x, y - 1), (x, y + 1), (x - 1, y), (x + 1, y))
+            if self.is_walkable(nx, ny)
+        ]
+
+    def as_array(self, rect=None):
+        """
+        Get the grid, or part of it, as a NumPy array without copying
+
+        Args:
+            rect: Optional (x, y, width, height) in tiles, clipped to the map,
+                defaults to the whole map
+
+        Returns:
+            A (height, width) bool array that is True for walkable tiles
+        """
+        grid = numpy.frombuffer(self.cells, dtype=numpy.bool_).reshape(self.height, self.width)
+        if rect is None:
+            return grid
+        x, y, width, height = rect
+        x0, y0 = max(0, x), max(0, y)
+        return grid[y0:max(y0, y + height), x0:max(x0, x + width)]
+
+
+def tiled_gid(tmx_data, gid):
+    """
+    Convert a gid from loaded layer data to the gid used in the TMX file
+
+    pytmx renumbers gids as it loads tiles, so tile IDs have to be worked out from the
+    original TMX gid.
+
+    Args:
+        tmx_data: Loaded TMX map
+        gid: gid from the layer data
+
+    Returns:
+        The TMX gid without flip flags
+    """
+    gid_map = getattr(tmx_data, 'tiledgidmap', None)
+    if gid_map:
+        gid = gid_map.get(gid, gid)
+    return gid & GID_MASK
+
+
+def is_wall_gid(tmx_data, gid, wall_tiles):
+    """
+    Check if a gid from loaded layer data is one of the level's wall tiles
+
+    Args:
+        tmx_data: Loaded TMX map
+        gid: gid from the layer data
+        wall_tiles: Tile IDs from level.json that block movement (0 means an empty tile)
+
+    Returns:
+        True if the gid blocks movement
+    """
+    # Special case: if GID is 0 (empty tile) and 0 is in wall_tiles
+    if gid == 0:
+        return 0 in wall_tiles
+
+    # Convert GID to tile ID by subtracting firstgid
+    gid = tiled_gid(tmx_data, gid)
+    for tileset in tmx_data.tilesets:
+        if gid >= tileset.firstgid and gid < tileset.firstgid + tileset.tilecount:
+            tile_id = gid - tileset.firstgid + 1  # +1 because TMX tile IDs start at 1
+            if tile_id in wall_tiles:
+                return True
+    return False
+
+
+def build_walkability_grid(tmx_data, wall_tiles):
+    """
+    Compute the collision grid for a map from its visible tile layers
+
+    Args:
+        tmx_data: Loaded TMX map
+        wall_tiles: Tile IDs from level.json that block movement
+
+    Returns:
+        A WalkabilityGrid for the map
+    """
+    grid = WalkabilityGrid(tmx_data.width, tmx_data.height)
+    cells = grid.cells
+    wall_gids = {}
+
+    for layer in tmx_data.visible_layers:
+        if hasattr(layer, 'data'):
+            for y, row in enumerate(layer.data):
+                base = y * tmx_data.width
+                for x, gid in enumerate(row):
+                    wall = wall_gids.get(gid)
+                    if wall is None:
+                        wall = is_wall_gid(tmx_data, gid, wall_tiles)
+                        wall_gids[gid] = wall
+                    if wall:
+                        cells[base + x] = 0
+    return grid
+
+
+def get_walkability_grid(tmx_data, wall_tiles):
+    """
+    Get the collision grid for a map, building it the first time it is needed
+
+    The grid is stored on the map object so it lives as long as the loaded map. Maps
+    that provide their own collision checks (streamed maps) create them with
+    make_walkability_grid instead.
+
+    Args:
+        tmx_data: Loaded TMX map
+        wall_tiles: Tile IDs from level.json that block movement
+
+    Returns:
+        The WalkabilityGrid for the map and wall tiles
+    """
+    key = tuple(sorted(wall_tiles))
+    grids = getattr(tmx_data, 'walkability_grids', None)
+    if grids is None:
+        grids = {}
+        tmx_data.walkability_grids = grids
+    if key not in grids:
+        make_walkability_grid = getattr(tmx_data, 'make_walkability_grid', None)
+        if make_walkability_grid is not None:
+            grids[key] = make_walkability_grid(wall_tiles)
+        else:
+            grids[key] = build_walkability_grid(tmx_data, wall_tiles)
+    return grids[key]
@@ -0,0 +1,413 @@
+import random
+
+# Actions the player can take on their turn
+ATTACK = "ATTACK"
+HEAL = "HEAL"
+
+# Sides of a fight
+PLAYER = "player"
+ENEMY = "enemy"
+
+# Kinds of turn events, besides ATTACK and HEAL
+NO_HEAL_ITEM = "NO_HEAL_ITEM"
+
+# Healing can't take anyone above a full health bar
+MAX_HEALTH = 5
+
+# Damage of a hit by how much the attack roll beat (or tied) the defence roll, best first
+DAMAGE_TIERS = ((6, 3), (3, 2), (0, 1))
+
+# Healing by how much the heal roll exceeds, best first, nothing at 7 or less
+HEAL_TIERS = ((12, 3), (9, 2), (7, 1))
+
+# Enemies with a healing item heal instead of attacking at or below this health
+ENEMY_HEAL_HEALTH = 2
+
+
+def roll_dice(modifier=0, rng=random):
+    """
+    Roll 2d6 and add a modifier
+
+    Args:
+        modifier: Added to the total
+        rng: Source of randomness with randint(), e.g. a random.Random
+
+    Returns:
+        Tuple of (first die, second die, total)
+    """
+    roll1 = rng.randint(1, 6)
+    roll2 = rng.randint(1, 6)
+    return roll1, roll2, roll1 + roll2 + modifier
+
+
+def hit_damage(attack_total, defence_total):
+    """
+    Get the damage of an attack roll against a defence roll
+
+    Args:
+        attack_total: Attacker's 2d6 + modifier
+        defence_total: Defender's 2d6 + modifier
+
+    Returns:
+        0 for a miss, otherwise 1, 2 or 3 by the margin of success
+    """
+    margin = attack_total - defence_total
+    for threshold, damage in DAMAGE_TIERS:
+        if margin >= threshold:
+            return damage
+    return 0
+
+
+def heal_amount(heal_total):
+    """
+    Get the healing of a heal roll
+
+    Args:
+        heal_total: Healer's 2d6 + healing item modifier
+
+    Returns:
+        0 for a failed heal, otherwise 1, 2 or 3
+    """
+    for threshold, healing in HEAL_TIERS:
+        if heal_total > threshold:
+            return healing
+    return 0
+
+
+def item_modifier(items, item_type):
+    """
+    Get the modifier of a character's item
+
+    Args:
+        items: The character's items by type ('attack', 'defense', 'heal')
+        item_type: Type of the item
+
+    Returns:
+        The item's modifier, or 0 if the character doesn't have one
+    """
+    return items.get(item_type, {}).get('modifier', 0)
+
+
+def gold_reward(enemy_data):
+    """
+    Get the gold the player is given for defeating an enemy
+
+    Args:
+        enemy_data: Enemy definition with 'currency' and 'item_modifier' filled in
+
+    Returns:
+        The enemy's gold plus 5 per point of its item modifier
+    """
+    return enemy_data['currency'] + (5 * enemy_data['item_modifier'])
+
+
+def prepare_enemy(enemy_data):
+    """
+    Fill in the fields combat needs that level.json enemies may leave out
+
+    Enemies fight with their attack item (or their fists), whose name, type and
+    modifier are stored in 'item_name', 'item_type' and 'item_modifier'. Items given
+    as a list are converted to a dictionary by type.
+
+    Args:
+        enemy_data: Enemy definition, updated in place
+
+    Returns:
+        The same enemy definition
+    """
+    if 'currency' not in enemy_data:
+        # Use item_modifier if available, otherwise use 1
+        enemy_data['currency'] = 10 * enemy_data.get('item_modifier', 1)
+
+    # Get items, ensuring it's a dictionary
+    items = enemy_data.setdefault('items', {})
+    if not isinstance(items, dict):
+        print(f"Warning: enemy items is not a dictionary: {items}")
+        items_dict = {}
+        if isinstance(items, list):
+            # Convert list of items to dictionary
+            for i, item in enumerate(items):
+                if isinstance(item, dict):
+                    items_dict[item.get('type', f'item{i}').lower()] = item
+        enemy_data['items'] = items = items_dict
+
+    # Use the attack item for the encounter message if available
+    try:
+        if 'attack' in items:
+            active_item = items['attack']
+            enemy_data['item_name'] = active_item.get('name', 'Unknown Weapon')
+            enemy_data['item_type'] = ATTACK
+            enemy_data['item_modifier'] = active_item.get('modifier', 1)
+            return enemy_data
+    except Exception as e:
+        print(f"Error processing enemy items: {e}")
+
+    # Create default item data if not available
+    enemy_data['item_name'] = 'Fists'
+    enemy_data['item_type'] = ATTACK
+    enemy_data['item_modifier'] = 1
+    return enemy_data
+
+
+class Combatant:
+    """
+    One side of a fight: its health and the modifiers of its items.
+    """
+    __slots__ = ('name', 'health', 'attack_modifier', 'defense_modifier', 'heal_modifier')
+
+    def __init__(self, name, health, attack_modifier=0, defense_modifier=0, heal_modifier=None):
+        """
+        Initialize the Combatant
+
+        Args:
+            name: Name shown in the action log
+            health: Current health
+            attack_modifier: Added to attack rolls
+            defense_modifier: Added to defence rolls against this combatant's attackers
+            heal_modifier: Added to heal rolls, or None without a healing item
+        """
+        self.name = name
+        self.health = health
+        self.attack_modifier = attack_modifier
+        self.defense_modifier = defense_modifier
+        self.heal_modifier = heal_modifier
+
+    def copy(self):
+        """
+        Get a copy of the combatant
+
+        Returns:
+            A new Combatant with the same values
+        """
+        return Combatant(self.name, self.health, self.attack_modifier, self.defense_modifier, self.heal_modifier)
+
+
+class CombatState:
+    """
+    State of a fight between the player and one enemy.
+
+    resolve_turn() changes the state in place, use copy() to keep the previous one.
+    """
+    __slots__ = ('player', 'enemy', 'turn', 'winner')
+
+    def __init__(self, player, enemy, turn=0, winner=None):
+        """
+        Initialize the CombatState
+
+        Args:
+            player: The player's Combatant
+            enemy: The enemy's Combatant
+            turn: Number of turns resolved so far
+            winner: PLAYER or ENEMY once one side is defeated, otherwise None
+        """
+        self.player = player
+        self.enemy = enemy
+        self.turn = turn
+        self.winner = winner
+
+    @classmethod
+    def from_game(cls, character_data, enemy_data):
+        """
+        Create the state of a fight from the game's character and enemy data
+
+        Args:
+            character_data: The player's data with 'name', 'health' and 'items'
+            enemy_data: The enemy's data with 'name', 'health', 'item_type' and
+                'item_modifier' (see prepare_enemy)
+
+        Returns:
+            A new CombatState
+        """
+        items = character_data.get('items', {})
+        player = Combatant(
+            character_data.get('name', 'Player'),
+            character_data.get('health', 5),
+            item_modifier(items, 'attack'),
+            item_modifier(items, 'defense'),
+            item_modifier(items, 'heal') if items.get('heal') else None
+        )
+
+        # Enemies carry a single item, used for either attacking or healing. The
+        # enemy's defence rolls use the player's defence item, as they always have.
+        enemy_item_type = enemy_data.get('item_type', ATTACK)
+        enemy_modifier = enemy_data.get('item_modifier', 1)
+        enemy = Combatant(
+            enemy_data.get('name', 'Unknown Enemy'),
+            enemy_data.get('health', 50),
+            enemy_modifier if enemy_item_type == ATTACK else 0,
+            item_modifier(items, 'defense'),
+            enemy_modifier if enemy_item_type == HEAL else None
+        )
+        return cls(player, enemy)
+
+    def copy(self):
+        """
+        Get a copy of the state
+
+        Returns:
+            A new CombatState with copies of both combatants
+        """
+        return CombatState(self.player.copy(), self.enemy.copy(), self.turn, self.winner)
+
+    def is_over(self):
+        """
+        Check if one side has been defeated
+
+        Returns:
+            True once the fight has a winner
+        """
+        return self.winner is not None
+
+
+def _attack(attacker, defender, side, rng, events):
+    # Roll attack against defence and apply the damage
+    attack_total = roll_dice(attacker.attack_modifier, rng)[2]
+    defence_total = roll_dice(defender.defense_modifier, rng)[2]
+    damage = hit_damage(attack_total, defence_total)
+    if damage:
+        defender.health = max(0, defender.health - damage)
+    events.append((ATTACK, side, damage, defender.health))
+
+
+def _heal(healer, side, rng, events):
+    # Roll the healing item and apply the healing, up to a full health bar
+    healing = heal_amount(roll_dice(healer.heal_modifier, rng)[2])
+    old_health = healer.health
+    healer.health = min(MAX_HEALTH, healer.health + healing)
+    events.append((HEAL, side, healing, healer.health - old_health))
+
+
+def resolve_turn(state, action, rng=random):
+    """
+    Resolve the player's action and the enemy's reply
+
+    The enemy replies unless it was defeated. It heals when it has a healing item
+    and ENEMY_HEAL_HEALTH or less, otherwise it attacks.
+
+    Args:
+        state: CombatState to update, must not be over
+        action: ATTACK or HEAL
+        rng: Source of randomness with randint(), e.g. a random.Random
+
+    Returns:
+        List of events in the order they happened, one of:
+            (ATTACK, attacker side, damage (0 for a miss), defender health after)
+            (HEAL, healer side, healing rolled, health actually restored)
+            (NO_HEAL_ITEM, PLAYER)
+    """
+    player = state.player
+    enemy = state.enemy
+    events = []
+
+    if action == ATTACK:
+        _attack(player, enemy, PLAYER, rng, events)
+        if enemy.health <= 0:
+            state.winner = PLAYER
+    elif action == HEAL:
+        if player.heal_modifier is not None:
+            _heal(player, PLAYER, rng, events)
+        else:
+            events.append((NO_HEAL_ITEM, PLAYER))
+    else:
+        raise ValueError(f"Unknown combat action: {action}")
+
+    if state.winner is None:
+        if enemy.heal_modifier is not None and enemy.health <= ENEMY_HEAL_HEALTH:
+            _heal(enemy, ENEMY, rng, events)
+        else:
+            _attack(enemy, player, ENEMY, rng, events)
+            if player.health <= 0:
+                state.winner = ENEMY
+
+    state.turn += 1
+    return events
+
+
+def attack_policy(state):
+    """
+    Always attack
+
+    Args:
+        state: Current CombatState
+
+    Returns:
+        ATTACK
+    """
+    return ATTACK
+
+
+def heal_when_low_policy(state):
+    """
+    Heal at ENEMY_HEAL_HEALTH or less when there is a healing item, the way enemies do,
+    otherwise attack
+
+    Args:
+        state: Current CombatState
+
+    Returns:
+        ATTACK or HEAL
+    """
+    player = state.player
+    if player.heal_modifier is not None and player.health <= ENEMY_HEAL_HEALTH:
+        return HEAL
+    return ATTACK
+
+
+def simulate_fight(state, policy=attack_policy, rng=random, max_turns=100):
+    """
+    Play a fight to the end
+
+    Args:
+        state: CombatState to play out, updated in place
+        policy: Function choosing the player's action from the state
+        rng: Source of randomness with randint(), e.g. a random.Random
+        max_turns: Turns after which the fight is abandoned
+
+    Returns:
+        The winner, or None if the fight was abandoned
+    """
+    while state.winner is None and state.turn < max_turns:
+        resolve_turn(state, policy(state), rng)
+    return state.winner
+
+
+def simulate_fights(state, count, policy=attack_policy, seed=None, max_turns=100):
+    """
+    Play many fights from the same starting state
+
+    Args:
+        state: Starting CombatState, left unchanged
+        count: Number of fights
+        policy: Function choosing the player's action from the state
+        seed: Seed of the random number generator, or None for a random seed
+        max_turns: Turns after which a fight is abandoned
+
+    Returns:
+        Dictionary with the number of fights, 'wins', 'losses' and 'abandoned', the
+        'win_rate', the mean number of 'turns', and the mean 'health_left' of the
+        player after a win
+    """
+    rng = random.Random(seed)
+    wins = 0
+    losses = 0
+    turns = 0
+    health_left = 0
+    for _ in range(count):
+        fight = state.copy()
+        winner = simulate_fight(fight, policy, rng, max_turns)
+        turns += fight.turn
+        if winner == PLAYER:
+            wins += 1
+            health_left += fight.player.health
+        elif winner == ENEMY:
+            losses += 1
+
+    return {
+        'fights': count,
+        'wins': wins,
+        'losses': losses,
+        'abandoned': count - wins - losses,
+        'win_rate': wins / count if count else 0.0,
+        'turns': turns / count if count else 0.0,
+        'health_left': health_left / wins if wins else 0.0
+    }
@@ -1,13 +1,18 @@
-import random
 import pygame
 import sys
 from src import game_over_screen
+from src.combat import ATTACK, HEAL, NO_HEAL_ITEM, PLAYER, ENEMY, CombatState, gold_reward, prepare_enemy, resolve_turn
+from src.combat_solver import combat_solver
 from src.ui import WIDTH, HEIGHT, WHITE, BLACK, DARK_GRAY, BLUE, LIGHT_BLUE, GREEN, RED, YELLOW, GRAY, HIGHLIGHT, draw_character_card
-from src.ui import calculate_card_height, Button
+from src.ui import calculate_card_height, get_gradient_surface, get_font, render_text, Button, character_card_key
+from src.dirty_rects import DirtyRectRenderer
+from src.enemy_index import get_enemy_index
+from src.frame_scheduler import frame_scheduler
+from src.profiler import profiler
+from src.session import session_random
 
 def main_game_screen(screen, character_data):
     running = True
-    clock = pygame.time.Clock()
     print("\n==== MAIN GAME SCREEN ====")
     print(f"Character data type: {type(character_data)}")
     if isinstance(character_data, dict):
@@ -54,62 +59,8 @@ def main_game_screen(screen, character_data):
 
     enemy_data['level'] = character_data['level']
 
-    # Add missing fields that are required for combat
-    if 'currency' not in enemy_data:
-        # Use item_modifier if available, otherwise use 1
-        default_modifier = enemy_data.get('item_modifier', 1)
-        enemy_data['currency'] = 10 * default_modifier
-
-    # Handle items in the new format
-    if 'items' not in enemy_data:
-        enemy_data['items'] = {}
-    # Handle items in the new format
-    if 'items' not in enemy_data:
-        enemy_data['items'] = {}
-
-    # Get items, ensuring it's a dictionary
-    items = enemy_data['items']
-    if not isinstance(items, dict):
-        print(f"Warning: enemy items is not a dictionary: {items}")
-        # Convert to dictionary if possible
-        if isinstance(items, list):
-            # Convert list of items to dictionary
-            items_dict = {}
-            for i, item in enumerate(items):
-                if isinstance(item, dict):
-                    item_type = item.get('type', f'item{i}').lower()
-                    items_dict[item_type] = item
-            enemy_data['items'] = items_dict
-            items = items_dict
-        else:
-            # Create empty dictionary
-            enemy_data['items'] = {}
-            items = {}
-
-
-
-    # Set the active item for display in the encounter message
-    # Use the attack item for the encounter message
-    # Set the active item for display in the encounter message
-    # Use the attack item for the encounter message if available
-    try:
-        if isinstance(items, dict) and 'attack' in items:
-            active_item = items['attack']
-            enemy_data['item_name'] = active_item.get('name', 'Unknown Weapon')
-            enemy_data['item_type'] = 'ATTACK'
-            enemy_data['item_modifier'] = active_item.get('modifier', 1)
-        else:
-            # Create default item data if not available
-            enemy_data['item_name'] = 'Fists'
-            enemy_data['item_type'] = 'ATTACK'
-            enemy_data['item_modifier'] = 1
-    except Exception as e:
-        print(f"Error processing enemy items: {e}")
-        # Create default item data if there's an error
-        enemy_data['item_name'] = 'Fists'
-        enemy_data['item_type'] = 'ATTACK'
-        enemy_data['item_modifier'] = 1
-
+    # Fill in the enemy's currency and attack item, as the combat engine expects
+    prepare_enemy(enemy_data)
 
     # Clear the start_combat flag
     character_data['start_combat'] = False
@@ -134,8 +85,8 @@ def main_game_screen(screen, character_data):
     button_y = enemy_card_y + card_height + 30
 
     # Create instruction label
-    label_font = pygame.font.SysFont('Arial', 18)
-    instruction_label = label_font.render("Select Action and click Submit", True, WHITE)
+    label_font = get_font(18)
+    instruction_label = render_text(label_font, "Select Action and click Submit", WHITE)
 
     # Create buttons (keeping horizontal positions)
     # Create buttons with new positions - removed submit button
@@ -154,19 +105,35 @@ def main_game_screen(screen, character_data):
 
     # Health levels (1-5)
     # Initialize health
-    player_health = character_data.get("health", 5)  # Get health from character_data or default to 5
-    character_data["health"] = player_health  # Store health in character_data
-    enemy_health = enemy_data.get('health', 50)
-    enemy_max_health = enemy_data.get('max_health', enemy_health)
-    enemy_attack = enemy_data.get('attack', 8)
-    enemy_defense = enemy_data.get('defense', 3)
+    character_data["health"] = character_data.get("health", 5)  # Get health from character_data or default to 5
     enemy_defeated = 0  # Counter for defeated enemies
 
+    # The combat rules are played by the combat engine, this screen only shows the fight
+    combat_state = CombatState.from_game(character_data, enemy_data)
+
+    # Exact chances of winning for the --hints line, solved once per kind of fight
+    combat_tables = combat_solver.solve(combat_state) if character_data.get('hints', False) else None
+    hint_rect = pygame.Rect(heal_button.rect.right, button_y, run_button.rect.left - heal_button.rect.right, button_height)
+
+    # Only redraw and push the regions that changed when --dirty-rects is enabled
+    renderer = DirtyRectRenderer()
+    player_card_rect = pygame.Rect(player_card_x, player_card_y, card_width + 1, card_height)
+    enemy_card_rect = pygame.Rect(enemy_card_x, enemy_card_y, card_width + 1, card_height)
+    game_area_rect = pygame.Rect(game_area_x, game_area_y, game_area_width, game_area_height)
+    buttons_rect = attack_button.rect.unionall([heal_button.rect, run_button.rect])
+
     while running:
-        for event in pygame.event.get():
+        # Time the phases of the frame for --profile-output
+        profiler.start_frame('combat')
+
+        profiler.begin('input')
+        for event in frame_scheduler.get_events():
             if event.type == pygame.QUIT:
                 running = False
 
+            if event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+                renderer.mark_all()
+
             if event.type == pygame.MOUSEBUTTONDOWN:
                 mouse_pos = pygame.mouse.get_pos()
 
@@ -201,277 +168,139 @@ def main_game_screen(screen, character_data):
             for i, button in enumerate(action_buttons):
                 if button.handle_event(event):
                     # Execute action immediately instead of just selecting it
-                    selected_action = ["ATTACK", "HEAL"][i]
-
-                    # Perform the selected action
-                    if selected_action == "ATTACK":
-                        # Get player's attack modifier from attack item
-                        player_attack_mod = character_data['items'].get('attack', {}).get('modifier',0)
-
-                        # Get enemy's defense modifier
-                        enemy_defense_mod = character_data['items'].get('defense', {}).get('modifier',0)
-
-                        # Roll for attack and defense
-                        player_roll1, player_roll2, player_attack = roll_dice(player_attack_mod)
-                        enemy_roll1, enemy_roll2, enemy_defense = roll_dice(enemy_defense_mod)
-
-                        # Log the attack attempt
-                        action_log.append(f"{character_data['name']} attacks with {character_data['items'].get('attack', {}).get('name', 'bare hands')}!")
-
-                        # Determine if attack is successful and calculate damage tier
-                        if player_attack >= enemy_defense:
-                            # Calculate margin of success
-                            margin = player_attack - enemy_defense
-
-                            # Determine damage based on margin
-                            damage = 1  # Base damage
-                            if margin >= 6:
-                                damage = 3  # Critical hit
-                                action_log.append(f"CRITICAL HIT! {enemy_data['name']} takes {damage} damage!")
-                            elif margin >= 3:
-                                damage = 2  # Strong hit
-                                action_log.append(f"Strong hit! {enemy_data['name']} takes {damage} damage!")
+                    selected_action = [ATTACK, HEAL][i]
+
+                    # Play the action and the enemy's reply
+                    events = resolve_turn(combat_state, selected_action, session_random)
+                    action_log.extend(describe_turn(events, combat_state, character_data))
+                    character_data["health"] = combat_state.player.health  # Update health in character_data
+
+                    # Check if enemy is defeated
+                    if combat_state.winner == PLAYER:
+                        # Calculate gold reward
+                        character_data['currency'] += gold_reward(enemy_data)
+
+                        # Mark the enemy as defeated in the level data
+                        if 'level' in character_data and 'enemies' in character_data['level']:
+                            enemy_position = enemy_data.get('position', {})
+                            if enemy_position:
+                                # Find and remove the defeated enemy through the level's enemy index
+                                enemy_index = get_enemy_index(character_data['level'])
+                                defeated = enemy_index.get_enemy_at(enemy_position.get('x'), enemy_position.get('y'))
+                                if defeated is not None:
+                                    enemy_index.remove(defeated)
+                                    print(f"Removed defeated enemy at position {enemy_position}")
+
+                        # Check if all enemies are defeated
+                        if 'level' in character_data and 'enemies' in character_data['level'] and len(character_data['level']['enemies']) == 0:
+                            # All enemies defeated - show victory screen
+                            print("All enemies defeated! Victory!")
+                            if game_over_screen.game_over_screen(screen, character_data, enemy_defeated, victory=True):
+                                # Return to level selection
+                                character_data['return_to_title'] = True
+                                return character_data
                             else:
-                                action_log.append(f"Hit! {enemy_data['name']} takes {damage} damage!")
-
-                            # Apply damage
-                            enemy_health = max(0, enemy_health - damage)
-
-                            # Check if enemy is defeated
-                            if enemy_health <= 0:
-                                # Calculate gold reward
-                                # Calculate gold reward
-                                gold_reward = enemy_data['currency'] + (5 * enemy_data['item_modifier'])
-                                character_data['currency'] += gold_reward
-
-                                # Mark the enemy as defeated in the level data
-                                if 'level' in character_data and 'enemies' in character_data['level']:
-                                    enemy_position = enemy_data.get('position', {})
-                                    if enemy_position:
-                                        # Find and remove the defeated enemy from the level's enemies list
-                                        for i, e in enumerate(character_data['level']['enemies']):
-                                            e_pos = e.get('position', {})
-                                            if e_pos.get('x') == enemy_position.get('x') and e_pos.get('y') == enemy_position.get('y'):
-                                                # Remove this enemy from the list
-                                                character_data['level']['enemies'].pop(i)
-                                                print(f"Removed defeated enemy at position {enemy_position}")
-                                                break
-
-                                # Check if all enemies are defeated
-                                if 'level' in character_data and 'enemies' in character_data['level'] and len(character_data['level']['enemies']) == 0:
-                                    # All enemies defeated - show victory screen
-                                    print("All enemies defeated! Victory!")
-                                    if game_over_screen.game_over_screen(screen, character_data, enemy_defeated, victory=True):
-                                        # Return to level selection
-                                        character_data['return_to_title'] = True
-                                        return character_data
-                                    else:
-                                        running = False
-                                        return False
-
-                                # Set flag to return to map after combat
-                                character_data['return_to_map'] = True
-
-                                # Check if enemy has items to loot
-                                has_items = False
-                                if 'items' in enemy_data:
-                                    items = enemy_data['items']
-                                    if ('attack' in items and items.get('attack', {}).get('name')) or \
-                                       ('defense' in items and items.get('defense', {}).get('name')) or \
-                                       ('heal' in items and items.get('heal', {}).get('name')):
-                                        has_items = True
-
-                                # Store player health in character_data
-                                character_data['health'] = player_health
-
-                                if has_items:
-                                    # Exit combat loop immediately to avoid flash
-                                    # We'll show loot screen from main game loop
-                                    character_data['show_loot'] = True  # Flag to show loot screen
-                                    character_data['loot_enemy'] = enemy_data  # Store enemy for loot screen
-                                    running = False
-                                else:
-                                    # No items to loot, end combat and return to map
-                                    running = False
-
-                                    # No items to loot, end combat and return to map
-                                    running = False
-
-                                # Store player health in character_data
-                                character_data['health'] = player_health
-
-                            elif enemy_health == 1:
-                                action_log.append(f"{enemy_data['name']} is critically wounded!")
+                                running = False
+                                return False
+
+                        # Set flag to return to map after combat
+                        character_data['return_to_map'] = True
+
+                        # Check if enemy has items to loot
+                        has_items = False
+                        if 'items' in enemy_data:
+                            items = enemy_data['items']
+                            if ('attack' in items and items.get('attack', {}).get('name')) or \
+                               ('defense' in items and items.get('defense', {}).get('name')) or \
+                               ('heal' in items and items.get('heal', {}).get('name')):
+                                has_items = True
+
+                        if has_items:
+                            # Exit combat loop immediately to avoid flash
+                            # We'll show loot screen from main game loop
+                            character_data['show_loot'] = True  # Flag to show loot screen
+                            character_data['loot_enemy'] = enemy_data  # Store enemy for loot screen
+
+                        # End combat and return to map
+                        running = False
+
+                    # Check if player is defeated
+                    elif combat_state.winner == ENEMY:
+                        # Show game over screen
+                        if game_over_screen.game_over_screen(screen, character_data, enemy_defeated):
+                            # Return to level selection
+                            character_data['return_to_title'] = True
+                            return character_data
                         else:
-                            # Attack fails
-                            action_log.append(f"Attack fails! {enemy_data['name']} dodges the attack!")
-
-                    elif selected_action == "HEAL":
-                        # Check if player has a healing item
-                        if character_data['items'].get('heal',False):
-                            # Roll for healing effectiveness
-                            heal_roll1, heal_roll2, heal_total = roll_dice(character_data['items']['heal']['modifier'])
-
-                            # Log the healing attempt
-                            action_log.append(f"{character_data['name']} attempts to heal with {character_data['items']['heal']['name']}!")
-
-                            # Determine healing amount based on roll
-                            healing = 0
-                            if heal_total > 12:
-                                healing = 3  # Major healing
-                                action_log.append(f"MAJOR HEALING! Restores 3 HP!")
-                            elif heal_total > 9:
-                                healing = 2  # Moderate healing
-                                action_log.append(f"Good healing! Restores 2 HP!")
-                            elif heal_total > 7:
-                                healing = 1  # Minor healing
-                                action_log.append(f"Minor healing! Restores 1 HP!")
-                            else:
-                                action_log.append(f"Healing attempt fails!")
-
-                            # Apply healing
-                            old_player_health = player_health
-                            player_health = min(5, player_health + healing)
-                            character_data["health"] = player_health  # Update health in character_data
-                            actual_healing = player_health - old_player_health
-
-                            # Additional feedback if already at max health
-                            if healing > 0 and actual_healing == 0:
-                                action_log.append(f"{character_data['name']} is already at full health!")
-                        else:
-                            # No healing item
-                            action_log.append(f"{character_data['name']} tries to heal but has no healing item!")
-
-                    # Enemy's turn (if not defeated)
-                    if enemy_health > 0:
-                        # Enemy AI: If health is low (1-2), try to heal if possible
-                        if enemy_health <= 2 and enemy_data['item_type'] == "HEAL":
-                            # Roll for enemy healing effectiveness
-                            enemy_heal_roll1, enemy_heal_roll2, enemy_heal_total = roll_dice(enemy_data['item_modifier'])
-
-                            # Log the healing attempt
-                            action_log.append(f"{enemy_data['name']} attempts to heal!")
-
-                            # Determine healing amount based on roll
-                            healing = 0
-                            if enemy_heal_total > 12:
-                                healing = 3  # Major healing
-                                action_log.append(f"MAJOR HEALING! {enemy_data['name']} restores 3 HP!")
-                            elif enemy_heal_total > 9:
-                                healing = 2  # Moderate healing
-                                action_log.append(f"Good healing! {enemy_data['name']} restores 2 HP!")
-                            elif enemy_heal_total > 7:
-                                healing = 1  # Minor healing
-                                action_log.append(f"Minor healing! {enemy_data['name']} restores 1 HP!")
-                            else:
-                                action_log.append(f"{enemy_data['name']}'s healing attempt fails!")
-
-                            # Apply healing
-                            old_enemy_health = enemy_health
-                            enemy_health = min(5, enemy_health + healing)
-                            actual_healing = enemy_health - old_enemy_health
-
-                            # Additional feedback if already at max health
-                            if healing > 0 and actual_healing == 0:
-                                action_log.append(f"{enemy_data['name']} is already at full health!")
-                        else:
-                            # Enemy attacks
-                            # Get enemy's attack modifier
-                            enemy_attack_mod = enemy_data['item_modifier'] if enemy_data['item_type'] == "ATTACK" else 0
-
-                            # Get player's defense modifier
-                            player_defense_mod = character_data['items'].get('defense',{}).get('modifier',0)
-
-                            # Roll for attack and defense
-                            enemy_roll1, enemy_roll2, enemy_attack = roll_dice(enemy_attack_mod)
-                            player_roll1, player_roll2, player_defense = roll_dice(player_defense_mod)
-
-                            # Log the attack attempt
-                            action_log.append(f"{enemy_data['name']} attacks!")
-                            
-                            # Determine if attack is successful and calculate damage tier
-                            if enemy_attack >= player_defense:
-                                # Calculate margin of success
-                                margin = enemy_attack - player_defense
-
-                                # Determine damage based on margin
-                                damage = 1  # Base damage
-                                if margin >= 6:
-                                    damage = 3  # Critical hit
-                                    action_log.append(f"CRITICAL HIT! {character_data['name']} takes {damage} damage!")
-                                elif margin >= 3:
-                                    damage = 2  # Strong hit
-                                    action_log.append(f"Strong hit! {character_data['name']} takes {damage} damage!")
-                                else:
-                                    action_log.append(f"Hit! {character_data['name']} takes {damage} damage!")
-
-                                # Apply damage
-                                player_health = max(0, player_health - damage)
-                                character_data["health"] = player_health  # Update health in character_data
-
-                                # Check if player is defeated
-                                if player_health <= 0:
-                                    action_log.append(f"{character_data['name']} has been defeated!")
-                                    # Show game over screen
-                                    if game_over_screen.game_over_screen(screen, character_data, enemy_defeated):
-                                        # Return to level selection
-                                        character_data['return_to_title'] = True
-                                        return character_data
-                                    else:
-                                        running = False
-                                        return False
-                                elif player_health == 1:
-                                    action_log.append(f"{character_data['name']} is critically wounded!")
-                            else:
-                                # Attack fails
-                                action_log.append(f"Attack fails! {character_data['name']} dodges the attack!")
+                            running = False
+                            return False
 
                     # Keep log at a reasonable size
                     if len(action_log) > 19:
                         action_log = action_log[-19:]
 
-        # Create gradient background
-        for y in range(HEIGHT):
-            color_value = max(0, 50 - y // 10)
-            pygame.draw.line(screen, (0, 0, color_value), (0, y), (WIDTH, y))
-
         # Add key controls to change health level (for demonstration)
         keys = pygame.key.get_pressed()
         if keys[pygame.K_1]:
-            player_health = 1
+            combat_state.player.health = 1
         elif keys[pygame.K_2]:
-            player_health = 2
+            combat_state.player.health = 2
         elif keys[pygame.K_3]:
-            player_health = 3
+            combat_state.player.health = 3
         elif keys[pygame.K_4]:
-            player_health = 4
+            combat_state.player.health = 4
         elif keys[pygame.K_5]:
-            player_health = 5
+            combat_state.player.health = 5
+        # Time spent waiting for input isn't part of the frame
+        profiler.exclude(frame_scheduler.wait_time)
+        profiler.end('input')
+
+        # Work out which regions changed since the last frame
+        player_health = combat_state.player.health
+        enemy_health = combat_state.enemy.health
+        renderer.track('player_card', player_card_rect, character_card_key(character_data, card_width, card_height, player_health))
+        renderer.track('enemy_card', enemy_card_rect, character_card_key(enemy_data, card_width, card_height, enemy_health, True))
+        renderer.track('log', game_area_rect, tuple(action_log))
+        renderer.track('buttons', buttons_rect, (attack_button.is_hovered, heal_button.is_hovered, run_button.is_hovered))
+        if combat_tables:
+            renderer.track('hint', hint_rect, (player_health, enemy_health))
+
+        # Nothing changed, keep the previous frame on the display
+        if not renderer.needs_redraw():
+            frame_scheduler.tick()
+            profiler.end_frame()
+            continue
+
+        # Create gradient background
+        profiler.begin('card')
+        screen.blit(get_gradient_surface((WIDTH, HEIGHT), (0, 0, 50)), (0, 0))
 
         # Draw player and enemy cards
         draw_character_card(screen, character_data, player_card_x, player_card_y, card_width, card_height, player_health)
         draw_character_card(screen, enemy_data, enemy_card_x, enemy_card_y, card_width, card_height, enemy_health, True)
+        profiler.end('card')
 
         # Draw game title (right-aligned, outside game area)
         # Title removed as requested
 
         # Draw game area (action log)
+        profiler.begin('text')
         pygame.draw.rect(screen, LIGHT_BLUE, (game_area_x, game_area_y, game_area_width, game_area_height), 3)
 
 
         # Shop hint removed as requestedAbove the buttons, aligned with labels
 
         # Draw action log title
-        log_title_font = pygame.font.SysFont('Arial', 24, bold=True)
-        log_title_text = log_title_font.render("Action Log", True, WHITE)
+        log_title_font = get_font(24, bold=True)
+        log_title_text = render_text(log_title_font, "Action Log", WHITE)
         log_title_rect = log_title_text.get_rect()
         log_title_rect.midtop = (WIDTH//2, game_area_y + 10)
         screen.blit(log_title_text, log_title_rect)
 
         # Draw action log entries
-        log_font = pygame.font.SysFont('Arial', 18)
+        log_font = get_font(18)
         for i, log_entry in enumerate(action_log):
-            log_text = log_font.render(log_entry, True, WHITE)
+            log_text = render_text(log_font, log_entry, WHITE)
             log_rect = log_text.get_rect()
             log_rect.center = (WIDTH//2, game_area_y + 50 + (i * 30))
             screen.blit(log_text, log_rect)
@@ -482,19 +311,87 @@ def main_game_screen(screen, character_data):
         run_button.draw(screen)
 
         # Draw action instructions
-        instruction_font = pygame.font.SysFont('Arial', 18)
-        instruction_text = instruction_font.render("Click an action button to perform that action", True, WHITE)
+        instruction_font = get_font(18)
+        instruction_text = render_text(instruction_font, "Click an action button to perform that action", WHITE)
         screen.blit(instruction_text, (game_area_x, button_y - 30))
 
-        pygame.display.flip()
-        clock.tick(60)
+        # Draw the chance of winning and the best action between the Heal and Run buttons
+        if combat_tables:
+            win_probability = combat_tables.win_probability(player_health, enemy_health)
+            best_action = combat_tables.best_action(player_health, enemy_health)
+            if win_probability is not None and best_action is not None:
+                win_text = render_text(instruction_font, f"Win chance {win_probability * 100:.0f}%", YELLOW)
+                screen.blit(win_text, win_text.get_rect(midbottom=(hint_rect.centerx, hint_rect.centery)))
+                best_text = render_text(instruction_font, f"Best: {best_action.title()}", YELLOW)
+                screen.blit(best_text, best_text.get_rect(midtop=(hint_rect.centerx, hint_rect.centery)))
+        profiler.end('text')
+
+        profiler.begin('flip')
+        renderer.present()
+        profiler.end('flip')
+        frame_scheduler.tick()
+        profiler.end_frame()
 
     return character_data  # Return character data instead of False
 
-# Dice roll function (2d6 + modifier)
-def roll_dice(modifier=0):
-    # Roll two six-sided dice
-    roll1 = random.randint(1, 6)
-    roll2 = random.randint(1, 6)
-    total = roll1 + roll2 + modifier
-    return roll1, roll2, total
\ No newline at end of file
+def describe_turn(events, combat_state, character_data):
+    """
+    Describe the events of a combat turn for the action log
+
+    Args:
+        events: Events returned by resolve_turn
+        combat_state: State of the fight after the turn
+        character_data: The player's data, for the names of their items
+
+    Returns:
+        List of log lines
+    """
+    names = {PLAYER: combat_state.player.name, ENEMY: combat_state.enemy.name}
+    lines = []
+    for event in events:
+        kind, side = event[0], event[1]
+        name = names[side]
+
+        if kind == ATTACK:
+            _, _, damage, health = event
+            target = names[ENEMY if side == PLAYER else PLAYER]
+            if side == PLAYER:
+                lines.append(f"{name} attacks with {character_data['items'].get('attack', {}).get('name', 'bare hands')}!")
+            else:
+                lines.append(f"{name} attacks!")
+
+            # Damage tier by the margin of success
+            if damage == 3:
+                lines.append(f"CRITICAL HIT! {target} takes {damage} damage!")
+            elif damage == 2:
+                lines.append(f"Strong hit! {target} takes {damage} damage!")
+            elif damage == 1:
+                lines.append(f"Hit! {target} takes {damage} damage!")
+            else:
+                lines.append(f"Attack fails! {target} dodges the attack!")
+
+            if damage and health == 0 and side == ENEMY:
+                lines.append(f"{target} has been defeated!")
+            elif damage and health == 1:
+                lines.append(f"{target} is critically wounded!")
+
+        elif kind == HEAL:
+            _, _, healing, actual_healing = event
+            if side == PLAYER:
+                lines.append(f"{name} attempts to heal with {character_data['items']['heal']['name']}!")
+                messages = {3: "MAJOR HEALING! Restores 3 HP!", 2: "Good healing! Restores 2 HP!",
+                            1: "Minor healing! Restores 1 HP!", 0: "Healing attempt fails!"}
+            else:
+                lines.append(f"{name} attempts to heal!")
+                messages = {3: f"MAJOR HEALING! {name} restores 3 HP!", 2: f"Good healing! {name} restores 2 HP!",
+                            1: f"Minor healing! {name} restores 1 HP!", 0: f"{name}'s healing attempt fails!"}
+            lines.append(messages[healing])
+
+            # Additional feedback if already at max health
+            if healing > 0 and actual_healing == 0:
+                lines.append(f"{name} is already at full health!")
+
+        elif kind == NO_HEAL_ITEM:
+            lines.append(f"{name} tries to heal but has no healing item!")
+
+    return lines
@@ -0,0 +1,443 @@
+import hashlib
+import json
+import os
+import sys
+
+from src.combat import (ATTACK, DAMAGE_TIERS, ENEMY_HEAL_HEALTH, HEAL, HEAL_TIERS, MAX_HEALTH, CombatState,
+                        heal_amount, hit_damage)
+
+LEVELS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "levels")
+
+# Solved tables are cached here, by the modifiers of the fight
+CACHE_PATH = os.path.join(LEVELS_DIR, ".combat_tables.json")
+
+# Bump when the solver changes, the combat rules themselves are part of the cache key
+SOLVER_VERSION = 1
+
+# Action that leaves the fight, the player keeps their health and the enemy stays on the map
+RUN = "RUN"
+
+# Scores the best action is chosen by: running is better than fighting on
+# when losing is more likely than winning
+WIN_SCORE = 1.0
+LOSS_SCORE = -1.0
+RUN_SCORE = 0.0
+
+# Value iteration stops once no value changes by more than this
+TOLERANCE = 1e-12
+MAX_ITERATIONS = 100000
+
+# Outcomes of a turn that end the fight
+_WIN = 'win'
+_LOSS = 'loss'
+
+
+def dice_distribution(modifier=0):
+    """
+    Get the distribution of roll_dice totals
+
+    Args:
+        modifier: Added to the total
+
+    Returns:
+        Dictionary of total to probability
+    """
+    distribution = {}
+    for roll1 in range(1, 7):
+        for roll2 in range(1, 7):
+            total = roll1 + roll2 + modifier
+            distribution[total] = distribution.get(total, 0.0) + 1 / 36
+    return distribution
+
+
+def damage_distribution(attack_modifier, defense_modifier):
+    """
+    Get the distribution of the damage of one attack
+
+    Args:
+        attack_modifier: Attacker's attack modifier
+        defense_modifier: Modifier of the defence roll
+
+    Returns:
+        List of probabilities indexed by damage, 0 being a miss
+    """
+    probabilities = [0.0] * (max(damage for _, damage in DAMAGE_TIERS) + 1)
+    defence = dice_distribution(defense_modifier)
+    for attack_total, attack_probability in dice_distribution(attack_modifier).items():
+        for defence_total, defence_probability in defence.items():
+            probabilities[hit_damage(attack_total, defence_total)] += attack_probability * defence_probability
+    return probabilities
+
+
+def heal_distribution(heal_modifier):
+    """
+    Get the distribution of the healing of one heal roll
+
+    Args:
+        heal_modifier: Healing item modifier
+
+    Returns:
+        List of probabilities indexed by healing, 0 being a failed heal
+    """
+    probabilities = [0.0] * (max(healing for _, healing in HEAL_TIERS) + 1)
+    for total, probability in dice_distribution(heal_modifier).items():
+        probabilities[heal_amount(total)] += probability
+    return probabilities
+
+
+def combat_key(state):
+    """
+    Get the key fights share their tables by
+
+    Args:
+        state: CombatState of the fight
+
+    Returns:
+        Tuple of the player's attack, defence and heal modifiers, the enemy's, and the
+        highest player and enemy health the tables cover
+    """
+    player = state.player
+    enemy = state.enemy
+    # Healing can take either side up to a full health bar
+    max_player_health = max(player.health, MAX_HEALTH)
+    max_enemy_health = max(enemy.health, MAX_HEALTH if enemy.heal_modifier is not None else 0)
+    return (player.attack_modifier, player.defense_modifier, player.heal_modifier,
+            enemy.attack_modifier, enemy.defense_modifier, enemy.heal_modifier,
+            max_player_health, max_enemy_health)
+
+
+def rules_hash():
+    """
+    Get a hash of the combat rules, so cached tables are solved again when they change
+
+    Returns:
+        Hex digest of the solver version and the rule constants
+    """
+    rules = (SOLVER_VERSION, DAMAGE_TIERS, HEAL_TIERS, MAX_HEALTH, ENEMY_HEAL_HEALTH, WIN_SCORE, LOSS_SCORE, RUN_SCORE)
+    return hashlib.sha1(repr(rules).encode('utf-8')).hexdigest()
+
+
+class CombatModel:
+    """
+    Transition probabilities of every turn of a fight.
+
+    States are (player health, enemy health) pairs with both above 0. A turn is the
+    player's action followed by the enemy's reply, exactly as combat.resolve_turn
+    plays it, and ends in another state or in a win or a loss.
+    """
+    def __init__(self, key):
+        """
+        Initialize the CombatModel
+
+        Args:
+            key: Modifiers and health limits of the fight, see combat_key()
+        """
+        (player_attack, player_defense, player_heal,
+         enemy_attack, enemy_defense, enemy_heal,
+         self.max_player_health, self.max_enemy_health) = key
+
+        self.player_damage = damage_distribution(player_attack, enemy_defense)
+        self.enemy_damage = damage_distribution(enemy_attack, player_defense)
+        self.player_healing = heal_distribution(player_heal) if player_heal is not None else None
+        self.enemy_healing = heal_distribution(enemy_heal) if enemy_heal is not None else None
+
+        self.states = [(player_health, enemy_health)
+                       for player_health in range(1, self.max_player_health + 1)
+                       for enemy_health in range(1, self.max_enemy_health + 1)]
+        self.actions = [ATTACK, HEAL] if self.player_healing is not None else [ATTACK]
+
+        # (state, action) -> list of (probability, next state or _WIN/_LOSS)
+        self.transitions = {}
+        for state in self.states:
+            for action in self.actions:
+                outcomes = {}
+                self._player_turn(state, action, outcomes)
+                self.transitions[state, action] = [(probability, outcome) for outcome, probability in outcomes.items()
+                                                   if probability > 0]
+
+    def _player_turn(self, state, action, outcomes):
+        player_health, enemy_health = state
+        if action == ATTACK:
+            for damage, probability in enumerate(self.player_damage):
+                health = max(0, enemy_health - damage)
+                if health <= 0:
+                    outcomes[_WIN] = outcomes.get(_WIN, 0.0) + probability
+                else:
+                    self._enemy_turn(player_health, health, probability, outcomes)
+        else:
+            for healing, probability in enumerate(self.player_healing):
+                self._enemy_turn(min(MAX_HEALTH, player_health + healing), enemy_health, probability, outcomes)
+
+    def _enemy_turn(self, player_health, enemy_health, probability, outcomes):
+        if self.enemy_healing is not None and enemy_health <= ENEMY_HEAL_HEALTH:
+            for healing, heal_probability in enumerate(self.enemy_healing):
+                outcome = (player_health, min(MAX_HEALTH, enemy_health + healing))
+                outcomes[outcome] = outcomes.get(outcome, 0.0) + probability * heal_probability
+        else:
+            for damage, hit_probability in enumerate(self.enemy_damage):
+                health = max(0, player_health - damage)
+                outcome = _LOSS if health <= 0 else (health, enemy_health)
+                outcomes[outcome] = outcomes.get(outcome, 0.0) + probability * hit_probability
+
+    def solve(self, win, loss, run=None, choose=None):
+        """
+        Run value iteration
+
+        Args:
+            win: Value of winning
+            loss: Value of losing
+            run: Value of running, or None if the player can't run
+            choose: Function giving the action to take in a state, or None to take the best one
+
+        Returns:
+            Tuple of (state values, action values) dictionaries, action values by (state, action)
+        """
+        values = {state: 0.0 for state in self.states}
+        action_values = {}
+        terminal = {_WIN: win, _LOSS: loss}
+        for _ in range(MAX_ITERATIONS):
+            change = 0.0
+            for state in self.states:
+                for action in self.actions:
+                    action_values[state, action] = sum(
+                        probability * (terminal[outcome] if outcome in terminal else values[outcome])
+                        for probability, outcome in self.transitions[state, action])
+                if choose is not None:
+                    value = action_values[state, choose(state)]
+                else:
+                    value = max(action_values[state, action] for action in self.actions)
+                    if run is not None:
+                        value = max(value, run)
+                change = max(change, abs(value - values[state]))
+                values[state] = value
+            if change < TOLERANCE:
+                break
+        return values, action_values
+
+
+class CombatTables:
+    """
+    Solved outcomes of every state of a fight, looked up in constant time.
+
+    Rows are the player's health and columns the enemy's, from 0 to the highest
+    health of the fight.
+    """
+    def __init__(self, win, action_win, best_action):
+        """
+        Initialize the CombatTables
+
+        Args:
+            win: Chance of winning from each state, playing to win without running
+            action_win: Dictionary of action to the chance of winning when taking
+                that action first and then playing to win
+            best_action: Action with the best score from each state, may be RUN
+        """
+        self.win = win
+        self.action_win = action_win
+        self.best = best_action
+
+    @classmethod
+    def solve(cls, key):
+        """
+        Solve the tables of a fight
+
+        Args:
+            key: Modifiers and health limits of the fight, see combat_key()
+
+        Returns:
+            A new CombatTables
+        """
+        model = CombatModel(key)
+        win, action_win = model.solve(1.0, 0.0)
+        scores, action_scores = model.solve(WIN_SCORE, LOSS_SCORE, RUN_SCORE)
+
+        def table(value, dead_player=0.0, dead_enemy=1.0):
+            # Fill a health by health table, states with a side at 0 health are decided
+            return [[dead_player if player_health == 0 else dead_enemy if enemy_health == 0
+                     else value((player_health, enemy_health))
+                     for enemy_health in range(model.max_enemy_health + 1)]
+                    for player_health in range(model.max_player_health + 1)]
+
+        def best_action(state):
+            # Running is only suggested when every action scores worse than it
+            action = max(model.actions, key=lambda action: action_scores[state, action])
+            return action if action_scores[state, action] >= RUN_SCORE else RUN
+
+        return cls(
+            table(lambda state: win[state]),
+            {action: table(lambda state: action_win[state, action]) for action in model.actions},
+            table(best_action, None, None)
+        )
+
+    @classmethod
+    def from_json(cls, data):
+        """
+        Create tables from the data written by to_json()
+
+        Args:
+            data: Dictionary read from the cache
+
+        Returns:
+            A new CombatTables
+        """
+        return cls(data['win'], data['action_win'], data['best_action'])
+
+    def to_json(self):
+        """
+        Get the tables as data that can be written to JSON
+
+        Returns:
+            Dictionary of the tables
+        """
+        return {'win': self.win, 'action_win': self.action_win, 'best_action': self.best}
+
+    def win_probability(self, player_health, enemy_health, action=None):
+        """
+        Get the chance of winning a fight
+
+        Args:
+            player_health: The player's health
+            enemy_health: The enemy's health
+            action: Action taken first, or None for the best one
+
+        Returns:
+            Probability of winning when playing to win, or None outside the tables
+            (e.g. an action the player doesn't have)
+        """
+        table = self.win if action is None else self.action_win.get(action)
+        if table is None or not (0 <= player_health < len(table) and 0 <= enemy_health < len(table[0])):
+            return None
+        return table[player_health][enemy_health]
+
+    def best_action(self, player_health, enemy_health):
+        """
+        Get the action with the best chance of winning rather than losing
+
+        Args:
+            player_health: The player's health
+            enemy_health: The enemy's health
+
+        Returns:
+            ATTACK, HEAL or RUN, or None if the fight is decided or outside the tables
+        """
+        if not (0 <= player_health < len(self.best) and 0 <= enemy_health < len(self.best[0])):
+            return None
+        return self.best[player_health][enemy_health]
+
+
+class CombatSolver:
+    """
+    Exact fight outcomes for hints and balancing, without sampling.
+
+    A fight is a Markov decision process over (player health, enemy health). Tables
+    are solved once per combination of modifiers, kept in memory and cached on disk,
+    so looking up a state afterwards is constant time.
+    """
+    def __init__(self, cache_path=CACHE_PATH):
+        """
+        Initialize the CombatSolver
+
+        Args:
+            cache_path: JSON file solved tables are cached in
+        """
+        self.cache_path = cache_path
+        self.tables = None
+        self.models = {}
+
+    def solve(self, state, save=True):
+        """
+        Get the solved tables of a fight
+
+        Args:
+            state: CombatState of the fight, only its modifiers and health are used
+            save: Whether to write newly solved tables to the cache file
+
+        Returns:
+            CombatTables of the fight
+        """
+        if self.tables is None:
+            self.tables = self._read_cache()
+        key = combat_key(state)
+        name = ','.join(str(value) for value in key)
+        tables = self.tables.get(name)
+        if tables is None:
+            tables = self.tables[name] = CombatTables.solve(key)
+            if save:
+                self.save()
+        return tables
+
+    def policy_win_probability(self, state, policy):
+        """
+        Get the chance of winning a fight when the player follows a policy
+
+        Args:
+            state: CombatState the fight starts from
+            policy: Function choosing the player's action from a CombatState, e.g.
+                combat.attack_policy
+
+        Returns:
+            Probability of winning from the state
+        """
+        if state.player.health <= 0:
+            return 0.0
+        if state.enemy.health <= 0:
+            return 1.0
+        key = combat_key(state)
+        model = self.models.get(key)
+        if model is None:
+            model = self.models[key] = CombatModel(key)
+
+        # Ask the policy once per state, with a state carrying that health
+        player = state.player.copy()
+        enemy = state.enemy.copy()
+        probe = CombatState(player, enemy)
+        choices = {}
+        for health in model.states:
+            player.health, enemy.health = health
+            action = policy(probe)
+            choices[health] = action if action in model.actions else ATTACK
+
+        values, _ = model.solve(1.0, 0.0, choose=choices.__getitem__)
+        return values[state.player.health, state.enemy.health]
+
+    def save(self):
+        """
+        Write the solved tables to the cache file
+        """
+        # Write to a temporary file first so a half-written cache is never read
+        temp_path = self.cache_path + ".tmp"
+        try:
+            with open(temp_path, 'w') as f:
+                json.dump({'rules': rules_hash(),
+                           'tables': {name: tables.to_json() for name, tables in self.tables.items()}}, f)
+            os.replace(temp_path, self.cache_path)
+        except OSError as e:
+            print(f"Error writing combat tables {self.cache_path}: {e}")
+
+    def _read_cache(self):
+        # Cached tables, or nothing if the cache is missing, unreadable or from other rules
+        try:
+            with open(self.cache_path, 'r') as f:
+                cache = json.load(f)
+            if cache.get('rules') == rules_hash():
+                return {name: CombatTables.from_json(data) for name, data in cache['tables'].items()}
+        except (OSError, ValueError, KeyError):
+            pass
+        return {}
+
+
+# Shared solver used for combat hints and balancing
+combat_solver = CombatSolver()
+
+
+if __name__ == "__main__":
+    # Solve the fights of every level ahead of time and print the chances of winning
+    from src.balance import load_level_fights
+
+    for level_id, enemy_name, state in load_level_fights(*sys.argv[1:2]):
+        tables = combat_solver.solve(state, save=False)
+        player_health, enemy_health = state.player.health, state.enemy.health
+        print(f"{level_id:12} {enemy_name:20} win {tables.win_probability(player_health, enemy_health) * 100:6.2f}%  "
+              f"best {tables.best_action(player_health, enemy_health)}")
+    combat_solver.save()
+    print(f"Tables written to {combat_solver.cache_path}")
@@ -0,0 +1,90 @@
+import pygame
+
+# Whether screens use dirty-rect rendering, set from the --dirty-rects option
+dirty_rects_enabled = False
+
+
+def set_dirty_rects_enabled(enabled):
+    """
+    Turn dirty-rect rendering on or off for screens created afterwards
+
+    Args:
+        enabled: True to only push changed regions to the display
+    """
+    global dirty_rects_enabled
+    dirty_rects_enabled = enabled
+
+
+class DirtyRectRenderer:
+    """
+    Tracks which regions of the screen changed and pushes only those to the display.
+
+    Screens describe each region with a rect and a state value. When a region's state
+    differs from the previous frame the region is marked dirty. If nothing is dirty
+    the screen can skip drawing the frame entirely. When disabled every frame is
+    redrawn and flipped, exactly as before.
+    """
+    def __init__(self, enabled=None):
+        """
+        Initialize the DirtyRectRenderer
+
+        Args:
+            enabled: True to use dirty rects, defaults to the --dirty-rects setting
+        """
+        self.enabled = dirty_rects_enabled if enabled is None else enabled
+        self.states = {}
+        self.dirty = []
+        self.full_redraw = True
+
+    def track(self, name, rect, state):
+        """
+        Record the state of a screen region, marking it dirty if it changed
+
+        Args:
+            name: Unique name of the region
+            rect: The region's rect on the screen
+            state: Any comparable value describing what is drawn in the region
+
+        Returns:
+            True if the region changed since the last frame
+        """
+        if name in self.states and self.states[name] == state:
+            return False
+        self.states[name] = state
+        self.mark(rect)
+        return True
+
+    def mark(self, rect):
+        """
+        Mark a region of the screen as needing to be pushed to the display
+
+        Args:
+            rect: The region's rect on the screen
+        """
+        self.dirty.append(pygame.Rect(rect))
+
+    def mark_all(self):
+        """
+        Mark the whole screen as needing to be redrawn
+        """
+        self.full_redraw = True
+
+    def needs_redraw(self):
+        """
+        Check whether the screen has to be drawn this frame
+
+        Returns:
+            True if dirty rects are disabled or anything changed
+        """
+        return not self.enabled or self.full_redraw or bool(self.dirty)
+
+    def present(self):
+        """
+        Push the changed regions (or the whole frame) to the display
+        """
+        if not self.enabled or self.full_redraw:
+            pygame.display.flip()
+        elif self.dirty:
+            pygame.display.update(self.dirty)
+        self.dirty = []
+        self.full_redraw = False
@@ -0,0 +1,169 @@
+class EnemyIndex:
+    """
+    Spatial index of a level's enemies.
+
+    Enemies are indexed by tile coordinate for O(1) collision lookups, and grouped
+    into coarse buckets of tiles so drawing only has to look at enemies near the
+    viewport. The index wraps the level's enemies list and keeps both in sync when
+    enemies are removed or moved.
+    """
+    def __init__(self, enemies, bucket_size=8):
+        """
+        Initialize the EnemyIndex
+
+        Args:
+            enemies: The level's list of enemy dictionaries
+            bucket_size: Width and height in tiles of each viewport bucket
+        """
+        self.enemies = enemies
+        self.bucket_size = bucket_size
+        self.count = 0
+        self.positions = {}
+        self.buckets = {}
+        for enemy in enemies:
+            self._add(enemy)
+
+    def get_enemy_at(self, x, y):
+        """
+        Get the enemy at a tile position
+
+        Args:
+            x: Tile column
+            y: Tile row
+
+        Returns:
+            Enemy dictionary if found, None otherwise
+        """
+        enemies = self.positions.get((x, y))
+        return enemies[0] if enemies else None
+
+    def enemies_in_rect(self, left, top, right, bottom):
+        """
+        Get the enemies inside a rectangle of tiles
+
+        Args:
+            left: First tile column
+            top: First tile row
+            right: Last tile column (inclusive)
+            bottom: Last tile row (inclusive)
+
+        Returns:
+            List of enemy dictionaries in the rectangle
+        """
+        found = []
+        for bucket_y in range(top // self.bucket_size, bottom // self.bucket_size + 1):
+            for bucket_x in range(left // self.bucket_size, right // self.bucket_size + 1):
+                for enemy in self.buckets.get((bucket_x, bucket_y), ()):
+                    x, y = enemy_position(enemy)
+                    if left <= x <= right and top <= y <= bottom:
+                        found.append(enemy)
+        return found
+
+    def remove(self, enemy):
+        """
+        Remove an enemy from the index and from the level's enemies list
+
+        Args:
+            enemy: The enemy dictionary to remove
+
+        Returns:
+            True if the enemy was found and removed
+        """
+        for i, e in enumerate(self.enemies):
+            if e is enemy:
+                self.enemies.pop(i)
+                self._discard(enemy)
+                return True
+        return False
+
+    def move(self, enemy, x, y):
+        """
+        Move an enemy to a new tile position
+
+        Args:
+            enemy: The enemy dictionary to move
+            x: New tile column
+            y: New tile row
+        """
+        self._discard(enemy)
+        enemy['position'] = {'x': x, 'y': y}
+        self._add(enemy)
+
+    def is_current(self, enemies):
+        """
+        Check if the index still matches an enemies list
+
+        Args:
+            enemies: The level's list of enemy dictionaries
+
+        Returns:
+            False if the list was replaced or changed without going through the index
+        """
+        return enemies is self.enemies and len(enemies) == self.count
+
+    def __len__(self):
+        return len(self.enemies)
+
+    def _add(self, enemy):
+        self.count += 1
+        position = enemy_position(enemy)
+        if position is not None:
+            self.positions.setdefault(position, []).append(enemy)
+            self.buckets.setdefault(self._bucket(position), []).append(enemy)
+
+    def _discard(self, enemy):
+        self.count -= 1
+        position = enemy_position(enemy)
+        if position is not None:
+            _remove_entry(self.positions, position, enemy)
+            _remove_entry(self.buckets, self._bucket(position), enemy)
+
+    def _bucket(self, position):
+        return (position[0] // self.bucket_size, position[1] // self.bucket_size)
+
+
+def _remove_entry(index, key, enemy):
+    # Remove one enemy (by identity) from an index entry, dropping the entry once empty
+    entries = index.get(key, [])
+    for i, e in enumerate(entries):
+        if e is enemy:
+            entries.pop(i)
+            break
+    if not entries:
+        index.pop(key, None)
+
+
+def enemy_position(enemy):
+    """
+    Get an enemy's tile position
+
+    Args:
+        enemy: Enemy dictionary
+
+    Returns:
+        Tuple of (x, y), or None if the enemy has no position
+    """
+    if 'position' not in enemy:
+        return None
+    return (enemy['position'].get('x', 0), enemy['position'].get('y', 0))
+
+
+def get_enemy_index(level):
+    """
+    Get the enemy index for a level, building it if needed
+
+    The index is stored in the level dictionary so it is shared by the map and
+    combat screens for the whole level session.
+
+    Args:
+        level: The level dictionary from character_data['level']
+
+    Returns:
+        The EnemyIndex for the level's enemies
+    """
+    enemies = level.setdefault('enemies', [])
+    index = level.get('enemy_index')
+    if index is None or not index.is_current(enemies):
+        index = EnemyIndex(enemies)
+        level['enemy_index'] = index
+    return index
@@ -0,0 +1,122 @@
+import time
+from collections import deque
+
+import pygame
+
+
+class FrameScheduler:
+    """
+    Frame pacing shared by all screens.
+
+    While something is moving (held movement keys, cooldowns, timers) frames run at
+    the full frame rate. Otherwise the scheduler blocks in pygame.event.wait() until
+    input arrives or a timeout passes, so idle screens do not spin a CPU core.
+    """
+    def __init__(self, fps=60, animation_fps=30, idle_timeout=500):
+        """
+        Initialize the FrameScheduler
+
+        Args:
+            fps: Frame rate while busy
+            animation_fps: Frame rate for screens that only have cosmetic animations
+            idle_timeout: Longest time in milliseconds to block waiting for input when idle
+        """
+        self.fps = fps
+        self.animation_fps = animation_fps
+        self.idle_timeout = idle_timeout
+        self.clock = pygame.time.Clock()
+        self.wait_timeout = 0
+        self.sleep_time = 0.0
+        self.wait_time = 0.0
+        self.frame_time = 0
+        self.debug_mode = False
+
+        # Recent (frame seconds, sleep seconds) pairs for reporting
+        self.frames = deque(maxlen=120)
+        self.total_frames = 0
+
+    def get_events(self):
+        """
+        Get the pending events, blocking until input arrives if the last frame was idle
+
+        Returns:
+            List of pygame events
+        """
+        if not self.wait_timeout:
+            return pygame.event.get()
+
+        start = time.perf_counter()
+        event = pygame.event.wait(self.wait_timeout)
+        self.wait_time = time.perf_counter() - start
+        self.sleep_time += self.wait_time
+        self.wait_timeout = 0
+
+        events = [] if event.type == pygame.NOEVENT else [event]
+        events.extend(pygame.event.get())
+        return events
+
+    def tick(self, busy=False, animating=False):
+        """
+        End the current frame
+
+        Args:
+            busy: True while movement, cooldowns or timers need every frame
+            animating: True if the screen has a cosmetic animation that should keep
+                updating at a reduced rate while idle
+        """
+        if busy:
+            start = time.perf_counter()
+            self.clock.tick(self.fps)
+            self.sleep_time += time.perf_counter() - start
+        else:
+            # The wait happens in the next get_events call so it can end early on input
+            self.clock.tick()
+            if animating:
+                self.wait_timeout = max(1, 1000 // self.animation_fps)
+            else:
+                self.wait_timeout = self.idle_timeout
+
+        # Time spent blocked waiting for input is not game time, so timers don't jump after idling
+        self.frame_time = max(0, self.clock.get_time() - int(self.wait_time * 1000))
+
+        self.frames.append((self.clock.get_time() / 1000.0, self.sleep_time))
+        self.sleep_time = 0.0
+        self.wait_time = 0.0
+        self.total_frames += 1
+
+    def get_time(self):
+        """
+        Get the length of the last frame
+
+        Returns:
+            Milliseconds between the last two ticks, not counting time spent waiting for input
+        """
+        return self.frame_time
+
+    def stats(self):
+        """
+        Get the measured frame rate and the fraction of time spent sleeping
+
+        Returns:
+            Dictionary with fps, sleep_ratio and total frames
+        """
+        frame_time = sum(frame for frame, _ in self.frames)
+        sleep_time = sum(sleep for _, sleep in self.frames)
+        return {
+            'fps': len(self.frames) / frame_time if frame_time else 0.0,
+            'sleep_ratio': min(1.0, sleep_time / frame_time) if frame_time else 0.0,
+            'frames': self.total_frames
+        }
+
+    def report(self):
+        """
+        Print the frame rate and sleep ratio when debug mode is enabled
+        """
+        if self.debug_mode:
+            stats = self.stats()
+            print(f"Frame scheduler: {stats['fps']:.1f} FPS, {stats['sleep_ratio'] * 100:.0f}% sleeping, "
+                  f"{stats['frames']} frames")
+
+
+# Shared frame scheduler used by all screens
+frame_scheduler = FrameScheduler()
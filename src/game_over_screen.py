@@ -1,6 +1,7 @@
 import pygame
 import sys
-from src.ui import WIDTH, HEIGHT, WHITE, BLACK, DARK_GRAY, BLUE, LIGHT_BLUE, GREEN, RED, YELLOW, GRAY, HIGHLIGHT
+from src.frame_scheduler import frame_scheduler
+from src.ui import WIDTH, HEIGHT, WHITE, BLACK, DARK_GRAY, BLUE, LIGHT_BLUE, GREEN, RED, YELLOW, GRAY, HIGHLIGHT, get_gradient_surface, get_font, render_text
 
 def game_over_screen(screen, character_data, enemy_defeated, victory=False):
     """
@@ -15,9 +16,9 @@ def game_over_screen(screen, character_data, enemy_defeated, victory=False):
         bool: True to restart the game, False to quit
     """
     # Set up fonts
-    title_font = pygame.font.SysFont('Arial', 64, bold=True)
-    stats_font = pygame.font.SysFont('Arial', 32)
-    instruction_font = pygame.font.SysFont('Arial', 24)
+    title_font = get_font(64, bold=True)
+    stats_font = get_font(32)
+    instruction_font = get_font(24)
 
     # Set colors based on victory or defeat
     if victory:
@@ -30,16 +31,16 @@ def game_over_screen(screen, character_data, enemy_defeated, victory=False):
         background_color = (50, 0, 0)  # Dark red background for defeat
 
     # Create text surfaces
-    game_over_text = title_font.render(title_text, True, title_color)
+    game_over_text = render_text(title_font, title_text, title_color)
 
     # Create stats text
     if victory:
-        stats_text = stats_font.render(f"Congratulations! You defeated all enemies!", True, WHITE)
+        stats_text = render_text(stats_font, f"Congratulations! You defeated all enemies!", WHITE)
     else:
-        stats_text = stats_font.render(f"You were defeated!", True, WHITE)
+        stats_text = render_text(stats_font, f"You were defeated!", WHITE)
 
     # Create instruction text
-    restart_text = instruction_font.render("Press R to restart or ESC to quit", True, WHITE)
+    restart_text = render_text(instruction_font, "Press R to restart or ESC to quit", WHITE)
 
     # Get text rectangles for positioning
     game_over_rect = game_over_text.get_rect(center=(WIDTH//2, HEIGHT//3))
@@ -48,11 +49,10 @@ def game_over_screen(screen, character_data, enemy_defeated, victory=False):
 
     # Main loop
     running = True
-    clock = pygame.time.Clock()
     restart = False
 
     while running:
-        for event in pygame.event.get():
+        for event in frame_scheduler.get_events():
             if event.type == pygame.QUIT:
                 pygame.quit()
                 sys.exit()
@@ -66,16 +66,8 @@ def game_over_screen(screen, character_data, enemy_defeated, victory=False):
                     running = False
 
         # Create a gradient background
-        for y in range(HEIGHT):
-            # Calculate color gradient
-            if victory:
-                # Green gradient for victory
-                color_value = max(0, background_color[1] - y // 20)
-                pygame.draw.line(screen, (0, color_value, 0), (0, y), (WIDTH, y))
-            else:
-                # Red gradient for defeat
-                color_value = max(0, background_color[0] - y // 20)
-                pygame.draw.line(screen, (color_value, 0, 0), (0, y), (WIDTH, y))
+        # Green gradient for victory, red gradient for defeat
+        screen.blit(get_gradient_surface((WIDTH, HEIGHT), background_color, 20), (0, 0))
 
         # Draw decorative border
         border_color = GREEN if victory else RED
@@ -92,6 +84,7 @@ def game_over_screen(screen, character_data, enemy_defeated, victory=False):
         restart_text = instruction_font.render("Press R to restart or ESC to quit", True, (pulse_value, pulse_value, pulse_value))
 
         pygame.display.flip()
-        clock.tick(60)
+        # Only the pulsing prompt animates, so it doesn't need the full frame rate
+        frame_scheduler.tick(animating=True)
 
     return restart
@@ -0,0 +1,702 @@
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+import xml.etree.ElementTree as ET
+from array import array
+
+import numpy
+import pygame
+
+from src.asset_manager import asset_manager, decode_image, decoded_surface
+from src.collision import WalkabilityGrid, get_walkability_grid
+from src.map_renderer import UnsupportedMapError, load_tmx
+from src.map_stream import is_infinite_map
+
+# Compiled levels are written next to level.json
+BUNDLE_NAME = "level.qqb"
+BUNDLE_MAGIC = b"QQLB"
+BUNDLE_VERSION = 2
+
+# Magic, format version, metadata length in bytes, offset of the data block
+HEADER = struct.Struct("<4sIII")
+
+# Binary sections are aligned so they can be viewed in place as uint32 arrays
+ALIGNMENT = 16
+
+# Sizes images are pre-scaled to: character card portraits and level selection thumbnails
+PORTRAIT_SIZE = (256, 256)
+THUMBNAIL_SIZE = (128, 128)
+
+# One fixed-size record per enemy, in the same order as the level's enemies list
+ENEMY_DTYPE = numpy.dtype([
+    ('x', '<i2'),
+    ('y', '<i2'),
+    ('health', '<i2'),
+    ('attack', '<i2'),
+    ('defense', '<i2'),
+    ('heal', '<i2'),
+    ('currency', '<i4')
+])
+
+# Bundles opened this session, by level directory and by map path
+_bundles = {}
+_bundles_by_map = {}
+
+
+def bundle_path(level_dir):
+    """
+    Get the path of a level's compiled bundle
+
+    Args:
+        level_dir: Path to the level directory
+
+    Returns:
+        Path to the bundle file (which may not exist yet)
+    """
+    return os.path.join(level_dir, BUNDLE_NAME)
+
+
+def file_hash(path):
+    """
+    Get the SHA-1 hash of a file's contents
+
+    Args:
+        path: Path to the file
+
+    Returns:
+        Hex digest string
+    """
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(65536), b''):
+            sha1.update(block)
+    return sha1.hexdigest()
+
+
+def map_sources(map_path):
+    """
+    Get the files a TMX map is built from: the map, external tilesets and tileset images
+
+    Args:
+        map_path: Path to the TMX file
+
+    Returns:
+        List of file paths
+    """
+    sources = [map_path]
+    pending = [map_path]
+    while pending:
+        path = pending.pop()
+        base = os.path.dirname(path)
+        root = ET.parse(path).getroot()
+        for element in root.iter():
+            source = element.get('source')
+            if element.tag not in ('tileset', 'image') or not source:
+                continue
+            source = os.path.normpath(os.path.join(base, source))
+            if source not in sources:
+                sources.append(source)
+                if source.endswith('.tsx'):
+                    pending.append(source)
+    return sources
+
+
+def bundle_images(level_data):
+    """
+    Get the images a level uses and the sizes they are drawn at
+
+    Args:
+        level_data: Level definition from level.json
+
+    Returns:
+        Dictionary of image path (relative to the level directory) to a list of sizes,
+        where None means the image's own size
+    """
+    images = {}
+
+    def add(path, size):
+        if path:
+            sizes = images.setdefault(path, [])
+            if size not in sizes:
+                sizes.append(size)
+
+    player = level_data.get('player', {})
+    add(player.get('image'), PORTRAIT_SIZE)
+    add(player.get('image'), THUMBNAIL_SIZE)
+    add(player.get('icon'), None)
+    for enemy in level_data.get('enemies', []):
+        add(enemy.get('image'), PORTRAIT_SIZE)
+        add(enemy.get('icon'), None)
+
+    # Fallback for missing player images and icons
+    add('placeholder.png', THUMBNAIL_SIZE)
+    add('placeholder.png', None)
+    return images
+
+
+def enemy_table(enemies):
+    """
+    Pack a level's enemies into fixed-size records
+
+    Args:
+        enemies: List of enemy dictionaries
+
+    Returns:
+        NumPy structured array with ENEMY_DTYPE, modifiers are 0 for missing items
+    """
+    table = numpy.zeros(len(enemies), dtype=ENEMY_DTYPE)
+    for i, enemy in enumerate(enemies):
+        position = enemy.get('position', {})
+        items = enemy.get('items', {})
+        table[i] = (
+            position.get('x', 0),
+            position.get('y', 0),
+            enemy.get('health', 0),
+            items.get('attack', {}).get('modifier', 0),
+            items.get('defense', {}).get('modifier', 0),
+            items.get('heal', {}).get('modifier', 0),
+            enemy.get('currency', 0)
+        )
+    return table
+
+
+class _BundleWriter:
+    # Collects binary sections and remembers where each one starts in the data block
+    def __init__(self):
+        self.parts = []
+        self.size = 0
+
+    def add(self, data):
+        offset = self.size
+        data = bytes(data)
+        padding = -len(data) % ALIGNMENT
+        self.parts.append(data + b'\0' * padding)
+        self.size += len(data) + padding
+        return offset
+
+
+def compile_level(level_dir):
+    """
+    Compile a level directory into a binary bundle
+
+    The bundle holds the level definition, the map's tile layers as packed uint32
+    arrays, tile images, the collision grid, an enemy table and the level's images
+    decoded and pre-scaled to the sizes they are drawn at. Images are decoded with
+    Pillow and no display surface is needed, so levels can be compiled on a
+    background thread.
+
+    Args:
+        level_dir: Path to the level directory
+
+    Returns:
+        Path to the written bundle
+
+    Raises:
+        ValueError: If the map uses features that can't be bundled
+    """
+    level_json_path = os.path.join(level_dir, "level.json")
+    with open(level_json_path, 'r') as f:
+        level_data = json.load(f)
+
+    map_path = os.path.join(level_dir, level_data['path'])
+    if is_infinite_map(map_path):
+        raise ValueError("infinite maps are streamed, not bundled")
+    try:
+        tmx_data = load_tmx(map_path, load_images=False)
+    except UnsupportedMapError as e:
+        raise ValueError(f"{e} can't be bundled")
+    for tileset in tmx_data.tilesets:
+        tileset.image = decoded_surface(decode_image(tileset.source))
+        if tileset.colorkey:
+            tileset.image.set_colorkey(pygame.Color(f"#{tileset.colorkey.lstrip('#')}"))
+    writer = _BundleWriter()
+
+    # Tile layers as little-endian uint32 gids
+    layers = []
+    gids = set()
+    for layer in tmx_data.visible_layers:
+        gids.update(numpy.unique(layer.gids).tolist())
+        layers.append({'name': layer.name, 'offset': writer.add(layer.gids.astype('<u4').tobytes())})
+
+    # Tile images at their original size, they are scaled to the zoom level when drawn
+    tiles = []
+    for gid in sorted(gids):
+        tile = tmx_data.get_tile_image_by_gid(gid) if gid else None
+        if tile:
+            pixel_format = 'RGBA' if tile.get_flags() & pygame.SRCALPHA else 'RGB'
+            colorkey = tile.get_colorkey()
+            tiles.append({
+                'gid': gid,
+                'format': pixel_format,
+                'colorkey': list(colorkey) if colorkey else None,
+                'offset': writer.add(pygame.image.tobytes(tile, pixel_format))
+            })
+
+    # Collision grid for the level's wall tiles
+    grid = get_walkability_grid(tmx_data, level_data.get('wall_tiles', []))
+
+    # Decoded and pre-scaled images
+    images = []
+    for path, sizes in bundle_images(level_data).items():
+        full_path = os.path.join(level_dir, path)
+        if not os.path.exists(full_path):
+            continue
+        decoded = decode_image(full_path)
+        image = decoded_surface(decoded)
+        pixel_format = decoded[0]
+        for size in sizes:
+            scaled = image if size is None or image.get_size() == size else pygame.transform.scale(image, size)
+            images.append({
+                'path': path,
+                'size': list(size) if size else None,
+                'width': scaled.get_width(),
+                'height': scaled.get_height(),
+                'format': pixel_format,
+                'offset': writer.add(pygame.image.tobytes(scaled, pixel_format))
+            })
+
+    sources = [level_json_path] + map_sources(map_path) + [
+        os.path.join(level_dir, path) for path in bundle_images(level_data)
+        if os.path.exists(os.path.join(level_dir, path))
+    ]
+    metadata = {
+        'level': level_data,
+        'sources': [{
+            'path': os.path.relpath(path, level_dir),
+            'mtime_ns': os.stat(path).st_mtime_ns,
+            'size': os.stat(path).st_size,
+            'sha1': file_hash(path)
+        } for path in sources],
+        'map': {
+            'path': level_data['path'],
+            'width': tmx_data.width,
+            'height': tmx_data.height,
+            'tilewidth': tmx_data.tilewidth,
+            'tileheight': tmx_data.tileheight,
+            'tilesets': [{
+                'name': tileset.name,
+                'firstgid': tileset.firstgid,
+                'tilecount': tileset.tilecount
+            } for tileset in tmx_data.tilesets],
+            'tiledgidmap': {},
+            'layers': layers,
+            'tiles': tiles
+        },
+        'collision': {
+            'wall_tiles': sorted(level_data.get('wall_tiles', [])),
+            'offset': writer.add(grid.cells)
+        },
+        'enemies': {
+            'count': len(level_data.get('enemies', [])),
+            'offset': writer.add(enemy_table(level_data.get('enemies', [])).tobytes())
+        },
+        'images': images
+    }
+
+    meta = json.dumps(metadata).encode('utf-8')
+    data_offset = HEADER.size + len(meta)
+    data_offset += -data_offset % ALIGNMENT
+
+    # Write to a temporary file first so a half-written bundle is never picked up
+    # (named per thread, as the preloader may be compiling the same level)
+    path = bundle_path(level_dir)
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(HEADER.pack(BUNDLE_MAGIC, BUNDLE_VERSION, len(meta), data_offset))
+        f.write(meta)
+        f.write(b'\0' * (data_offset - HEADER.size - len(meta)))
+        for part in writer.parts:
+            f.write(part)
+    os.replace(temp_path, path)
+    return path
+
+
+class BundleTileset:
+    """
+    Tileset entry of a bundled map (the fields collision checks use)
+    """
+    def __init__(self, name, firstgid, tilecount):
+        self.name = name
+        self.firstgid = firstgid
+        self.tilecount = tilecount
+
+
+class BundleLayer:
+    """
+    Tile layer of a bundled map, data rows are views into the bundle
+    """
+    def __init__(self, name, data):
+        self.name = name
+        self.data = data
+        self.visible = True
+
+
+class BundleMap:
+    """
+    Map loaded from a level bundle.
+
+    Provides the parts of pytmx's TiledMap used by the renderer, collision and map
+    screen, so it can be used anywhere a loaded TMX map is expected.
+    """
+    def __init__(self, filename, width, height, tilewidth, tileheight, tilesets, tiledgidmap, layers, tiles):
+        self.filename = filename
+        self.width = width
+        self.height = height
+        self.tilewidth = tilewidth
+        self.tileheight = tileheight
+        self.tilesets = tilesets
+        self.tiledgidmap = tiledgidmap
+        self.layers = layers
+        self.tiles = tiles
+
+    @property
+    def visible_layers(self):
+        return [layer for layer in self.layers if layer.visible]
+
+    def get_tile_image_by_gid(self, gid):
+        """
+        Get the tile image for a gid
+
+        Args:
+            gid: The tile gid from the layer data
+
+        Returns:
+            A pygame Surface, or None if the gid has no image
+        """
+        return self.tiles.get(gid)
+
+
+class LevelBundle:
+    """
+    A compiled level bundle opened with mmap.
+
+    Layer data, the collision grid, the enemy table and images are read directly
+    from the mapped file without copying.
+    """
+    def __init__(self, path):
+        """
+        Open a bundle
+
+        Args:
+            path: Path to the bundle file
+
+        Raises:
+            ValueError: If the file is not a bundle of the current version
+        """
+        self.path = path
+        self.directory = os.path.dirname(path)
+        with open(path, 'rb') as f:
+            self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.mmap)
+
+        magic, version, meta_length, data_offset = HEADER.unpack_from(self.view, 0)
+        if magic != BUNDLE_MAGIC or version != BUNDLE_VERSION:
+            raise ValueError(f"{path} is not a version {BUNDLE_VERSION} level bundle")
+        self.metadata = json.loads(bytes(self.view[HEADER.size:HEADER.size + meta_length]))
+        self.data = self.view[data_offset:]
+
+    def is_current(self):
+        """
+        Check the bundle against the files it was compiled from
+
+        Files whose modification time changed are hashed, so touching a file
+        (e.g. a git checkout) doesn't force a rebuild.
+
+        Returns:
+            False if any source file was changed or removed
+        """
+        for source in self.metadata['sources']:
+            path = os.path.join(self.directory, source['path'])
+            try:
+                stat = os.stat(path)
+            except OSError:
+                return False
+            if stat.st_size != source['size']:
+                return False
+            if stat.st_mtime_ns != source['mtime_ns'] and file_hash(path) != source['sha1']:
+                return False
+        return True
+
+    def level_data(self):
+        """
+        Get the level definition
+
+        Returns:
+            A fresh copy of the level.json dictionary
+        """
+        return json.loads(json.dumps(self.metadata['level']))
+
+    def map_path(self):
+        """
+        Get the path of the TMX map the bundle was compiled from
+
+        Returns:
+            Path to the TMX file
+        """
+        return os.path.join(self.directory, self.metadata['map']['path'])
+
+    def load_map(self):
+        """
+        Create a map from the bundle's layers and tiles
+
+        The collision grid for the level's wall tiles is attached to the map, so
+        get_walkability_grid doesn't have to compute it.
+
+        Returns:
+            A BundleMap
+        """
+        info = self.metadata['map']
+        width, height = info['width'], info['height']
+        tile_size = (info['tilewidth'], info['tileheight'])
+
+        layers = []
+        for layer in info['layers']:
+            data = self._uint32(layer['offset'], width * height)
+            layers.append(BundleLayer(layer['name'], [data[y * width:(y + 1) * width] for y in range(height)]))
+
+        tiles = {}
+        for tile in info['tiles']:
+            size = tile_size[0] * tile_size[1] * len(tile['format'])
+            image = pygame.image.frombuffer(
+                self.data[tile['offset']:tile['offset'] + size], tile_size, tile['format'])
+            if tile['colorkey']:
+                image.set_colorkey(tile['colorkey'])
+            tiles[tile['gid']] = image
+
+        tmx_data = BundleMap(
+            self.map_path(),
+            width,
+            height,
+            tile_size[0],
+            tile_size[1],
+            [BundleTileset(t['name'], t['firstgid'], t['tilecount']) for t in info['tilesets']],
+            {int(gid): tiled for gid, tiled in info['tiledgidmap'].items()},
+            layers,
+            tiles
+        )
+        tmx_data.walkability_grids = {tuple(self.metadata['collision']['wall_tiles']): self.walkability_grid()}
+        return tmx_data
+
+    def walkability_grid(self):
+        """
+        Get the precomputed collision grid
+
+        Returns:
+            A WalkabilityGrid whose cells are a view into the bundle
+        """
+        info = self.metadata['map']
+        offset = self.metadata['collision']['offset']
+        return WalkabilityGrid(info['width'], info['height'],
+                               self.data[offset:offset + info['width'] * info['height']])
+
+    def enemy_table(self):
+        """
+        Get the packed enemy table
+
+        Returns:
+            Read-only NumPy structured array with ENEMY_DTYPE
+        """
+        enemies = self.metadata['enemies']
+        return numpy.frombuffer(self.data, dtype=ENEMY_DTYPE, count=enemies['count'], offset=enemies['offset'])
+
+    def images(self):
+        """
+        Get the bundle's decoded images
+
+        Returns:
+            Dictionary of (absolute path, size) to a pygame Surface viewing the bundle,
+            where size is None for an image at its own size
+        """
+        images = {}
+        for image in self.metadata['images']:
+            size = (image['width'], image['height'])
+            length = size[0] * size[1] * len(image['format'])
+            surface = pygame.image.frombuffer(
+                self.data[image['offset']:image['offset'] + length], size, image['format'])
+            images[self._image_key(image)] = surface
+        return images
+
+    def image_keys(self):
+        """
+        Get the keys of the images returned by images(), without creating the surfaces
+
+        Returns:
+            List of (absolute path, size) tuples
+        """
+        return [self._image_key(image) for image in self.metadata['images']]
+
+    def close(self):
+        """
+        Close the bundle
+
+        The file stays mapped until surfaces and maps still viewing it (e.g. the map
+        on screen) are freed, it is unmapped right away otherwise.
+        """
+        try:
+            self.data.release()
+            self.view.release()
+            self.mmap.close()
+        except BufferError:
+            pass
+
+    def _image_key(self, image):
+        # Key of an image record in the asset manager's packed images
+        path = os.path.normpath(os.path.abspath(os.path.join(self.directory, image['path'])))
+        return (path, tuple(image['size']) if image['size'] else None)
+
+    def _uint32(self, offset, count):
+        data = self.data[offset:offset + count * 4]
+        if sys.byteorder != 'little':
+            values = array('I')
+            values.frombytes(data)
+            values.byteswap()
+            return values
+        return data.cast('I')
+
+
+def read_level_bundle(level_dir):
+    """
+    Open a level's bundle if it is up to date, without compiling or registering it
+
+    Nothing shared is changed, so this can be called on a worker thread. The bundle
+    is registered with register_level_bundle() on the main thread.
+
+    Args:
+        level_dir: Path to the level directory
+
+    Returns:
+        The LevelBundle, or None if the bundle is missing, stale or can't be read
+    """
+    path = bundle_path(level_dir)
+    try:
+        if os.path.exists(path):
+            bundle = LevelBundle(path)
+            if bundle.is_current():
+                return bundle
+            print(f"Level bundle {path} is out of date")
+            bundle.close()
+    except Exception as e:
+        print(f"Error opening level bundle {path}: {e}")
+    return None
+
+
+def register_level_bundle(level_dir, bundle):
+    """
+    Use a bundle for a level's maps and images for the rest of the session
+
+    A different bundle registered for the level before is closed and its images
+    are unregistered.
+
+    Args:
+        level_dir: Path to the level directory
+        bundle: LevelBundle of the level, or None to drop the registered one
+
+    Returns:
+        The bundle
+    """
+    key = os.path.normpath(os.path.abspath(level_dir))
+    existing = _bundles.get(key)
+    if existing is bundle:
+        return bundle
+    if existing is not None:
+        _close_bundle(key, existing)
+    if bundle is None:
+        return None
+
+    _bundles[key] = bundle
+    _bundles_by_map[os.path.normpath(os.path.abspath(bundle.map_path()))] = bundle
+
+    # Images are served from the bundle instead of decoding the PNGs
+    asset_manager.add_packed_images(bundle.images())
+    return bundle
+
+
+def open_level_bundle(level_dir, rebuild=True):
+    """
+    Open a level's bundle, compiling it first if it is missing or stale
+
+    Opened bundles are registered so maps and images are read from them instead of
+    the source files for the rest of the session. A registered bundle that is still
+    up to date is returned as it is, a stale one is closed and replaced.
+
+    Args:
+        level_dir: Path to the level directory
+        rebuild: Whether to compile the bundle if it is missing or out of date
+
+    Returns:
+        The LevelBundle, or None if there is no usable bundle
+    """
+    existing = get_level_bundle(level_dir)
+    if existing is not None and existing.is_current():
+        return existing
+
+    bundle = read_level_bundle(level_dir)
+    if bundle is None and rebuild:
+        path = bundle_path(level_dir)
+        try:
+            print(f"Compiling level bundle {path}")
+            bundle = LevelBundle(compile_level(level_dir))
+        except Exception as e:
+            print(f"Error compiling level bundle {path}: {e}")
+
+    # The stale bundle is replaced, or dropped if there is no usable one
+    return register_level_bundle(level_dir, bundle)
+
+
+def _close_bundle(key, bundle):
+    # Unregister a bundle registered for a level and its images, then close it
+    del _bundles[key]
+    map_key = os.path.normpath(os.path.abspath(bundle.map_path()))
+    if _bundles_by_map.get(map_key) is bundle:
+        del _bundles_by_map[map_key]
+    asset_manager.remove_packed_images(bundle.image_keys())
+    bundle.close()
+
+
+def get_level_bundle(level_dir):
+    """
+    Get the bundle opened for a level directory this session
+
+    Args:
+        level_dir: Path to the level directory
+
+    Returns:
+        The LevelBundle, or None if the level has no open bundle
+    """
+    return _bundles.get(os.path.normpath(os.path.abspath(level_dir)))
+
+
+def get_bundle_for_map(map_path):
+    """
+    Get an up to date bundle that was compiled from a TMX map
+
+    Args:
+        map_path: Path to the TMX file
+
+    Returns:
+        The LevelBundle, or None if the map has no open bundle or it is stale
+    """
+    bundle = _bundles_by_map.get(os.path.normpath(os.path.abspath(map_path)))
+    if bundle is not None and bundle.is_current():
+        return bundle
+    return None
+
+
+if __name__ == "__main__":
+    # Compile the given level directories, or every level
+    if len(sys.argv) > 1:
+        level_dirs = sys.argv[1:]
+    else:
+        levels_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "levels")
+        level_dirs = [
+            os.path.join(levels_dir, name) for name in sorted(os.listdir(levels_dir))
+            if os.path.exists(os.path.join(levels_dir, name, "level.json"))
+        ]
+
+    for level_dir in level_dirs:
+        path = compile_level(level_dir)
+        print(f"Compiled {level_dir} -> {path} ({os.path.getsize(path) / (1024 * 1024):.1f} MB)")
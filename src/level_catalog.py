@@ -0,0 +1,199 @@
+import json
+import os
+import re
+
+from src.level_bundle import open_level_bundle
+
+LEVELS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "levels")
+
+# Index of level summaries, written next to the level directories
+CATALOG_NAME = "catalog.json"
+CATALOG_VERSION = 2
+
+# Fields level selection shows, copied from level.json into the index
+SUMMARY_FIELDS = ('id', 'name', 'difficulty', 'description', 'path')
+
+
+def natural_key(name):
+    """
+    Sort key that orders numbered names by value, so "10_castle" comes after "2_dungeon"
+
+    Args:
+        name: Directory name
+
+    Returns:
+        Tuple usable as a sort key
+    """
+    return tuple(int(part) if part.isdigit() else part.lower() for part in re.split(r'(\d+)', name))
+
+
+def file_mtime(path):
+    """
+    Get a file's modification time in nanoseconds
+
+    Args:
+        path: Path to the file
+
+    Returns:
+        The modification time, or None if the file doesn't exist
+    """
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+class LevelCatalog:
+    """
+    Index of the levels in the levels directory.
+
+    Level selection only needs a few fields of each level, so those are kept in
+    catalog.json together with the modification times of the files they came from.
+    On refresh only the levels whose level.json or thumbnail changed are parsed again,
+    and the full level definition is only read when a level is hovered or selected.
+    """
+    def __init__(self, levels_dir=LEVELS_DIR):
+        """
+        Initialize the LevelCatalog
+
+        Args:
+            levels_dir: Directory containing the level directories
+        """
+        self.levels_dir = levels_dir
+        self.path = os.path.join(levels_dir, CATALOG_NAME)
+        self.entries = []
+
+    def refresh(self):
+        """
+        Bring the index up to date with the levels directory
+
+        Returns:
+            List of level summaries in directory name order, each with 'directory',
+            'id', 'name', 'difficulty', 'description', 'path' (of the map), 'thumbnail'
+            and 'enemy_count'
+        """
+        if not os.path.exists(self.levels_dir):
+            print(f"Levels directory not found: {self.levels_dir}")
+            self.entries = []
+            return self.entries
+
+        index = self._read_index()
+        levels = {}
+        changed = False
+
+        with os.scandir(self.levels_dir) as it:
+            names = [entry.name for entry in it if entry.is_dir()]
+
+        for name in names:
+            level_dir = os.path.join(self.levels_dir, name)
+            level_json_path = os.path.join(level_dir, "level.json")
+            mtime = file_mtime(level_json_path)
+            if mtime is None:
+                continue
+
+            entry = index.get(name)
+            if entry is not None and entry['mtimes'] == self._source_mtimes(level_dir, entry, mtime):
+                levels[name] = entry
+                continue
+
+            try:
+                levels[name] = self._summarize(level_dir, mtime)
+            except Exception as e:
+                print(f"Error loading level from {level_json_path}: {e}")
+            changed = True
+
+        if changed or levels.keys() != index.keys():
+            self._write_index(levels)
+
+        self.entries = []
+        for name in sorted(levels, key=natural_key):
+            entry = dict(levels[name])
+            del entry['mtimes']
+            entry['directory'] = os.path.join(self.levels_dir, name)
+            self.entries.append(entry)
+        return self.entries
+
+    def load_level(self, entry, rebuild=True):
+        """
+        Read the full definition of a level
+
+        Args:
+            entry: Level summary from refresh()
+            rebuild: Whether to compile the level's bundle if it is missing or stale
+
+        Returns:
+            A fresh copy of the level data, with 'directory' and 'file_path' added
+        """
+        # Prefer the compiled bundle, so its images and map are used too
+        return self.read_level(entry, open_level_bundle(entry['directory'], rebuild=rebuild))
+
+    def read_level(self, entry, bundle=None):
+        """
+        Read the full definition of a level without opening its bundle
+
+        Nothing shared is changed, so this can be called on a worker thread.
+
+        Args:
+            entry: Level summary from refresh()
+            bundle: The level's LevelBundle to read from, or None to read level.json
+
+        Returns:
+            A fresh copy of the level data, with 'directory' and 'file_path' added
+        """
+        level_dir = entry['directory']
+        level_json_path = os.path.join(level_dir, "level.json")
+
+        if bundle is not None:
+            level_data = bundle.level_data()
+        else:
+            with open(level_json_path, 'r') as f:
+                level_data = json.load(f)
+
+        level_data['directory'] = level_dir
+        level_data['file_path'] = level_json_path
+        return level_data
+
+    def _source_mtimes(self, level_dir, entry, mtime):
+        # Modification times of the files an index entry was built from
+        return [mtime, file_mtime(os.path.join(level_dir, entry['thumbnail']))]
+
+    def _summarize(self, level_dir, mtime):
+        # Build the index entry of one level from its level.json
+        with open(os.path.join(level_dir, "level.json"), 'r') as f:
+            level_data = json.load(f)
+
+        entry = {field: level_data.get(field) for field in SUMMARY_FIELDS}
+        entry['enemy_count'] = len(level_data.get('enemies', []))
+
+        # Player image, falling back to the level placeholder
+        thumbnail = level_data.get('player', {}).get('image', 'placeholder.png')
+        if not os.path.exists(os.path.join(level_dir, thumbnail)):
+            thumbnail = 'placeholder.png'
+        entry['thumbnail'] = thumbnail
+        entry['mtimes'] = self._source_mtimes(level_dir, entry, mtime)
+        return entry
+
+    def _read_index(self):
+        # Previous index, or nothing if it is missing, unreadable or from another version
+        try:
+            with open(self.path, 'r') as f:
+                index = json.load(f)
+            if index.get('version') == CATALOG_VERSION:
+                return index['levels']
+        except (OSError, ValueError, KeyError):
+            pass
+        return {}
+
+    def _write_index(self, levels):
+        # Write to a temporary file first so a half-written index is never read
+        temp_path = self.path + ".tmp"
+        try:
+            with open(temp_path, 'w') as f:
+                json.dump({'version': CATALOG_VERSION, 'levels': levels}, f)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            print(f"Error writing level catalog {self.path}: {e}")
+
+
+# Shared catalog of the installed levels
+level_catalog = LevelCatalog()
@@ -1,8 +1,14 @@
-import json
 import os
 import pygame
 import sys
-from src.ui import WIDTH, HEIGHT, WHITE, BLACK, DARK_GRAY, BLUE, LIGHT_BLUE, GREEN, RED, YELLOW, GRAY, HIGHLIGHT
+from src.frame_scheduler import frame_scheduler
+from src.level_catalog import level_catalog
+from src.map_preview import PREVIEW_SIZE, map_previews
+from src.preloader import preloader
+from src.ui import WIDTH, HEIGHT, WHITE, BLACK, DARK_GRAY, BLUE, LIGHT_BLUE, GREEN, RED, YELLOW, GRAY, HIGHLIGHT, get_gradient_surface, get_font, render_text
+
+# Fraction of the remaining scroll distance covered per second
+SCROLL_SPEED = 12
 
 # Create a level selection screen
 def level_selection_screen(screen):
@@ -16,17 +22,19 @@ def level_selection_screen(screen):
     screen = pygame.display.set_mode((WIDTH, HEIGHT))
     pygame.display.set_caption("Level Selection - Q-Quest!")
 
-    # Load levels
+    # Load level summaries, full level data is read when a level is hovered or selected
     levels = load_levels()
+    # Check map previews against the maps again, they may have been edited
+    map_previews.reset()
 
     if not levels:
         print("No levels found!")
         return None
 
     # Create fonts
-    title_font = pygame.font.SysFont('Arial', 48, bold=True)
-    level_name_font = pygame.font.SysFont('Arial', 28, bold=True)
-    description_font = pygame.font.SysFont('Arial', 20)
+    title_font = get_font(48, bold=True)
+    level_name_font = get_font(28, bold=True)
+    description_font = get_font(20)
 
     # Create a level selection box class
     class LevelBox:
@@ -35,23 +43,20 @@ def level_selection_screen(screen):
             self.level_data = level_data
             self.hovered = False
 
-            # Load player image
+            self.thumbnail_path = os.path.join(level_data['directory'], level_data['thumbnail'])
             self.player_image = None
-            try:
-                player_image_path = os.path.join(level_data['directory'], level_data.get('player', {}).get('image', 'placeholder.png'))
-                if os.path.exists(player_image_path):
-                    self.player_image = pygame.image.load(player_image_path)
-                    self.player_image = pygame.transform.scale(self.player_image, (128, 128))
-                else:
-                    # Try placeholder image
-                    placeholder_path = os.path.join(level_data['directory'], 'placeholder.png')
-                    if os.path.exists(placeholder_path):
-                        self.player_image = pygame.image.load(placeholder_path)
-                        self.player_image = pygame.transform.scale(self.player_image, (128, 128))
-            except Exception as e:
-                print(f"Error loading player image for {level_data['name']}: {e}")
+            self.map_path = os.path.join(level_data['directory'], level_data['path'])
+            self.map_preview = None
 
         def draw(self, surface):
+            # The player image (or the level placeholder) is decoded in the background,
+            # a grey placeholder is drawn until it is ready
+            if self.player_image is None:
+                self.player_image = preloader.request_image(self.thumbnail_path, (128, 128))
+            # Minimap of the level, generated in the background and cached on disk
+            if self.map_preview is None:
+                self.map_preview = map_previews.request(self.map_path)
+
             # Draw box background with highlight if hovered
             color = DARK_GRAY
             if self.hovered:
@@ -70,7 +75,7 @@ def level_selection_screen(screen):
                                 (self.rect.x + 30, self.rect.y + (self.rect.height - 128) // 2, 128, 128))
 
             # Draw level name (30px to the right of image, 20px from top)
-            name_text = level_name_font.render(self.level_data['name'], True, WHITE)
+            name_text = render_text(level_name_font, self.level_data['name'], WHITE)
             surface.blit(name_text, (self.rect.x + 30 + 128 + 30, self.rect.y + 20))
 
             # Draw level description (30px to the right of image, 25px below title)
@@ -82,7 +87,7 @@ def level_selection_screen(screen):
             for word in words:
                 test_line = line + word + " "
                 # If line would be too long with this word, start a new line
-                if description_font.size(test_line)[0] > self.rect.width - (30 + 128 + 30 + 30):
+                if description_font.size(test_line)[0] > self.rect.width - (30 + 128 + 30 + 30 + PREVIEW_SIZE[0] + 30):
                     lines.append(line)
                     line = word + " "
                 else:
@@ -92,24 +97,40 @@ def level_selection_screen(screen):
             # Draw each line of the description (limit to 2 lines to fit in smaller box)
             max_lines = min(2, len(lines))
             for i in range(max_lines):
-                desc_text = description_font.render(lines[i], True, WHITE)
+                desc_text = render_text(description_font, lines[i], WHITE)
                 surface.blit(desc_text, (self.rect.x + 30 + 128 + 30, self.rect.y + 20 + 30 + i * 22))
 
             # Draw enemy count
-            enemy_count = len(self.level_data.get('enemies', []))
-            enemies_text = description_font.render(f"Enemies: {enemy_count}", True, WHITE)
+            enemy_count = self.level_data['enemy_count']
+            enemies_text = render_text(description_font, f"Enemies: {enemy_count}", WHITE)
             surface.blit(enemies_text, (self.rect.x + 30 + 128 + 30, self.rect.y + self.rect.height - 30))
 
+            # Draw map preview (right side), centred in the preview area
+            if self.map_preview:
+                preview_rect = self.map_preview.get_rect(center=(self.rect.right - 30 - PREVIEW_SIZE[0] // 2,
+                                                                 self.rect.centery))
+                # Same background as the map screen behind the map
+                pygame.draw.rect(surface, (20, 20, 40), preview_rect)
+                surface.blit(self.map_preview, preview_rect)
+                pygame.draw.rect(surface, GRAY, preview_rect.inflate(2, 2), 1)
+
         def check_hover(self, pos):
             self.hovered = self.rect.collidepoint(pos)
             return self.hovered
 
         def handle_event(self, event):
-            if event.type == pygame.MOUSEBUTTONDOWN:
+            if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
                 if self.hovered:
                     return True
             return False
 
+        def release(self):
+            # Scrolled out of view, don't decode the thumbnail if it hasn't started yet
+            if self.player_image is None:
+                preloader.cancel_image(self.thumbnail_path, (128, 128))
+            if self.map_preview is None:
+                map_previews.cancel(self.map_path)
+
     # Create back button
     class Button:
         def __init__(self, x, y, width, height, text, color=DARK_GRAY):
@@ -129,8 +150,8 @@ def level_selection_screen(screen):
             pygame.draw.rect(surface, WHITE, self.rect, 2)  # Border
 
             # Draw text
-            font = pygame.font.SysFont('Arial', 24)
-            text_surface = font.render(self.text, True, WHITE)
+            font = get_font(24)
+            text_surface = render_text(font, self.text, WHITE)
             text_rect = text_surface.get_rect(center=self.rect.center)
             surface.blit(text_surface, text_rect)
 
@@ -144,30 +165,68 @@ def level_selection_screen(screen):
                     return True
             return False
 
-    # Create level boxes
-    level_boxes = []
+    # Level list layout
     box_height = 160  # Further reduced height to avoid overlap with back button
     box_width = WIDTH - 60  # 30px margin on each side
     box_margin = 15  # Margin between boxes
+    row_height = box_height + box_margin
+
+    # The list scrolls inside this area, above the back button
+    list_rect = pygame.Rect(0, 100, WIDTH, HEIGHT - 200)
+    content_height = len(levels) * row_height - box_margin
+    max_scroll = max(0, content_height - list_rect.height)
+
+    # Scroll position eases towards the target set by the mouse wheel and keys
+    scroll = 0.0
+    target_scroll = 0
+
+    # Boxes only exist for the rows in view, by level index
+    level_boxes = {}
 
-    for i, level in enumerate(levels):
-        y_pos = 100 + i * (box_height + box_margin)  # Adjusted starting position
-        box = LevelBox(30, y_pos, box_width, box_height, level)
-        level_boxes.append((box, level))
+    def visible_boxes():
+        first = int(scroll) // row_height
+        last = min(len(levels) - 1, (int(scroll) + list_rect.height) // row_height)
+
+        for index in list(level_boxes):
+            if index < first or index > last:
+                level_boxes.pop(index).release()
+
+        boxes = []
+        for index in range(first, last + 1):
+            box = level_boxes.get(index)
+            if box is None:
+                box = LevelBox(30, 0, box_width, box_height, levels[index])
+                level_boxes[index] = box
+            box.rect.y = list_rect.y + index * row_height - int(scroll)
+            boxes.append(box)
+        return boxes
+
+    def scroll_to(position):
+        return max(0, min(max_scroll, position))
 
     # Create back button
     back_button = Button(WIDTH - 150, HEIGHT - 80, 120, 40, "Back", DARK_GRAY)
 
+    # Loading bar for the hovered level, updated by the preloader
+    loading_progress = [0, 0]
+
+    def on_progress(done, total):
+        loading_progress[0] = done
+        loading_progress[1] = total
+
+    preloader.set_progress_callback(on_progress)
+
     # Main loop
     running = True
     selected_level = None
-    clock = pygame.time.Clock()
+    hovered_level = None
 
     while running:
         mouse_pos = pygame.mouse.get_pos()
+        boxes = visible_boxes()
 
         # Handle events
-        for event in pygame.event.get():
+        for event in frame_scheduler.get_events():
             if event.type == pygame.QUIT:
                 pygame.quit()
                 sys.exit()
@@ -175,73 +234,104 @@ def level_selection_screen(screen):
             if event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_ESCAPE:
                     running = False
+                # Scroll by a row, a page or to either end of the list
+                elif event.key == pygame.K_UP:
+                    target_scroll = scroll_to(target_scroll - row_height)
+                elif event.key == pygame.K_DOWN:
+                    target_scroll = scroll_to(target_scroll + row_height)
+                elif event.key == pygame.K_PAGEUP:
+                    target_scroll = scroll_to(target_scroll - list_rect.height)
+                elif event.key == pygame.K_PAGEDOWN:
+                    target_scroll = scroll_to(target_scroll + list_rect.height)
+                elif event.key == pygame.K_HOME:
+                    target_scroll = 0
+                elif event.key == pygame.K_END:
+                    target_scroll = max_scroll
+
+            if event.type == pygame.MOUSEWHEEL:
+                target_scroll = scroll_to(target_scroll - event.y * row_height // 2)
 
             # Check button clicks
             if event.type == pygame.MOUSEBUTTONDOWN:
-                for box, level in level_boxes:
+                for box in boxes:
                     if box.handle_event(event):
-                        selected_level = level
+                        # Read the full level definition only for the chosen level
+                        selected_level = level_catalog.load_level(box.level_data)
                         running = False
 
                 if back_button.handle_event(event):
                     running = False
 
-        # Update hover states
-        for box, _ in level_boxes:
-            box.check_hover(mouse_pos)
+        # Ease towards the scroll target, snapping once close enough
+        scrolling = scroll != target_scroll
+        if scrolling:
+            step = (target_scroll - scroll) * min(1.0, frame_scheduler.get_time() / 1000 * SCROLL_SPEED)
+            scroll = float(target_scroll) if abs(target_scroll - scroll) < 1 else scroll + step
+            boxes = visible_boxes()
+
+        # Update hover states, loading the hovered level in the background
+        # (boxes partly scrolled out of the list area are only hovered inside it)
+        list_hovered = list_rect.collidepoint(mouse_pos)
+        for box in boxes:
+            box.hovered = list_hovered and box.check_hover(mouse_pos)
+            level = box.level_data
+            if box.hovered and level is not hovered_level:
+                hovered_level = level
+                # The bundle is opened on a worker thread and a stale one isn't compiled
+                # just for a hover, that waits for selection
+                preloader.preload_entry(level)
         back_button.check_hover(mouse_pos)
 
+        preloader.pump()
+
         # Create gradient background
-        for y in range(HEIGHT):
-            color_value = max(0, 50 - y // 10)
-            pygame.draw.line(screen, (0, 0, color_value), (0, y), (WIDTH, y))
+        screen.blit(get_gradient_surface((WIDTH, HEIGHT), (0, 0, 50)), (0, 0))
 
         # Draw title
-        title_text = title_font.render("Select a Level", True, WHITE)
+        title_text = render_text(title_font, "Select a Level", WHITE)
         title_rect = title_text.get_rect(center=(WIDTH // 2, 50))  # Moved title up slightly
         screen.blit(title_text, title_rect)
 
-        # Draw level boxes
-        for box, _ in level_boxes:
+        # Draw the visible level boxes, clipped to the list area
+        screen.set_clip(list_rect)
+        for box in boxes:
             box.draw(screen)
+        screen.set_clip(None)
+
+        # Draw scrollbar if the list doesn't fit
+        if max_scroll:
+            thumb_height = max(20, list_rect.height * list_rect.height // content_height)
+            thumb_y = list_rect.y + int(scroll) * (list_rect.height - thumb_height) // max_scroll
+            pygame.draw.rect(screen, GRAY, (WIDTH - 20, thumb_y, 6, thumb_height))
 
         # Draw back button
         back_button.draw(screen)
 
+        # Draw loading bar while the hovered level is preloading
+        done, total = loading_progress
+        if preloader.is_loading() and total:
+            bar_rect = pygame.Rect(30, HEIGHT - 70, 300, 20)
+            pygame.draw.rect(screen, GRAY, bar_rect)
+            pygame.draw.rect(screen, GREEN, (bar_rect.x, bar_rect.y, bar_rect.width * done // total, bar_rect.height))
+            pygame.draw.rect(screen, WHITE, bar_rect, 2)
+
         pygame.display.flip()
-        clock.tick(60)
+        frame_scheduler.tick(busy=scrolling)
+
+    for box in level_boxes.values():
+        box.release()
+    preloader.set_progress_callback(None)
+    if selected_level is not None:
+        # Finish loading the selected level before the map screen needs it
+        preloader.preload_level(selected_level)
+        preloader.wait()
+    else:
+        preloader.cancel()
 
     return selected_level
 
 
 # Add this function to load levels from the levels directory
 def load_levels():
-    """Load all level definitions from the levels directory"""
-    levels = []
-    levels_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "levels")
-
-    if not os.path.exists(levels_dir):
-        print(f"Levels directory not found: {levels_dir}")
-        return levels
-
-    # Iterate through each subdirectory in the levels directory
-    for level_dir in os.listdir(levels_dir):
-        level_path = os.path.join(levels_dir, level_dir)
-
-        # Check if it's a directory and contains a level.json file
-        if os.path.isdir(level_path):
-            level_json_path = os.path.join(level_path, "level.json")
-
-            if os.path.exists(level_json_path):
-                try:
-                    with open(level_json_path, 'r') as f:
-                        level_data = json.load(f)
-
-                    # Add the directory path to the level data
-                    level_data['directory'] = level_path
-                    level_data['file_path'] = level_json_path
-                    levels.append(level_data)
-                except Exception as e:
-                    print(f"Error loading level from {level_json_path}: {e}")
-
-    return levels
+    """Load the summaries of all levels in the levels directory, see LevelCatalog.refresh"""
+    return level_catalog.refresh()
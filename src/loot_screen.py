@@ -1,9 +1,10 @@
 import random
 import pygame
 import sys
+from src.frame_scheduler import frame_scheduler
 from src.ui import WIDTH, HEIGHT, WHITE, BLACK, DARK_GRAY, BLUE, LIGHT_BLUE, GREEN, RED, YELLOW, GRAY, HIGHLIGHT, Button, draw_character_card
 # from src.main import screen
-from src.ui import calculate_card_height
+from src.ui import calculate_card_height, get_font, render_text
 
 # Game loop
 # Function to display shop screen
@@ -78,9 +79,9 @@ def loot_screen(screen, character_data, enemy_data):
     loot_items = [item for item in [attack_item, defend_item, heal_item] if item is not None]
 
     # Create UI elements
-    header_font = pygame.font.SysFont('Arial', 42, bold=True)
-    item_font = pygame.font.SysFont('Arial', 24, bold=True)
-    description_font = pygame.font.SysFont('Arial', 18)
+    header_font = get_font(42, bold=True)
+    item_font = get_font(24, bold=True)
+    description_font = get_font(18)
 
     # Create done button
     done_button = Button(WIDTH - 150, HEIGHT - 60, 120, 40, "Done", DARK_GRAY)
@@ -92,7 +93,6 @@ def loot_screen(screen, character_data, enemy_data):
 
     # Main loop
     running = True
-    clock = pygame.time.Clock()
 
     while running:
         screen.fill(BLACK)  # Clear screen
@@ -101,19 +101,19 @@ def loot_screen(screen, character_data, enemy_data):
         draw_character_card(screen, character_data, player_card_x, player_card_y, card_width, card_height, player_health)
 
         # Draw loot items
-        loot_title = header_font.render("Enemy Loot", True, WHITE)
+        loot_title = render_text(header_font, "Enemy Loot", WHITE)
         loot_title_rect = loot_title.get_rect(center=(WIDTH // 2, 100))
         screen.blit(loot_title, loot_title_rect)
 
         # Draw instructions
-        instructions = description_font.render("Click on an item to add it to your inventory", True, WHITE)
+        instructions = render_text(description_font, "Click on an item to add it to your inventory", WHITE)
         instructions_rect = instructions.get_rect(center=(WIDTH // 2, 140))
         screen.blit(instructions, instructions_rect)
 
         # Draw loot items
         if not loot_items:
             # No items to loot
-            no_items_text = item_font.render("No items to loot", True, WHITE)
+            no_items_text = render_text(item_font, "No items to loot", WHITE)
             no_items_rect = no_items_text.get_rect(center=(WIDTH // 2, 200))
             screen.blit(no_items_text, no_items_rect)
         else:
@@ -150,17 +150,17 @@ def loot_screen(screen, character_data, enemy_data):
                 pygame.draw.rect(screen, card_color, (item_x, item_y, item_card_width, item_card_height), 3)
 
                 # Draw item name
-                name_text = item_font.render(item['name'], True, WHITE)
+                name_text = render_text(item_font, item['name'], WHITE)
                 name_rect = name_text.get_rect(center=(item_x + item_card_width // 2, item_y + 30))
                 screen.blit(name_text, name_rect)
 
                 # Draw item type
-                type_text = description_font.render(item['type'], True, WHITE)
+                type_text = render_text(description_font, item['type'], WHITE)
                 type_rect = type_text.get_rect(center=(item_x + item_card_width // 2, item_y + 60))
                 screen.blit(type_text, type_rect)
 
                 # Draw modifier
-                mod_text = description_font.render(f"Modifier: +{item['modifier']}", True, WHITE)
+                mod_text = render_text(description_font, f"Modifier: +{item['modifier']}", WHITE)
                 mod_rect = mod_text.get_rect(center=(item_x + item_card_width // 2, item_y + 90))
                 screen.blit(mod_text, mod_rect)
 
@@ -171,7 +171,7 @@ def loot_screen(screen, character_data, enemy_data):
                     pygame.draw.rect(screen, WHITE, (item_x, item_y, item_card_width, item_card_height), 2)
 
                     # Show "Click to take" text
-                    take_text = description_font.render("Click to take", True, WHITE)
+                    take_text = render_text(description_font, "Click to take", WHITE)
                     take_rect = take_text.get_rect(center=(item_x + item_card_width // 2, item_y + 120))
                     screen.blit(take_text, take_rect)
 
@@ -180,14 +180,14 @@ def loot_screen(screen, character_data, enemy_data):
 
         # Draw message if present
         if message and message_timer > 0:
-            message_font = pygame.font.SysFont('Arial', 24, bold=True)
-            message_text = message_font.render(message, True, message_color)
+            message_font = get_font(24, bold=True)
+            message_text = render_text(message_font, message, message_color)
             message_rect = message_text.get_rect(center=(WIDTH // 2, HEIGHT - 100))
             screen.blit(message_text, message_rect)
             message_timer -= 1
 
         # Handle events
-        for event in pygame.event.get():
+        for event in frame_scheduler.get_events():
             if event.type == pygame.QUIT:
                 pygame.quit()
                 sys.exit()
@@ -241,7 +241,8 @@ def loot_screen(screen, character_data, enemy_data):
                     running = False
 
         pygame.display.flip()
-        clock.tick(60)
+        # The message countdown is measured in frames, so keep full rate while it shows
+        frame_scheduler.tick(busy=message_timer > 0)
 
     # Set flag to return to map
     character_data['return_to_map'] = True
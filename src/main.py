@@ -1,5 +1,13 @@
 from src import loot_screen, title_screen, level_selection_screen, map_screen, combat_screen
 from src.ui import WIDTH, HEIGHT, WHITE, BLACK, DARK_GRAY, BLUE, LIGHT_BLUE, GREEN, RED, YELLOW, GRAY, HIGHLIGHT
+from src.asset_manager import asset_manager
+from src.map_cache import map_cache
+from src.dirty_rects import set_dirty_rects_enabled
+from src.frame_scheduler import frame_scheduler
+from src.profiler import profiler
+from src.replay import InputRecorder
+from src.session import session_random
+import atexit
 import pygame
 
 
@@ -10,7 +18,34 @@ pygame.key.set_repeat(500, 50)  # Key repeat for text input
 screen = pygame.display.set_mode((WIDTH, HEIGHT))
 pygame.display.set_caption("Q-Quest!")
 
-def main(debug_mode=False):
+def main(debug_mode=False, asset_cache_mb=64, dirty_rects=False, profile_output=None, hints=False,
+         seed=None, record_path=None, replay=None):
+    # Configure the shared image cache
+    asset_manager.set_budget(asset_cache_mb * 1024 * 1024)
+    asset_manager.debug_mode = debug_mode
+    frame_scheduler.debug_mode = debug_mode
+
+    # Time frame phases for the debug overlay, and write them out when the game exits
+    profiler.set_enabled(debug_mode or profile_output is not None)
+    if profile_output:
+        atexit.register(profiler.export, profile_output)
+
+    # Only push changed screen regions on the map and combat screens
+    set_dirty_rects_enabled(dirty_rects)
+
+    # Seed the session's dice, then record its input or play a recording back
+    if replay is not None:
+        seed = replay.seed
+    seed = session_random.start(seed)
+    if record_path:
+        recorder = InputRecorder(record_path, seed, {'hints': hints, 'dirty_rects': dirty_rects})
+        recorder.install()
+        atexit.register(recorder.close)
+    elif replay is not None:
+        replay.install()
+    if debug_mode or record_path:
+        print(f"Session seed: {seed}")
+
     restart = True
     while restart:
         # Show title screen first
@@ -40,6 +75,8 @@ def main(debug_mode=False):
         
         # Add debug mode flag to character data
         character_data['debug_mode'] = debug_mode
+        # Show the chance of winning and the best action in combat
+        character_data['hints'] = hints
 
         # Show map screen after character creation
         if character_data:
@@ -50,6 +87,8 @@ def main(debug_mode=False):
                 # Explicit check for start_combat flag after map_screen
                 if character_data.get('return_to_title', False):
                     print("Returning to level selection screen...")
+                    # The level's map and everything derived from it is no longer needed
+                    map_cache.clear()
                     break  # Break out of the game flow loop to return to level selection
                 
                 if character_data.get('start_combat', False):
@@ -73,3 +112,5 @@ def main(debug_mode=False):
 
                 # Show map screen
                 character_data = map_screen.map_screen(screen, character_data)
+                asset_manager.report()
+                frame_scheduler.report()
@@ -0,0 +1,95 @@
+import os
+
+from src.level_bundle import get_bundle_for_map
+from src.map_renderer import load_map
+from src.map_stream import StreamedMap, is_infinite_map
+
+
+class MapCache:
+    """
+    Level-scoped cache of loaded TMX maps.
+
+    Maps are keyed by path and checked against the file's modification time, so the
+    map screen can be re-entered after every combat, Run and loot screen without
+    parsing the XML and decoding the tilesets again. Data derived from a map (scaled
+    tiles, baked chunks, collision grids) is stored on the map object and lives as
+    long as the cached map does.
+    """
+    def __init__(self):
+        """
+        Initialize the MapCache
+        """
+        self.maps = {}
+        self.hits = 0
+        self.misses = 0
+
+    def load(self, path):
+        """
+        Get a loaded map, parsing it only if it isn't cached or changed on disk
+
+        Args:
+            path: Path to the TMX file
+
+        Returns:
+            The loaded map (see map_renderer.load_map), or a BundleMap if the level has
+            an up to date compiled bundle
+        """
+        path = os.path.abspath(path)
+        mtime = os.path.getmtime(path)
+
+        entry = self.maps.get(path)
+        if entry is not None and entry[0] == mtime:
+            self.hits += 1
+            return entry[1]
+
+        self.misses += 1
+        bundle = get_bundle_for_map(path)
+        if bundle is not None:
+            # Compiled level bundle: no XML parsing or PNG decoding
+            tmx_data = bundle.load_map()
+        elif is_infinite_map(path):
+            # Infinite maps are decoded a chunk at a time around the player
+            tmx_data = StreamedMap(path)
+        else:
+            tmx_data = load_map(path)
+        self.maps[path] = (mtime, tmx_data)
+        return tmx_data
+
+    def add(self, path, tmx_data, mtime):
+        """
+        Put a map loaded elsewhere (e.g. by the preloader) into the cache
+
+        Args:
+            path: Path to the TMX file
+            tmx_data: The loaded map
+            mtime: Modification time of the file when it was read
+        """
+        self.maps[os.path.abspath(path)] = (mtime, tmx_data)
+
+    def has(self, path):
+        """
+        Check if an up to date copy of a map is cached
+
+        Args:
+            path: Path to the TMX file
+
+        Returns:
+            True if load() would not have to read the file
+        """
+        path = os.path.abspath(path)
+        entry = self.maps.get(path)
+        return entry is not None and entry[0] == os.path.getmtime(path)
+
+    def clear(self):
+        """
+        Drop all cached maps, e.g. when leaving a level
+        """
+        for _, tmx_data in self.maps.values():
+            # Streamed maps have a prefetch thread to stop
+            if hasattr(tmx_data, 'close'):
+                tmx_data.close()
+        self.maps.clear()
+
+
+# Shared map cache for the current level session
+map_cache = MapCache()
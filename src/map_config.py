@@ -1,6 +1,8 @@
 import os
 import json
 
+from src.enemy_index import EnemyIndex
+
 class MapConfig:
     """
     Class to handle loading and managing map configurations from a JSON file
@@ -14,6 +16,7 @@ class MapConfig:
         """
         self.config_path = config_path
         self.maps = {}
+        self.enemy_indexes = {}
         self.default_map = None
         self.load_config()
 
@@ -142,13 +145,27 @@ class MapConfig:
         Returns:
             Enemy dictionary if found, None otherwise
         """
+        return self.get_enemy_index(map_id).get_enemy_at(x, y)
+
+    def get_enemy_index(self, map_id=None):
+        """
+        Get the spatial index of a map's enemies, building it on first use
+
+        Args:
+            map_id: ID of the map, or None to use the default map
+
+        Returns:
+            EnemyIndex for the map's enemies
+        """
+        if map_id is None:
+            map_id = self.default_map
+
         enemies = self.get_enemies(map_id)
-        for enemy in enemies:
-            if 'position' in enemy:
-                pos = enemy['position']
-                if pos.get('x') == x and pos.get('y') == y:
-                    return enemy
-        return None
+        index = self.enemy_indexes.get(map_id)
+        if index is None or not index.is_current(enemies):
+            index = EnemyIndex(enemies)
+            self.enemy_indexes[map_id] = index
+        return index
 
     def get_all_maps(self):
         """
@@ -0,0 +1,268 @@
+import concurrent.futures
+import hashlib
+import multiprocessing
+import os
+import sys
+
+import numpy
+import pygame
+from PIL import Image
+
+from src.level_bundle import file_hash, map_sources
+from src.map_renderer import GID_MASK, UnsupportedMapError, load_tmx
+from src.preloader import PRELOAD_EVENT, preloader
+
+LEVELS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "levels")
+
+# Rendered previews are cached here, named by a hash of the map and tileset files
+CACHE_DIR = os.path.join(LEVELS_DIR, ".previews")
+
+# Bump when the rendering changes so old previews are not reused
+PREVIEW_VERSION = 1
+
+# Largest size a preview is drawn at in level selection, maps keep their aspect ratio
+PREVIEW_SIZE = (192, 128)
+
+
+def preview_key(map_path, size=PREVIEW_SIZE):
+    """
+    Get the cache key of a map's preview
+
+    Args:
+        map_path: Path to the TMX file
+        size: Size the preview is fitted into
+
+    Returns:
+        Hex digest of the map, its tilesets and tileset images, and the preview settings
+    """
+    sha1 = hashlib.sha1(f"{PREVIEW_VERSION}:{size[0]}x{size[1]}".encode('utf-8'))
+    base = os.path.dirname(map_path)
+    for source in map_sources(map_path):
+        sha1.update(os.path.relpath(source, base).encode('utf-8'))
+        sha1.update(file_hash(source).encode('utf-8'))
+    return sha1.hexdigest()
+
+
+def tile_colours(tileset):
+    """
+    Get the average colour of every tile in a tileset
+
+    Args:
+        tileset: A TmxTileset, its image is read from its source file
+
+    Returns:
+        Float array of shape (tilecount, 4) with the alpha-weighted average RGB and
+        the average alpha of each tile, all in the range 0-1
+    """
+    with Image.open(tileset.source) as image:
+        pixels = numpy.asarray(image.convert('RGBA'), dtype=numpy.float32) / 255.0
+
+    if tileset.colorkey:
+        # Colour key given as hex in the TMX, e.g. "ff00ff"
+        key = numpy.array([int(tileset.colorkey.lstrip('#')[i:i + 2], 16) / 255.0 for i in (0, 2, 4)],
+                          dtype=numpy.float32)
+        pixels[numpy.all(pixels[:, :, :3] == key, axis=2), 3] = 0.0
+
+    height, width = pixels.shape[:2]
+    columns = tileset.columns or (width - 2 * tileset.margin + tileset.spacing) // (tileset.tilewidth + tileset.spacing)
+    tilecount = tileset.tilecount or columns * ((height - 2 * tileset.margin + tileset.spacing)
+                                                // (tileset.tileheight + tileset.spacing))
+
+    colours = numpy.zeros((tilecount, 4), dtype=numpy.float32)
+    for tile_id in range(tilecount):
+        x = tileset.margin + (tile_id % columns) * (tileset.tilewidth + tileset.spacing)
+        y = tileset.margin + (tile_id // columns) * (tileset.tileheight + tileset.spacing)
+        tile = pixels[y:y + tileset.tileheight, x:x + tileset.tilewidth]
+        if tile.shape[:2] != (tileset.tileheight, tileset.tilewidth):
+            continue
+        alpha = tile[:, :, 3]
+        coverage = alpha.sum()
+        if coverage:
+            colours[tile_id, :3] = (tile[:, :, :3] * alpha[:, :, None]).sum(axis=(0, 1)) / coverage
+            colours[tile_id, 3] = coverage / alpha.size
+    return colours
+
+
+def render_preview(map_path, size=PREVIEW_SIZE):
+    """
+    Render a map at one pixel per tile using average tile colours, then fit it into size
+
+    No tiles are blitted, so this needs no display and is cheap enough to run in a
+    worker process.
+
+    Args:
+        map_path: Path to the TMX file
+        size: (width, height) the preview is fitted into
+
+    Returns:
+        An RGBA PIL Image, transparent where the map has no tiles
+    """
+    tmx_data = load_tmx(map_path, load_images=False)
+
+    # Colour of every gid, gid 0 (no tile) and unknown gids are transparent
+    gid_count = max([tileset.firstgid + tileset.tilecount for tileset in tmx_data.tilesets] + [1])
+    lookup = numpy.zeros((gid_count + 1, 4), dtype=numpy.float32)
+    for tileset in tmx_data.tilesets:
+        colours = tile_colours(tileset)
+        lookup[tileset.firstgid:tileset.firstgid + len(colours)] = colours
+
+    # Composite the visible layers bottom to top
+    rgb = numpy.zeros((tmx_data.height * tmx_data.width, 3), dtype=numpy.float32)
+    alpha = numpy.zeros(tmx_data.height * tmx_data.width, dtype=numpy.float32)
+    for layer in tmx_data.visible_layers:
+        gids = numpy.minimum(layer.gids & GID_MASK, gid_count)
+        colour = lookup[gids]
+        layer_alpha = colour[:, 3:]
+        rgb = rgb * (1.0 - layer_alpha) + colour[:, :3] * layer_alpha
+        alpha = alpha + colour[:, 3] * (1.0 - alpha)
+
+    # Undo the premultiplication by coverage before saving
+    covered = alpha > 0
+    rgb[covered] /= alpha[covered, None]
+    pixels = numpy.concatenate([rgb, alpha[:, None]], axis=1).reshape(tmx_data.height, tmx_data.width, 4)
+    image = Image.fromarray(numpy.round(pixels * 255).clip(0, 255).astype(numpy.uint8), 'RGBA')
+
+    # Fit the map's pixel size into the preview size, tiles may not be square
+    map_width = tmx_data.width * tmx_data.tilewidth
+    map_height = tmx_data.height * tmx_data.tileheight
+    scale = min(size[0] / map_width, size[1] / map_height)
+    preview_size = (max(1, round(map_width * scale)), max(1, round(map_height * scale)))
+    if preview_size[0] < tmx_data.width:
+        # Shrinking: average the tiles that fall into each pixel
+        return image.resize(preview_size, Image.BOX)
+    return image.resize(preview_size, Image.NEAREST)
+
+
+def generate_preview(map_path, cache_dir=CACHE_DIR, size=PREVIEW_SIZE):
+    """
+    Get the cached preview of a map, rendering it if it is missing or the map changed
+
+    Runs in the preview worker processes.
+
+    Args:
+        map_path: Path to the TMX file
+        cache_dir: Directory previews are cached in
+        size: (width, height) the preview is fitted into
+
+    Returns:
+        Path to the preview PNG, or None if the map can't be previewed
+    """
+    path = os.path.join(cache_dir, preview_key(map_path, size) + ".png")
+    if os.path.exists(path):
+        return path
+
+    try:
+        image = render_preview(map_path, size)
+    except UnsupportedMapError as e:
+        print(f"No preview for {map_path}: {e}")
+        return None
+
+    # Write to a temporary file first so a half-written preview is never picked up
+    os.makedirs(cache_dir, exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    image.save(temp_path, 'PNG')
+    os.replace(temp_path, path)
+    return path
+
+
+def _wake(future):
+    # Called by the executor when a preview is ready, wakes an idle level selection screen
+    if pygame.display.get_init():
+        pygame.event.post(pygame.event.Event(PRELOAD_EVENT))
+
+
+class MapPreviews:
+    """
+    Map preview thumbnails for level selection.
+
+    Previews are generated in a process pool, since averaging tile colours is CPU
+    bound, and cached on disk so they are only rendered again when the map or its
+    tilesets change. The finished PNGs are loaded through the preloader.
+    """
+    def __init__(self, cache_dir=CACHE_DIR, size=PREVIEW_SIZE, workers=None):
+        """
+        Initialize the MapPreviews
+
+        Args:
+            cache_dir: Directory previews are cached in
+            size: (width, height) previews are fitted into
+            workers: Number of worker processes, defaults to the number of CPUs
+        """
+        self.cache_dir = cache_dir
+        self.size = size
+        self.workers = workers
+        self.executor = None
+        self.previews = {}
+
+    def request(self, map_path):
+        """
+        Get a map's preview, starting to generate it if this is the first request
+
+        Args:
+            map_path: Path to the TMX file
+
+        Returns:
+            The preview Surface, or None until it is ready (or if there is none)
+        """
+        entry = self.previews.get(map_path)
+        if entry is None:
+            if self.executor is None:
+                # Spawned rather than forked, the game process has threads running
+                self.executor = concurrent.futures.ProcessPoolExecutor(
+                    self.workers, mp_context=multiprocessing.get_context('spawn'))
+            future = self.executor.submit(generate_preview, map_path, self.cache_dir, self.size)
+            future.add_done_callback(_wake)
+            self.previews[map_path] = future
+            return None
+
+        if isinstance(entry, concurrent.futures.Future):
+            if not entry.done():
+                return None
+            try:
+                entry = entry.result() or False
+            except Exception as e:
+                print(f"Error generating preview for {map_path}: {e}")
+                entry = False
+            self.previews[map_path] = entry
+
+        if not entry:
+            return None
+        return preloader.request_image(entry, None)
+
+    def cancel(self, map_path):
+        """
+        Stop generating a preview that hasn't started, e.g. when it scrolled out of view
+
+        Args:
+            map_path: Path to the TMX file
+        """
+        entry = self.previews.get(map_path)
+        if isinstance(entry, concurrent.futures.Future) and entry.cancel():
+            del self.previews[map_path]
+
+    def reset(self):
+        """
+        Forget finished previews, so maps changed since are checked again on the next request
+        """
+        self.previews = {
+            map_path: entry for map_path, entry in self.previews.items()
+            if isinstance(entry, concurrent.futures.Future) and not entry.done()
+        }
+
+
+# Shared map previews used by level selection
+map_previews = MapPreviews()
+
+
+if __name__ == "__main__":
+    # Generate the previews of the given maps, or of every level, in parallel
+    from src.level_catalog import level_catalog
+
+    if len(sys.argv) > 1:
+        map_paths = sys.argv[1:]
+    else:
+        map_paths = [os.path.join(entry['directory'], entry['path']) for entry in level_catalog.refresh()]
+
+    with concurrent.futures.ProcessPoolExecutor() as executor:
+        for map_path, path in zip(map_paths, executor.map(generate_preview, map_paths)):
+            print(f"{map_path} -> {path}")
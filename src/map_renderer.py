@@ -1,56 +1,290 @@
+import base64
+import gzip
 import os
+import xml.etree.ElementTree as ET
+import zlib
+from collections import OrderedDict
+
+import numpy
 import pygame
 import pytmx
 
+from src.collision import GID_MASK
+
+# Flip flags Tiled stores in the top bits of a gid
+FLIPPED_HORIZONTALLY = 0x80000000
+FLIPPED_VERTICALLY = 0x40000000
+FLIPPED_DIAGONALLY = 0x20000000
+
+
+class TileCache:
+    """
+    Cache of map tiles pre-scaled to a fixed size and converted to the display format.
+
+    Tiles are scaled lazily the first time a gid is requested, so a cache can be
+    created once per level/zoom and shared by every draw call that uses that size.
+    """
+    def __init__(self, tmx_data, tile_size):
+        """
+        Initialize the TileCache
+
+        Args:
+            tmx_data: Loaded TMX map used to look up tile images by gid
+            tile_size: (width, height) in pixels that tiles are scaled to
+        """
+        self.tmx_data = tmx_data
+        self.tile_size = (int(tile_size[0]), int(tile_size[1]))
+        self.tiles = {}
+
+    def get(self, gid):
+        """
+        Get the scaled tile image for a gid
+
+        Args:
+            gid: The tile gid from the map layer data
+
+        Returns:
+            A pygame Surface of tile_size, or None if the gid has no image
+        """
+        try:
+            return self.tiles[gid]
+        except KeyError:
+            pass
+
+        tile = self.tmx_data.get_tile_image_by_gid(gid) if gid else None
+        if tile:
+            if tile.get_size() != self.tile_size:
+                tile = pygame.transform.scale(tile, self.tile_size)
+            # Match the display pixel format so blits don't convert every frame
+            if pygame.display.get_surface() is not None:
+                if tile.get_flags() & pygame.SRCALPHA:
+                    tile = tile.convert_alpha()
+                else:
+                    tile = tile.convert()
+        self.tiles[gid] = tile
+        return tile
+
+    def clear(self):
+        """
+        Drop all cached tiles
+        """
+        self.tiles.clear()
+
+
+def get_tile_cache(tmx_data, tile_size):
+    """
+    Get the shared TileCache for a map at the given tile size
+
+    The cache is stored on the map object itself so it lives exactly as long as the
+    loaded map, and every renderer drawing that map at the same size reuses it.
+
+    Args:
+        tmx_data: Loaded TMX map
+        tile_size: (width, height) in pixels of the scaled tiles
+
+    Returns:
+        The TileCache for that map and size
+    """
+    tile_size = (int(tile_size[0]), int(tile_size[1]))
+    caches = getattr(tmx_data, 'tile_caches', None)
+    if caches is None:
+        caches = {}
+        tmx_data.tile_caches = caches
+    if tile_size not in caches:
+        caches[tile_size] = TileCache(tmx_data, tile_size)
+    return caches[tile_size]
+
+
 class TiledMapRenderer:
-    def __init__(self, filename):
+    def __init__(self, filename=None, tile_size=None, tmx_data=None):
         """
         Initialize the TiledMapRenderer with a TMX file
         
         Args:
             filename: Path to the TMX file
+            tile_size: Optional (width, height) to draw tiles at, defaults to the TMX tile size
+            tmx_data: Already loaded TMX map to use instead of loading filename
         """
-        self.tmx_data = pytmx.load_pygame(filename)
-        self.width = self.tmx_data.width * self.tmx_data.tilewidth
-        self.height = self.tmx_data.height * self.tmx_data.tileheight
-        self.tmx_data.filename = filename
+        if tmx_data is None:
+            tmx_data = load_map(filename)
+        self.tmx_data = tmx_data
+        if tile_size is None:
+            tile_size = (self.tmx_data.tilewidth, self.tmx_data.tileheight)
+        self.tile_cache = get_tile_cache(self.tmx_data, tile_size)
+        self.tile_width, self.tile_height = self.tile_cache.tile_size
+        self.width = self.tmx_data.width * self.tile_width
+        self.height = self.tmx_data.height * self.tile_height
         
-    def render(self, surface):
+    def render(self, surface, tile_rect=None, background=(0, 0, 0)):
         """
         Render the map to the given surface
         
         Args:
             surface: Pygame surface to render the map onto
+            tile_rect: Optional (x, y, width, height) region of the map in tiles to render,
+                drawn with its top-left tile at (0, 0) of the surface. Defaults to the whole map.
+            background: Colour to fill areas without tiles
         """
-        # Fill with black in case some tiles are empty
-        surface.fill((0, 0, 0))
+        if tile_rect is None:
+            tile_rect = (0, 0, self.tmx_data.width, self.tmx_data.height)
+        start_x, start_y, columns, rows = tile_rect
+        end_x = min(self.tmx_data.width, start_x + columns)
+        end_y = min(self.tmx_data.height, start_y + rows)
+
+        # Fill in case some tiles are empty
+        surface.fill(background)
         
         # Iterate through all visible layers
         for layer in self.tmx_data.visible_layers:
             # Check if this layer contains tiles
             if hasattr(layer, 'data'):
-                for x, y, gid in layer:
-                    # Get the tile image
-                    tile = self.tmx_data.get_tile_image_by_gid(gid)
-                    if tile:
-                        # Calculate the position to draw the tile
-                        pos_x = x * self.tmx_data.tilewidth
-                        pos_y = y * self.tmx_data.tileheight
-                        # Draw the tile
-                        surface.blit(tile, (pos_x, pos_y))
+                for y in range(max(0, start_y), end_y):
+                    row = layer.data[y]
+                    for x in range(max(0, start_x), end_x):
+                        # Get the tile image
+                        tile = self.tile_cache.get(row[x])
+                        if tile:
+                            # Calculate the position to draw the tile
+                            pos_x = (x - start_x) * self.tile_width
+                            pos_y = (y - start_y) * self.tile_height
+                            # Draw the tile
+                            surface.blit(tile, (pos_x, pos_y))
     
-    def make_map_surface(self):
+    def make_map_surface(self, tile_rect=None, background=(0, 0, 0)):
         """
-        Create a surface with the entire map rendered on it
+        Create a surface with the map rendered on it
         
+        Args:
+            tile_rect: Optional (x, y, width, height) region of the map in tiles to render.
+                Defaults to the entire map.
+            background: Colour to fill areas without tiles
+
         Returns:
             A pygame Surface with the map rendered on it
         """
-        # Create a surface the size of the map
-        map_surface = pygame.Surface((self.width, self.height))
-        self.render(map_surface)
+        if tile_rect is None:
+            width, height = self.width, self.height
+        else:
+            width = tile_rect[2] * self.tile_width
+            height = tile_rect[3] * self.tile_height
+
+        # Create a surface the size of the map region
+        map_surface = pygame.Surface((width, height))
+        if pygame.display.get_surface() is not None:
+            map_surface = map_surface.convert()
+        self.render(map_surface, tile_rect, background)
         return map_surface
 
+
+class MapChunkCache:
+    """
+    Static map layers baked into fixed-size chunk surfaces.
+
+    Chunks are rendered lazily the first time they are viewed and the least recently
+    used ones are evicted, so the per-frame cost of drawing the map is a handful of
+    chunk blits no matter how large the map is.
+    """
+    def __init__(self, renderer, chunk_tiles=16, max_chunks=9, background=(0, 0, 0)):
+        """
+        Initialize the MapChunkCache
+
+        Args:
+            renderer: TiledMapRenderer used to bake each chunk
+            chunk_tiles: Width and height of a chunk in tiles
+            max_chunks: Number of baked chunks to keep before evicting
+            background: Colour for areas of a chunk without tiles
+        """
+        self.renderer = renderer
+        self.chunk_tiles = chunk_tiles
+        self.max_chunks = max_chunks
+        self.background = background
+        self.chunk_width = chunk_tiles * renderer.tile_width
+        self.chunk_height = chunk_tiles * renderer.tile_height
+        self.columns = (renderer.tmx_data.width + chunk_tiles - 1) // chunk_tiles
+        self.rows = (renderer.tmx_data.height + chunk_tiles - 1) // chunk_tiles
+        self.chunks = OrderedDict()
+
+    def get_chunk(self, chunk_x, chunk_y):
+        """
+        Get the baked surface for a chunk, rendering it if needed
+
+        Args:
+            chunk_x: Chunk column
+            chunk_y: Chunk row
+
+        Returns:
+            A pygame Surface with the chunk's tiles rendered on it
+        """
+        key = (chunk_x, chunk_y)
+        chunk = self.chunks.get(key)
+        if chunk is not None:
+            self.chunks.move_to_end(key)
+            return chunk
+
+        # Clip edge chunks to the map so they are not padded with background
+        tile_x = chunk_x * self.chunk_tiles
+        tile_y = chunk_y * self.chunk_tiles
+        columns = min(self.chunk_tiles, self.renderer.tmx_data.width - tile_x)
+        rows = min(self.chunk_tiles, self.renderer.tmx_data.height - tile_y)
+        chunk = self.renderer.make_map_surface((tile_x, tile_y, columns, rows), self.background)
+
+        self.chunks[key] = chunk
+        while len(self.chunks) > self.max_chunks:
+            self.chunks.popitem(last=False)
+        return chunk
+
+    def draw(self, surface, offset_x, offset_y):
+        """
+        Draw the part of the map visible on a surface
+
+        Args:
+            surface: Pygame surface to draw onto, its clip rect limits what is drawn
+            offset_x: X position on the surface of the map's top-left corner
+            offset_y: Y position on the surface of the map's top-left corner
+        """
+        view = surface.get_clip()
+        first_x = max(0, int((view.left - offset_x) // self.chunk_width))
+        first_y = max(0, int((view.top - offset_y) // self.chunk_height))
+        last_x = min(self.columns - 1, int((view.right - 1 - offset_x) // self.chunk_width))
+        last_y = min(self.rows - 1, int((view.bottom - 1 - offset_y) // self.chunk_height))
+
+        for chunk_y in range(first_y, last_y + 1):
+            for chunk_x in range(first_x, last_x + 1):
+                chunk = self.get_chunk(chunk_x, chunk_y)
+                pos_x = int(chunk_x * self.chunk_width + offset_x)
+                pos_y = int(chunk_y * self.chunk_height + offset_y)
+                surface.blit(chunk, (pos_x, pos_y))
+
+    def clear(self):
+        """
+        Drop all baked chunks
+        """
+        self.chunks.clear()
+
+
+def get_chunk_cache(tmx_data, tile_size, background=(0, 0, 0)):
+    """
+    Get the shared MapChunkCache for a map at the given tile size
+
+    Args:
+        tmx_data: Loaded TMX map
+        tile_size: (width, height) in pixels of the scaled tiles
+        background: Colour for areas of the map without tiles
+
+    Returns:
+        The MapChunkCache for that map, size and background
+    """
+    key = (int(tile_size[0]), int(tile_size[1]), tuple(background))
+    caches = getattr(tmx_data, 'chunk_caches', None)
+    if caches is None:
+        caches = {}
+        tmx_data.chunk_caches = caches
+    if key not in caches:
+        renderer = TiledMapRenderer(tile_size=tile_size, tmx_data=tmx_data)
+        caches[key] = MapChunkCache(renderer, background=background)
+    return caches[key]
+
+
 def render_map_to_surface(map_path, width, height):
     """
     Render a TMX map to a surface of the specified size
@@ -94,3 +328,320 @@ def render_map_to_surface(map_path, width, height):
     final_surface.blit(scaled_map, (x_offset, y_offset))
     
     return final_surface
+
+
+class UnsupportedMapError(ValueError):
+    """
+    Raised by load_tmx for map features the fast loader doesn't handle
+    """
+
+
+class TmxTileset:
+    """
+    Tileset of a map loaded by load_tmx, tiles are sliced from a single sheet image
+    """
+    def __init__(self, name, firstgid, tilecount, columns, tilewidth, tileheight, spacing=0, margin=0, image=None,
+                 source=None, colorkey=None):
+        self.name = name
+        self.firstgid = firstgid
+        self.tilecount = tilecount
+        self.columns = columns
+        self.tilewidth = tilewidth
+        self.tileheight = tileheight
+        self.spacing = spacing
+        self.margin = margin
+        self.image = image
+        self.source = source
+        self.colorkey = colorkey
+
+    def get_tile(self, tile_id):
+        """
+        Get a tile's image as a subsurface of the sheet
+
+        Args:
+            tile_id: Index of the tile in the tileset (starting at 0)
+
+        Returns:
+            A pygame Surface, or None if the tileset has no image or the tile is outside it
+        """
+        if self.image is None or self.columns <= 0:
+            return None
+        x = self.margin + (tile_id % self.columns) * (self.tilewidth + self.spacing)
+        y = self.margin + (tile_id // self.columns) * (self.tileheight + self.spacing)
+        rect = pygame.Rect(x, y, self.tilewidth, self.tileheight)
+        if not self.image.get_rect().contains(rect):
+            return None
+        return self.image.subsurface(rect)
+
+
+class TmxLayer:
+    """
+    Tile layer of a map loaded by load_tmx.
+
+    The gids are kept in one flat uint32 array, data is a list of row views into it
+    so layer.data[y][x] works as it does with pytmx.
+    """
+    def __init__(self, name, width, height, gids, visible=True):
+        self.name = name
+        self.width = width
+        self.height = height
+        self.gids = gids
+        self.visible = visible
+        view = memoryview(gids)
+        self.data = [view[y * width:(y + 1) * width] for y in range(height)]
+
+
+class TmxMap:
+    """
+    Map loaded by load_tmx.
+
+    Provides the parts of pytmx's TiledMap used by the renderer, collision and map
+    screen. gids are the ones in the TMX file, pytmx renumbers them.
+    """
+    def __init__(self, filename, width, height, tilewidth, tileheight, tilesets, layers):
+        self.filename = filename
+        self.width = width
+        self.height = height
+        self.tilewidth = tilewidth
+        self.tileheight = tileheight
+        self.tilesets = tilesets
+        self.layers = layers
+        self.tiledgidmap = {}
+        self.tiles = {}
+
+    @property
+    def visible_layers(self):
+        return [layer for layer in self.layers if layer.visible]
+
+    def get_tile_image_by_gid(self, gid):
+        """
+        Get the tile image for a gid, sliced from its tileset on first use
+
+        Args:
+            gid: The tile gid from the layer data, including flip flags
+
+        Returns:
+            A pygame Surface, or None if the gid has no image
+        """
+        try:
+            return self.tiles[gid]
+        except KeyError:
+            pass
+
+        tile = None
+        tile_gid = gid & GID_MASK
+        for tileset in reversed(self.tilesets):
+            if tileset.firstgid <= tile_gid:
+                if tile_gid < tileset.firstgid + tileset.tilecount:
+                    tile = tileset.get_tile(tile_gid - tileset.firstgid)
+                break
+
+        if tile is not None:
+            if gid & FLIPPED_DIAGONALLY:
+                tile = pygame.transform.flip(pygame.transform.rotate(tile, 270), True, False)
+            if gid & (FLIPPED_HORIZONTALLY | FLIPPED_VERTICALLY):
+                tile = pygame.transform.flip(tile, bool(gid & FLIPPED_HORIZONTALLY), bool(gid & FLIPPED_VERTICALLY))
+        self.tiles[gid] = tile
+        return tile
+
+
+def decode_layer_data(element, width, height):
+    """
+    Decode a layer's <data> element into a flat array of gids
+
+    Args:
+        element: The <data> element
+        width: Layer width in tiles
+        height: Layer height in tiles
+
+    Returns:
+        NumPy uint32 array of width * height gids in row-major order
+
+    Raises:
+        UnsupportedMapError: For unknown encodings or compressions, or chunked data
+    """
+    encoding = element.get('encoding')
+    compression = element.get('compression')
+    if element.find('chunk') is not None:
+        raise UnsupportedMapError("chunked layer data")
+
+    if encoding == 'csv':
+        gids = numpy.fromstring(element.text or '', dtype=numpy.uint32, sep=',')
+    elif encoding == 'base64':
+        data = base64.b64decode((element.text or '').strip())
+        if compression == 'zlib':
+            data = zlib.decompress(data)
+        elif compression == 'gzip':
+            data = gzip.decompress(data)
+        elif compression:
+            raise UnsupportedMapError(f"{compression} compression")
+        gids = numpy.frombuffer(data, dtype='<u4').astype(numpy.uint32)
+    elif encoding is None:
+        gids = numpy.array([int(tile.get('gid', 0)) for tile in element.findall('tile')], dtype=numpy.uint32)
+    else:
+        raise UnsupportedMapError(f"{encoding} encoding")
+
+    if gids.size != width * height:
+        raise UnsupportedMapError(f"layer has {gids.size} tiles, expected {width * height}")
+    return gids
+
+
+def load_tileset_image(path, colorkey=None):
+    """
+    Load a tileset's sheet image once, converted to the display format
+
+    Args:
+        path: Path to the image
+        colorkey: Optional transparent colour as a hex string from the TMX file
+
+    Returns:
+        A pygame Surface
+    """
+    return convert_tileset_image(pygame.image.load(path), colorkey)
+
+
+def convert_tileset_image(image, colorkey=None):
+    """
+    Convert a decoded tileset image to the display format
+
+    Args:
+        image: The tileset's sheet as a pygame Surface
+        colorkey: Optional transparent colour as a hex string from the TMX file
+
+    Returns:
+        A pygame Surface
+    """
+    if pygame.display.get_surface() is not None:
+        if colorkey:
+            image = image.convert()
+            image.set_colorkey(pygame.Color(f"#{colorkey.lstrip('#')}"), pygame.RLEACCEL)
+        else:
+            image = image.convert_alpha()
+    elif colorkey:
+        image.set_colorkey(pygame.Color(f"#{colorkey.lstrip('#')}"))
+    return image
+
+
+def read_tileset(element, base_dir, load_images=True):
+    """
+    Read a <tileset> element, following it to an external .tsx file if it has one
+
+    Args:
+        element: The <tileset> element from the map
+        base_dir: Directory paths in the element are relative to
+        load_images: Whether to load the tileset's sheet image
+
+    Returns:
+        A TmxTileset
+
+    Raises:
+        UnsupportedMapError: For tilesets made of separate images
+    """
+    firstgid = int(element.get('firstgid', 1))
+    source = element.get('source')
+    if source:
+        source = os.path.join(base_dir, source)
+        element = ET.parse(source).getroot()
+        base_dir = os.path.dirname(source)
+
+    image_element = element.find('image')
+    if image_element is None:
+        raise UnsupportedMapError("image collection tilesets")
+
+    tilewidth = int(element.get('tilewidth'))
+    tileheight = int(element.get('tileheight'))
+    spacing = int(element.get('spacing', 0))
+    margin = int(element.get('margin', 0))
+    image_width = int(image_element.get('width', 0))
+    columns = int(element.get('columns', 0)) or (image_width - 2 * margin + spacing) // (tilewidth + spacing)
+    tilecount = int(element.get('tilecount', 0))
+
+    source = os.path.join(base_dir, image_element.get('source'))
+    colorkey = image_element.get('trans')
+    image = None
+    if load_images:
+        image = load_tileset_image(source, colorkey)
+        if not columns:
+            columns = (image.get_width() - 2 * margin + spacing) // (tilewidth + spacing)
+    if not tilecount and image is not None:
+        rows = (image.get_height() - 2 * margin + spacing) // (tileheight + spacing)
+        tilecount = columns * rows
+
+    return TmxTileset(element.get('name', ''), firstgid, tilecount, columns, tilewidth, tileheight,
+                      spacing, margin, image, source, colorkey)
+
+
+def load_tmx(filename, load_images=True):
+    """
+    Load an orthogonal TMX map without pytmx
+
+    The file is stream-parsed, tile layers are decoded straight into uint32 arrays
+    and each tileset image is loaded once, with tiles sliced from it as they are
+    first drawn. Time and memory grow linearly with the map size.
+
+    Args:
+        filename: Path to the TMX file
+        load_images: Whether to load tileset images, tools that only need the tile
+            data (collision, previews) can skip them
+
+    Returns:
+        A TmxMap
+
+    Raises:
+        UnsupportedMapError: For features only pytmx handles (infinite or
+            non-orthogonal maps, group layers, image collection tilesets, ...)
+    """
+    base_dir = os.path.dirname(filename)
+    tmx_map = None
+    gids = None
+
+    for event, element in ET.iterparse(filename, events=('start', 'end')):
+        if event == 'start':
+            if element.tag == 'map':
+                if element.get('orientation', 'orthogonal') != 'orthogonal':
+                    raise UnsupportedMapError(f"{element.get('orientation')} orientation")
+                if element.get('infinite', '0') == '1':
+                    raise UnsupportedMapError("infinite maps")
+                tmx_map = TmxMap(filename, int(element.get('width')), int(element.get('height')),
+                                 int(element.get('tilewidth')), int(element.get('tileheight')), [], [])
+            elif element.tag == 'group':
+                raise UnsupportedMapError("group layers")
+            continue
+
+        if element.tag == 'tileset':
+            tmx_map.tilesets.append(read_tileset(element, base_dir, load_images))
+            element.clear()
+        elif element.tag == 'data':
+            gids = decode_layer_data(element, tmx_map.width, tmx_map.height)
+            element.clear()
+        elif element.tag == 'layer':
+            width = int(element.get('width', tmx_map.width))
+            height = int(element.get('height', tmx_map.height))
+            if gids is None or width != tmx_map.width or height != tmx_map.height:
+                raise UnsupportedMapError(f"layer {element.get('name')} doesn't cover the map")
+            tmx_map.layers.append(TmxLayer(element.get('name', ''), width, height, gids,
+                                           element.get('visible', '1') != '0'))
+            gids = None
+            element.clear()
+
+    tmx_map.tilesets.sort(key=lambda tileset: tileset.firstgid)
+    return tmx_map
+
+
+def load_map(filename):
+    """
+    Load a TMX map with the fast loader, falling back to pytmx for maps it can't load
+
+    Args:
+        filename: Path to the TMX file
+
+    Returns:
+        A TmxMap, or a pytmx TiledMap for maps using unsupported features
+    """
+    try:
+        return load_tmx(filename)
+    except UnsupportedMapError as e:
+        print(f"Loading {filename} with pytmx ({e} not supported by the fast loader)")
+        tmx_data = pytmx.load_pygame(filename)
+        tmx_data.filename = filename
+        return tmx_data
@@ -3,10 +3,20 @@ import random
 import pygame
 import sys
 
-import pytmx
 from src.map_config import MapConfig
-from src.ui import WIDTH, HEIGHT, WHITE, BLACK, DARK_GRAY, BLUE, LIGHT_BLUE, GREEN, RED, YELLOW, GRAY, HIGHLIGHT, draw_character_card
-from src.ui import calculate_card_height
+from src.map_renderer import get_chunk_cache
+from src.map_cache import map_cache
+from src.asset_manager import asset_manager
+from src.collision import get_walkability_grid
+from src.enemy_index import get_enemy_index
+from src.dirty_rects import DirtyRectRenderer
+from src.frame_scheduler import frame_scheduler
+from src.profiler import profiler
+from src.ui import WIDTH, HEIGHT, WHITE, BLACK, DARK_GRAY, BLUE, LIGHT_BLUE, GREEN, RED, YELLOW, GRAY, HIGHLIGHT, draw_character_card, character_card_key
+from src.ui import calculate_card_height, get_gradient_surface, get_font, render_text
+
+# Keys that move the player while held
+MOVEMENT_KEYS = (pygame.K_w, pygame.K_UP, pygame.K_s, pygame.K_DOWN, pygame.K_a, pygame.K_LEFT, pygame.K_d, pygame.K_RIGHT)
 
 # Main game screen function
 def map_screen(screen, character_data):
@@ -36,7 +46,6 @@ def map_screen(screen, character_data):
     """
     # Initialize variables
     running = True
-    clock = pygame.time.Clock()
 
 
     # print(f"Character Data {json.dumps(character_data)}")
@@ -98,7 +107,8 @@ def map_screen(screen, character_data):
 
 
         try:
-            tmx_data = pytmx.load_pygame(map_path)
+            # Parsed once per level session and reused every time the map screen is entered
+            tmx_data = map_cache.load(map_path)
             print(f"Loaded map from {map_path}")
         except Exception as e:
             print(f"Error loading map: {e}")
@@ -135,8 +145,9 @@ def map_screen(screen, character_data):
     print(f"Starting position: ({player_x}, {player_y})")
 
     try:
-        # Load the TMX data
-        tmx_data = pytmx.load_pygame(map_path)
+        # The TMX data was loaded above from the map cache
+        if tmx_data is None:
+            raise ValueError(f"No map loaded from {map_path}")
 
         # Tile size (from the TMX file)
         tile_width = tmx_data.tilewidth
@@ -151,9 +162,18 @@ def map_screen(screen, character_data):
             map_area_height / (visible_tiles * tile_height)
         )
 
-        # Size of tiles after zooming
-        zoomed_tile_width = tile_width * zoom_factor
-        zoomed_tile_height = tile_height * zoom_factor
+        # Size of tiles after zooming (whole pixels so baked chunks line up with sprites)
+        zoomed_tile_width = int(tile_width * zoom_factor)
+        zoomed_tile_height = int(tile_height * zoom_factor)
+
+        # Enemies indexed by tile so collisions and culling don't scan the whole list
+        enemy_index = get_enemy_index(character_data['level'])
+
+        # Collision grid computed once from the wall tiles, so walkability checks are O(1)
+        walkability_grid = get_walkability_grid(tmx_data, map_config['wall_tiles'])
+
+        # Static layers are baked into chunks at this zoom and blitted each frame
+        chunk_cache = get_chunk_cache(tmx_data, (zoomed_tile_width, zoomed_tile_height), (20, 20, 40))
 
         # Player size and color
         player_size = min(zoomed_tile_width, zoomed_tile_height)
@@ -169,28 +189,41 @@ def map_screen(screen, character_data):
 
     # Continue button removed
 
+    # Only redraw and push the regions that changed when --dirty-rects is enabled
+    renderer = DirtyRectRenderer()
+    card_rect = pygame.Rect(player_card_x, player_card_y, card_width + 1, card_height)
+    map_rect = pygame.Rect(map_area_x, map_area_y, map_area_width, map_area_height)
+
     # Main loop
     while running:
+        # Time the phases of the frame for the --debug overlay and --profile-output
+        profiler.start_frame('map')
+
         # Handle events
-        for event in pygame.event.get():
+        profiler.begin('input')
+        for event in frame_scheduler.get_events():
             if event.type == pygame.QUIT:
                 pygame.quit()
                 sys.exit()
 
+            if event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+                renderer.mark_all()
+
             if event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_ESCAPE:
                     pygame.quit()
                     sys.exit()  # Exit the game when Escape is pressed
             # Continue button handling removed
+        # Time spent waiting for input isn't part of the frame
+        profiler.exclude(frame_scheduler.wait_time)
+        profiler.end('input')
 
         # Handle player movement with WASD
+        profiler.begin('movement')
         if tmx_data and move_cooldown <= 0:
             keys = pygame.key.get_pressed()
             moved = False
 
-            # Get wall tiles from config
-            wall_tiles = map_config['wall_tiles']
-
             # Store current position for reverting if needed
             new_x, new_y = player_x, player_y
 
@@ -228,7 +261,7 @@ def map_screen(screen, character_data):
             if moved:
                 if character_data.get('debug_mode', False):
                     print(f"Attempting to move to ({new_x}, {new_y})")
-                walkable = is_walkable(new_x, new_y, tmx_data, wall_tiles, character_data.get('debug_mode', False))
+                walkable = is_walkable(new_x, new_y, walkability_grid, character_data.get('debug_mode', False))
                 if character_data.get('debug_mode', False):
                     print(f"Position is walkable: {walkable}")
 
@@ -243,15 +276,9 @@ def map_screen(screen, character_data):
                                     print(f"Enemy {e.get('name', 'Unknown')} at position {e['position'].get('x')}, {e['position'].get('y')}")
 
                     # Check for enemy collision
-                    enemy = None
-
-                    # Only check enemies from level data
-                    if 'level' in character_data and 'enemies' in character_data['level']:
-                        for e in character_data['level']['enemies']:
-                            if 'position' in e and e['position'].get('x') == new_x and e['position'].get('y') == new_y:
-                                enemy = e
-                                print(f"Found enemy in level data: {e.get('name')}")
-                                break
+                    enemy = enemy_index.get_enemy_at(new_x, new_y)
+                    if enemy:
+                        print(f"Found enemy in level data: {enemy.get('name')}")
 
                     if enemy:
                         if character_data.get('debug_mode', False):
@@ -283,22 +310,45 @@ def map_screen(screen, character_data):
                         print(f"Cannot move to ({new_x}, {new_y}) - collision detected")
                     move_cooldown = cooldown_time // 2
 
+        # Streamed maps decode the chunks around the player ahead of time
+        if tmx_data and hasattr(tmx_data, 'prefetch'):
+            tmx_data.prefetch(player_x, player_y)
+
         # Update cooldown
         if move_cooldown > 0:
-            move_cooldown -= clock.get_time()
-
-        # Clear the screen
-        screen.fill(BLACK)
-
-        # Draw background gradient
-        for y in range(HEIGHT):
-            color_value = max(0, 50 - y // 10)
-            pygame.draw.line(screen, (0, 0, color_value), (0, y), (WIDTH, y))
+            move_cooldown -= frame_scheduler.get_time()
+        profiler.end('movement')
+
+        # Work out which regions changed since the last frame
+        renderer.track('card', card_rect, character_card_key(character_data, card_width, card_height, player_health))
+        renderer.track('map', map_rect, (player_x, player_y, len(character_data['level'].get('enemies', []))))
+        if character_data.get('debug_mode', False):
+            asset_stats = asset_manager.stats()
+            renderer.track('debug', map_rect, (asset_stats['misses'], asset_stats['evictions'], asset_stats['used_bytes']))
+            # The phase graph scrolls every frame
+            overlay_pos = (map_area_x + 20, map_area_y + map_area_height - 300)
+            renderer.track('profiler', profiler.overlay_rect(*overlay_pos), len(profiler.frame_times))
+
+        # Run at full rate while moving, otherwise wait for input
+        keys = pygame.key.get_pressed()
+        busy = move_cooldown > 0 or any(keys[key] for key in MOVEMENT_KEYS)
+
+        # Nothing changed, keep the previous frame on the display
+        if not renderer.needs_redraw():
+            frame_scheduler.tick(busy=busy)
+            profiler.end_frame()
+            continue
+
+        # Draw background gradient (covers the whole screen)
+        profiler.begin('card')
+        screen.blit(get_gradient_surface((WIDTH, HEIGHT), (0, 0, 50)), (0, 0))
 
         # Draw player card
         draw_character_card(screen, character_data, player_card_x, player_card_y, card_width, card_height, player_health)
+        profiler.end('card')
 
         # Create a surface for the map area
+        profiler.begin('map')
         map_surface = pygame.Surface((map_area_width, map_area_height))
         map_surface.fill((20, 20, 40))  # Dark blue background
 
@@ -312,36 +362,33 @@ def map_screen(screen, character_data):
                 offset_x = center_x - (player_x * zoomed_tile_width) - (zoomed_tile_width / 2)
                 offset_y = center_y - (player_y * zoomed_tile_height) - (zoomed_tile_height / 2)
 
-                # Draw the visible portion of the map
-                for layer in tmx_data.visible_layers:
-                    if hasattr(layer, 'data'):
-                        for x in range(max(0, player_x - 6), min(tmx_data.width, player_x + 7)):
-                            for y in range(max(0, player_y - 6), min(tmx_data.height, player_y + 7)):
-                                # Get the tile image
-                                gid = layer.data[y][x]
-                                if gid:
-                                    tile = tmx_data.get_tile_image_by_gid(gid)
-                                    if tile:
-                                        # Scale the tile
-                                        scaled_tile = pygame.transform.scale(
-                                            tile,
-                                            (int(zoomed_tile_width), int(zoomed_tile_height))
-                                        )
-
-                                        # Calculate position with offset
-                                        pos_x = int(x * zoomed_tile_width + offset_x)
-                                        pos_y = int(y * zoomed_tile_height + offset_y)
-
-                                        # Draw the tile
-                                        map_surface.blit(scaled_tile, (pos_x, pos_y))
+                # Draw the visible portion of the map (6 tiles around the player)
+                view_left = max(0, player_x - 6)
+                view_top = max(0, player_y - 6)
+                view_right = min(tmx_data.width, player_x + 7)
+                view_bottom = min(tmx_data.height, player_y + 7)
+                view_rect = pygame.Rect(
+                    int(view_left * zoomed_tile_width + offset_x),
+                    int(view_top * zoomed_tile_height + offset_y),
+                    int((view_right - view_left) * zoomed_tile_width),
+                    int((view_bottom - view_top) * zoomed_tile_height)
+                )
+                map_surface.set_clip(view_rect)
+                chunk_cache.draw(map_surface, offset_x, offset_y)
+                map_surface.set_clip(None)
+                profiler.end('map')
 
                 # Draw enemies
-                # Only use enemies from level data
-                enemies = []
-
-                # Add enemies from level data if available
-                if 'level' in character_data and 'enemies' in character_data['level']:
-                    enemies = character_data['level']['enemies']
+                profiler.begin('entities')
+                level_directory = character_data['level']['directory']
+
+                # Only look up enemies in the tiles covered by the map area
+                enemies = enemy_index.enemies_in_rect(
+                    int(-offset_x // zoomed_tile_width),
+                    int(-offset_y // zoomed_tile_height),
+                    int((map_area_width - offset_x) // zoomed_tile_width),
+                    int((map_area_height - offset_y) // zoomed_tile_height)
+                )
 
                 for enemy in enemies:
                     if 'position' in enemy:
@@ -365,49 +412,15 @@ def map_screen(screen, character_data):
                                 enemy_size
                             )
                             
-                            # Try to load and use enemy icon if available, otherwise fall back to image
-                            enemy_icon_path = None
-                            enemy_image_path = None
-                            
-                            # First try to use icon
-                            if 'icon' in enemy:
-                                enemy_icon_path = os.path.join(character_data['level']['directory'], enemy['icon'])
-                            
-                            # Then try to use image as fallback
-                            if 'image' in enemy:
-                                enemy_image_path = os.path.join(character_data['level']['directory'], enemy['image'])
-                            
-                            # Try icon first
-                            if enemy_icon_path and os.path.exists(enemy_icon_path):
-                                try:
-                                    enemy_image = pygame.image.load(enemy_icon_path)
-                                    enemy_image = pygame.transform.scale(enemy_image, (enemy_size, enemy_size))
-                                    map_surface.blit(enemy_image, enemy_rect)
-                                except Exception as e:
-                                    print(f"Error loading enemy icon {enemy_icon_path}: {e}")
-                                    # Fall back to portrait image if icon fails
-                                    if enemy_image_path and os.path.exists(enemy_image_path):
-                                        try:
-                                            enemy_image = pygame.image.load(enemy_image_path)
-                                            enemy_image = pygame.transform.scale(enemy_image, (enemy_size, enemy_size))
-                                            map_surface.blit(enemy_image, enemy_rect)
-                                        except Exception as e:
-                                            print(f"Error loading enemy image {enemy_image_path}: {e}")
-                                            pygame.draw.rect(map_surface, (255, 0, 0), enemy_rect)  # Red fallback
-                                            pygame.draw.rect(map_surface, (255, 255, 255), enemy_rect, 2)  # White border
-                                    else:
-                                        pygame.draw.rect(map_surface, (255, 0, 0), enemy_rect)  # Red fallback
-                                        pygame.draw.rect(map_surface, (255, 255, 255), enemy_rect, 2)  # White border
-                            # Try portrait image if no icon
-                            elif enemy_image_path and os.path.exists(enemy_image_path):
-                                try:
-                                    enemy_image = pygame.image.load(enemy_image_path)
-                                    enemy_image = pygame.transform.scale(enemy_image, (enemy_size, enemy_size))
-                                    map_surface.blit(enemy_image, enemy_rect)
-                                except Exception as e:
-                                    print(f"Error loading enemy image {enemy_image_path}: {e}")
-                                    pygame.draw.rect(map_surface, (255, 0, 0), enemy_rect)  # Red fallback
-                                    pygame.draw.rect(map_surface, (255, 255, 255), enemy_rect, 2)  # White border
+                            # Use the enemy icon, falling back to the portrait and then the level placeholder
+                            enemy_image = asset_manager.load_first([
+                                os.path.join(level_directory, enemy['icon']) if 'icon' in enemy else None,
+                                os.path.join(level_directory, enemy['image']) if 'image' in enemy else None,
+                                os.path.join(level_directory, 'placeholder.png')
+                            ], (enemy_size, enemy_size))
+
+                            if enemy_image:
+                                map_surface.blit(enemy_image, enemy_rect)
                             else:
                                 # Fallback to red box if no images available
                                 pygame.draw.rect(map_surface, (255, 0, 0), enemy_rect)  # Red for enemies
@@ -421,49 +434,15 @@ def map_screen(screen, character_data):
                     player_size
                 )
                 
-                # Try to load and use player icon if available, otherwise fall back to image
-                player_icon_path = None
-                player_image_path = None
-                
-                # First try to use icon
-                if 'icon' in character_data:
-                    player_icon_path = os.path.join(character_data['level']['directory'], character_data['icon'])
-                
-                # Then try to use image as fallback
-                if 'image' in character_data:
-                    player_image_path = os.path.join(character_data['level']['directory'], character_data['image'])
-                
-                # Try icon first
-                if player_icon_path and os.path.exists(player_icon_path):
-                    try:
-                        player_image = pygame.image.load(player_icon_path)
-                        player_image = pygame.transform.scale(player_image, (player_size, player_size))
-                        map_surface.blit(player_image, player_rect)
-                    except Exception as e:
-                        print(f"Error loading player icon {player_icon_path}: {e}")
-                        # Fall back to portrait image if icon fails
-                        if player_image_path and os.path.exists(player_image_path):
-                            try:
-                                player_image = pygame.image.load(player_image_path)
-                                player_image = pygame.transform.scale(player_image, (player_size, player_size))
-                                map_surface.blit(player_image, player_rect)
-                            except Exception as e:
-                                print(f"Error loading player image {player_image_path}: {e}")
-                                pygame.draw.rect(map_surface, player_color, player_rect)  # Green fallback
-                                pygame.draw.rect(map_surface, (255, 255, 255), player_rect, 2)  # White border
-                        else:
-                            pygame.draw.rect(map_surface, player_color, player_rect)  # Green fallback
-                            pygame.draw.rect(map_surface, (255, 255, 255), player_rect, 2)  # White border
-                # Try portrait image if no icon
-                elif player_image_path and os.path.exists(player_image_path):
-                    try:
-                        player_image = pygame.image.load(player_image_path)
-                        player_image = pygame.transform.scale(player_image, (player_size, player_size))
-                        map_surface.blit(player_image, player_rect)
-                    except Exception as e:
-                        print(f"Error loading player image {player_image_path}: {e}")
-                        pygame.draw.rect(map_surface, player_color, player_rect)  # Green fallback
-                        pygame.draw.rect(map_surface, (255, 255, 255), player_rect, 2)  # White border
+                # Use the player icon, falling back to the portrait and then the level placeholder
+                player_image = asset_manager.load_first([
+                    os.path.join(level_directory, character_data['icon']) if 'icon' in character_data else None,
+                    os.path.join(level_directory, character_data['image']) if 'image' in character_data else None,
+                    os.path.join(level_directory, 'placeholder.png')
+                ], (player_size, player_size))
+
+                if player_image:
+                    map_surface.blit(player_image, player_rect)
                 else:
                     # Fallback to green box if no images available
                     pygame.draw.rect(map_surface, player_color, player_rect)
@@ -471,13 +450,13 @@ def map_screen(screen, character_data):
 
             except Exception as e:
                 print(f"Error rendering map: {e}")
-                font = pygame.font.SysFont('Arial', 24)
-                error_text = font.render(f"Error rendering map: {e}", True, (255, 0, 0))
+                font = get_font(24)
+                error_text = render_text(font, f"Error rendering map: {e}", (255, 0, 0))
                 map_surface.blit(error_text, (20, 20))
         else:
             # Draw error message if map couldn't be loaded
-            font = pygame.font.SysFont('Arial', 24)
-            error_text = font.render("Error loading map", True, (255, 0, 0))
+            font = get_font(24)
+            error_text = render_text(font, "Error loading map", (255, 0, 0))
             map_surface.blit(error_text, (20, 20))
 
         # Draw the map surface
@@ -485,24 +464,28 @@ def map_screen(screen, character_data):
 
         # Draw map border
         pygame.draw.rect(screen, (100, 100, 150), (map_area_x, map_area_y, map_area_width, map_area_height), 2)
+        # Whichever of these is still running, e.g. the map when it failed to render
+        profiler.end('map')
+        profiler.end('entities')
 
         # Map title removed
 
         # Draw instructions
-        instruction_font = pygame.font.SysFont('Arial', 18)
+        instruction_font = get_font(18)
         # Instruction label removed as requested
 
         # Continue button drawing removed
 
         # Draw player coordinates and debug info
+        profiler.begin('text')
         if tmx_data and character_data.get('debug_mode', False):
-            coord_font = pygame.font.SysFont('Arial', 16)
-            coord_text = coord_font.render(f"Position: ({player_x}, {player_y})", True, (200, 200, 200))
+            coord_font = get_font(16)
+            coord_text = render_text(coord_font, f"Position: ({player_x}, {player_y})", (200, 200, 200))
             screen.blit(coord_text, (map_area_x + 10, map_area_y + 10))
 
             # Draw wall tile info
             wall_tiles = map_config['wall_tiles']
-            wall_text = coord_font.render(f"Wall tiles: {wall_tiles[:5]}{'...' if len(wall_tiles) > 5 else ''}", True, (200, 200, 200))
+            wall_text = render_text(coord_font, f"Wall tiles: {wall_tiles[:5]}{'...' if len(wall_tiles) > 5 else ''}", (200, 200, 200))
             screen.blit(wall_text, (map_area_x + 10, map_area_y + 30))
 
             # Get current tile info
@@ -519,7 +502,7 @@ def map_screen(screen, character_data):
                                 tile_id = tile_gid - tileset.firstgid + 1
                                 current_tile_info += f"(ID={tile_id})"
 
-            tile_text = coord_font.render(current_tile_info, True, (200, 200, 200))
+            tile_text = render_text(coord_font, current_tile_info, (200, 200, 200))
             screen.blit(tile_text, (map_area_x + 10, map_area_y + 50))
 
             # Draw enemy count
@@ -529,12 +512,39 @@ def map_screen(screen, character_data):
             if 'level' in character_data and 'enemies' in character_data['level']:
                 enemies = character_data['level']['enemies']
 
-            enemy_text = coord_font.render(f"Enemies: {len(enemies)}", True, (200, 200, 200))
+            enemy_text = render_text(coord_font, f"Enemies: {len(enemies)}", (200, 200, 200))
             screen.blit(enemy_text, (map_area_x + 10, map_area_y + 70))
 
+            # Draw asset cache counters
+            asset_stats = asset_manager.stats()
+            asset_text = render_text(
+                coord_font,
+                f"Assets: {asset_stats['hits']} hits, {asset_stats['misses']} misses, "
+                f"{asset_stats['evictions']} evictions, {asset_stats['used_bytes'] / (1024 * 1024):.1f} MB",
+                (200, 200, 200))
+            screen.blit(asset_text, (map_area_x + 10, map_area_y + 90))
+
+            # Draw frame rate and how much of the time is spent sleeping
+            frame_stats = frame_scheduler.stats()
+            frame_text = render_text(
+                coord_font,
+                f"FPS: {frame_stats['fps']:.1f}, sleeping {frame_stats['sleep_ratio'] * 100:.0f}%",
+                (200, 200, 200))
+            screen.blit(frame_text, (map_area_x + 10, map_area_y + 110))
+        profiler.end('text')
+
+        # Draw the frame phase graph in the bottom left of the map area
+        if character_data.get('debug_mode', False):
+            profiler.begin('overlay')
+            profiler.draw_overlay(screen, *overlay_pos)
+            profiler.end('overlay')
+
         # Update the display
-        pygame.display.flip()
-        clock.tick(60)
+        profiler.begin('flip')
+        renderer.present()
+        profiler.end('flip')
+        frame_scheduler.tick(busy=busy)
+        profiler.end_frame()
 
     # Store player position and map data in character data for future use
     if tmx_data:
@@ -548,33 +558,11 @@ def map_screen(screen, character_data):
 
 
 # Function to check if a position is walkable
-def is_walkable(x, y, tmx_data, wall_tiles, debug_mode=False):
-    # Check map boundaries
-    if x < 0 or y < 0 or x >= tmx_data.width or y >= tmx_data.height:
-        if debug_mode:
+def is_walkable(x, y, walkability_grid, debug_mode=False):
+    walkable = walkability_grid.is_walkable(x, y)
+    if debug_mode and not walkable:
+        if x < 0 or y < 0 or x >= walkability_grid.width or y >= walkability_grid.height:
             print(f"Position ({x}, {y}) is out of bounds")
-        return False
-
-    # Check for wall tiles in all layers
-    for layer in tmx_data.visible_layers:
-        if hasattr(layer, 'data'):
-            tile_gid = layer.data[y][x]
-
-            # Special case: if GID is 0 (empty tile) and 0 is in wall_tiles
-            if tile_gid == 0 and 0 in wall_tiles:
-                if character_data.get('debug_mode', False):
-                    print(f"Position ({x}, {y}) has GID 0 (empty tile) which is a wall")
-                return False
-
-            # For non-zero GIDs, convert to tile ID
-            if tile_gid > 0:
-                # Convert GID to tile ID by subtracting firstgid
-                for tileset in tmx_data.tilesets:
-                    if tile_gid >= tileset.firstgid and tile_gid < tileset.firstgid + tileset.tilecount:
-                        tile_id = tile_gid - tileset.firstgid + 1  # +1 because TMX tile IDs start at 1
-                        if tile_id in wall_tiles:
-                            if character_data.get('debug_mode', False):
-                                print(f"Position ({x}, {y}) has tile ID {tile_id} which is a wall")
-                            return False
-
-    return True
+        else:
+            print(f"Position ({x}, {y}) is a wall")
+    return walkable
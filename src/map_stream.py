@@ -0,0 +1,511 @@
+import mmap
+import os
+import queue
+import re
+import threading
+import xml.etree.ElementTree as ET
+
+import numpy
+
+from src.collision import WalkabilityGrid, is_wall_gid
+from src.map_renderer import TmxMap, UnsupportedMapError, decode_layer_data, read_tileset
+
+# Tags located in the raw file, so only the chunks that are needed get read
+MAP_TAG = re.compile(rb'<map\b([^>]*)>')
+TILESET_TAG = re.compile(rb'<tileset\b[^>]*?(?:/>|>.*?</tileset>)', re.S)
+LAYER_TAG = re.compile(rb'<(layer|group)\b([^>]*)>')
+LAYER_END = re.compile(rb'</layer>')
+DATA_TAG = re.compile(rb'<data\b([^>]*)>')
+CHUNK_TAG = re.compile(rb'<chunk\b([^>]*)>')
+ATTRIBUTE = re.compile(rb'([\w-]+)="([^"]*)"')
+
+
+def tag_attributes(data):
+    """
+    Parse the attributes of a tag found in the raw file
+
+    Args:
+        data: Bytes between the tag name and the closing '>'
+
+    Returns:
+        Dictionary of attribute names to values
+    """
+    return {name.decode('utf-8'): value.decode('utf-8') for name, value in ATTRIBUTE.findall(data)}
+
+
+def is_infinite_map(filename):
+    """
+    Check if a TMX file is an infinite (chunked) map
+
+    Args:
+        filename: Path to the TMX file
+
+    Returns:
+        True if the map has infinite="1"
+    """
+    for _, element in ET.iterparse(filename, events=('start',)):
+        return element.tag == 'map' and element.get('infinite', '0') == '1'
+    return False
+
+
+class ChunkStore:
+    """
+    Decoded tile chunks of a streamed map.
+
+    The file is mapped into memory and indexed once: for every chunk the index holds
+    where its data is in the file. Chunks are decoded the first time a tile in them
+    is read, or ahead of time by a background thread when prefetch() is called near
+    them. Only max_chunks chunks are kept, the ones furthest from the last prefetch
+    position are evicted first, so memory doesn't grow with the map size.
+    """
+    def __init__(self, filename, max_chunks=49, prefetch_radius=2):
+        """
+        Index a chunked TMX map
+
+        Args:
+            filename: Path to the TMX file
+            max_chunks: Number of decoded chunks to keep
+            prefetch_radius: How many chunks around the player to decode ahead of time
+        """
+        self.filename = filename
+        self.max_chunks = max_chunks
+        self.prefetch_radius = prefetch_radius
+        with open(filename, 'rb') as f:
+            self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        self.map_attributes = tag_attributes(MAP_TAG.search(self.mmap).group(1))
+        self.layers = []
+        self.chunk_size = None
+        self.index = {}
+        self._index_layers()
+
+        self.chunks = {}
+        self.lock = threading.Lock()
+        self.center = (0, 0)
+        self.pending = set()
+        self.requests = queue.Queue()
+        self.worker = None
+        self.decoded = 0
+
+    def _index_layers(self):
+        # Find each layer's chunks and remember where their data is in the file
+        position = 0
+        while True:
+            match = LAYER_TAG.search(self.mmap, position)
+            if match is None:
+                break
+            if match.group(1) == b'group':
+                raise UnsupportedMapError("group layers")
+
+            attributes = tag_attributes(match.group(2))
+            end = LAYER_END.search(self.mmap, match.end())
+            data = DATA_TAG.search(self.mmap, match.end(), end.start())
+            data_attributes = tag_attributes(data.group(1))
+            if 'encoding' not in data_attributes:
+                raise UnsupportedMapError("XML encoded chunks")
+            layer_index = len(self.layers)
+            self.layers.append({
+                'name': attributes.get('name', ''),
+                'visible': attributes.get('visible', '1') != '0',
+                'data': data_attributes
+            })
+
+            for chunk in CHUNK_TAG.finditer(self.mmap, data.end(), end.start()):
+                # Attribute values are left as bytes, there can be many thousands of chunks
+                chunk_attributes = dict(ATTRIBUTE.findall(chunk.group(1)))
+                x, y = int(chunk_attributes[b'x']), int(chunk_attributes[b'y'])
+                size = (int(chunk_attributes[b'width']), int(chunk_attributes[b'height']))
+                if self.chunk_size is None:
+                    self.chunk_size = size
+                elif size != self.chunk_size or x % size[0] or y % size[1]:
+                    raise UnsupportedMapError("chunks of different sizes or not aligned to the chunk grid")
+                payload_end = self.mmap.find(b'</chunk>', chunk.end(), end.start())
+                self.index.setdefault((x, y), []).append((layer_index, chunk.end(), payload_end))
+            position = end.end()
+
+        if self.chunk_size is None:
+            raise UnsupportedMapError("infinite map without chunks")
+
+    def bounds(self):
+        """
+        Get the area covered by chunks
+
+        Returns:
+            Tuple of (left, top, right, bottom) in Tiled tile coordinates, right and
+            bottom exclusive
+        """
+        width, height = self.chunk_size
+        xs = [x for x, _ in self.index]
+        ys = [y for _, y in self.index]
+        return (min(xs), min(ys), max(xs) + width, max(ys) + height)
+
+    def chunk_key(self, x, y):
+        """
+        Get the key of the chunk containing a tile
+
+        Args:
+            x: Tile column in Tiled coordinates
+            y: Tile row in Tiled coordinates
+
+        Returns:
+            The (x, y) of the chunk's top-left tile
+        """
+        return (x - x % self.chunk_size[0], y - y % self.chunk_size[1])
+
+    def get_gid(self, layer_index, x, y):
+        """
+        Read a tile's gid, decoding its chunk if needed
+
+        Args:
+            layer_index: Index of the layer in the map
+            x: Tile column in Tiled coordinates
+            y: Tile row in Tiled coordinates
+
+        Returns:
+            The gid, 0 where there is no chunk
+        """
+        key = (x - x % self.chunk_size[0], y - y % self.chunk_size[1])
+        chunk = self.get_chunk(key)
+        if chunk is None:
+            return 0
+        gids = chunk[layer_index]
+        if gids is None:
+            return 0
+        return gids[(y - key[1]) * self.chunk_size[0] + (x - key[0])]
+
+    def get_chunk(self, key):
+        """
+        Get a decoded chunk
+
+        Args:
+            key: The chunk's top-left tile in Tiled coordinates
+
+        Returns:
+            List with one row-major memoryview of gids (or None) per layer, or None if
+            the map has no chunk there
+        """
+        with self.lock:
+            chunk = self.chunks.get(key)
+        if chunk is not None or key not in self.index:
+            return chunk
+        return self._store(key, self._decode(key))
+
+    def prefetch(self, x, y):
+        """
+        Decode the chunks around a position in the background
+
+        Args:
+            x: Tile column in Tiled coordinates
+            y: Tile row in Tiled coordinates
+        """
+        width, height = self.chunk_size
+        center = self.chunk_key(x, y)
+        if center == self.center and self.worker is not None:
+            return
+        self.center = center
+
+        keys = []
+        for dy in range(-self.prefetch_radius, self.prefetch_radius + 1):
+            for dx in range(-self.prefetch_radius, self.prefetch_radius + 1):
+                key = (center[0] + dx * width, center[1] + dy * height)
+                if key in self.index:
+                    keys.append(key)
+        keys.sort(key=self._distance)
+
+        with self.lock:
+            keys = [key for key in keys if key not in self.chunks and key not in self.pending]
+            self.pending.update(keys)
+        for key in keys:
+            self.requests.put(key)
+
+        if self.worker is None:
+            self.worker = threading.Thread(target=self._run, name="map-stream", daemon=True)
+            self.worker.start()
+
+    def close(self):
+        """
+        Stop the prefetch thread and drop all decoded chunks
+        """
+        if self.worker is not None:
+            self.requests.put(None)
+            self.worker.join()
+            self.worker = None
+        with self.lock:
+            self.chunks.clear()
+            self.pending.clear()
+
+    def _run(self):
+        # Prefetch thread: decode requested chunks until close() sends None
+        while True:
+            key = self.requests.get()
+            if key is None:
+                break
+            with self.lock:
+                resident = key in self.chunks
+            if not resident:
+                try:
+                    self._store(key, self._decode(key))
+                except Exception as e:
+                    print(f"Error decoding map chunk {key}: {e}")
+            with self.lock:
+                self.pending.discard(key)
+
+    def _decode(self, key):
+        chunk = [None] * len(self.layers)
+        width, height = self.chunk_size
+        for layer_index, start, end in self.index[key]:
+            element = ET.Element('data', self.layers[layer_index]['data'])
+            element.text = self.mmap[start:end].decode('ascii')
+            chunk[layer_index] = memoryview(decode_layer_data(element, width, height))
+        return chunk
+
+    def _store(self, key, chunk):
+        with self.lock:
+            if key in self.chunks:
+                return self.chunks[key]
+            self.chunks[key] = chunk
+            self.decoded += 1
+            if len(self.chunks) > self.max_chunks:
+                # Evict the chunks furthest from the player
+                for far_key in sorted(self.chunks, key=self._distance)[self.max_chunks:]:
+                    if far_key != key:
+                        del self.chunks[far_key]
+        return chunk
+
+    def _distance(self, key):
+        return abs(key[0] - self.center[0]) + abs(key[1] - self.center[1])
+
+
+class StreamedRow:
+    """
+    One row of a streamed layer, indexing it reads through the chunk store
+    """
+    def __init__(self, layer, y):
+        self.layer = layer
+        self.y = y
+
+    def __getitem__(self, x):
+        return self.layer.get_gid(x, self.y)
+
+    def __len__(self):
+        return self.layer.width
+
+    def __iter__(self):
+        for x in range(self.layer.width):
+            yield self.layer.get_gid(x, self.y)
+
+
+class StreamedLayerData:
+    """
+    Row access for a streamed layer, so layer.data[y][x] works as it does with pytmx
+    """
+    def __init__(self, layer):
+        self.layer = layer
+
+    def __getitem__(self, y):
+        return StreamedRow(self.layer, y)
+
+    def __len__(self):
+        return self.layer.height
+
+    def __iter__(self):
+        for y in range(self.layer.height):
+            yield StreamedRow(self.layer, y)
+
+
+class StreamedLayer:
+    """
+    Tile layer of a streamed map
+    """
+    def __init__(self, tmx_map, index, name, visible=True):
+        self.tmx_map = tmx_map
+        self.index = index
+        self.name = name
+        self.visible = visible
+        self.width = tmx_map.width
+        self.height = tmx_map.height
+        self.data = StreamedLayerData(self)
+
+    def get_gid(self, x, y):
+        """
+        Read a tile's gid
+
+        Args:
+            x: Tile column
+            y: Tile row
+
+        Returns:
+            The gid, 0 outside the map
+        """
+        if x < 0 or y < 0 or x >= self.width or y >= self.height:
+            return 0
+        return self.tmx_map.store.get_gid(self.index, x + self.tmx_map.origin_x, y + self.tmx_map.origin_y)
+
+
+class StreamedWalkabilityGrid(WalkabilityGrid):
+    """
+    Collision checks for a streamed map, reading tiles through the chunk store
+    instead of holding a grid for the whole map.
+    """
+    def __init__(self, tmx_map, wall_tiles):
+        """
+        Initialize the StreamedWalkabilityGrid
+
+        Args:
+            tmx_map: The StreamedMap
+            wall_tiles: Tile IDs from level.json that block movement
+        """
+        self.tmx_map = tmx_map
+        self.wall_tiles = wall_tiles
+        self.width = tmx_map.width
+        self.height = tmx_map.height
+        self.cells = None
+        self.wall_gids = {}
+
+    def is_walkable(self, x, y):
+        """
+        Check if a tile can be walked on
+
+        Args:
+            x: Tile column
+            y: Tile row
+
+        Returns:
+            True if the position is inside the map and not a wall
+        """
+        if x < 0 or y < 0 or x >= self.width or y >= self.height:
+            return False
+        for layer in self.tmx_map.visible_layers:
+            if self._is_wall(layer.get_gid(x, y)):
+                return False
+        return True
+
+    def as_array(self, rect=None):
+        """
+        Get the grid, or part of it, as a NumPy array
+
+        The array is built a chunk at a time, so a region only decodes the chunks it
+        covers. The whole map of a large streamed map can be very big, tools that
+        only need an area should pass rect.
+
+        Args:
+            rect: Optional (x, y, width, height) in tiles, clipped to the map,
+                defaults to the whole map
+
+        Returns:
+            A (height, width) bool array that is True for walkable tiles
+        """
+        left, top, width, height = rect if rect is not None else (0, 0, self.width, self.height)
+        x0, y0 = max(0, left), max(0, top)
+        x1, y1 = min(self.width, left + width), min(self.height, top + height)
+        walkable = numpy.ones((max(0, y1 - y0), max(0, x1 - x0)), dtype=numpy.bool_)
+        if not walkable.size:
+            return walkable
+
+        store = self.tmx_map.store
+        chunk_width, chunk_height = store.chunk_size
+        origin_x, origin_y = self.tmx_map.origin_x, self.tmx_map.origin_y
+        layers = self.tmx_map.visible_layers
+        first_x, first_y = store.chunk_key(x0 + origin_x, y0 + origin_y)
+
+        for chunk_y in range(first_y, y1 + origin_y, chunk_height):
+            for chunk_x in range(first_x, x1 + origin_x, chunk_width):
+                # Part of the chunk inside the region, in map and in chunk coordinates
+                cx0, cy0 = max(x0, chunk_x - origin_x), max(y0, chunk_y - origin_y)
+                cx1 = min(x1, chunk_x - origin_x + chunk_width)
+                cy1 = min(y1, chunk_y - origin_y + chunk_height)
+                inner_x, inner_y = cx0 + origin_x - chunk_x, cy0 + origin_y - chunk_y
+                window = (slice(inner_y, inner_y + cy1 - cy0), slice(inner_x, inner_x + cx1 - cx0))
+
+                chunk = store.get_chunk((chunk_x, chunk_y))
+                walls = numpy.zeros((cy1 - cy0, cx1 - cx0), dtype=numpy.bool_)
+                for layer in layers:
+                    layer_gids = chunk[layer.index] if chunk is not None else None
+                    if layer_gids is None:
+                        # No tiles here, same as reading gid 0 through is_walkable
+                        if self._is_wall(0):
+                            walls[:] = True
+                        continue
+                    gids = numpy.frombuffer(layer_gids, dtype=numpy.uint32).reshape(chunk_height, chunk_width)[window]
+                    wall_gids = [gid for gid in numpy.unique(gids).tolist() if self._is_wall(gid)]
+                    if wall_gids:
+                        walls |= numpy.isin(gids, wall_gids)
+                walkable[cy0 - y0:cy1 - y0, cx0 - x0:cx1 - x0] = ~walls
+        return walkable
+
+    def _is_wall(self, gid):
+        # Whether a gid blocks movement, cached as the same few gids come up again and again
+        wall = self.wall_gids.get(gid)
+        if wall is None:
+            wall = is_wall_gid(self.tmx_map, gid, self.wall_tiles)
+            self.wall_gids[gid] = wall
+        return wall
+
+
+class StreamedMap(TmxMap):
+    """
+    Infinite (chunked) map whose tiles are decoded a chunk at a time.
+
+    The map covers the area of its chunks, with (0, 0) at the top-left of that area,
+    so positions in level.json count from there rather than from Tiled's origin.
+    Rendering and collision both read tiles through the same ChunkStore.
+    """
+    def __init__(self, filename, max_chunks=49, load_images=True):
+        """
+        Open a chunked TMX map
+
+        Args:
+            filename: Path to the TMX file
+            max_chunks: Number of decoded chunks to keep
+            load_images: Whether to load tileset images
+        """
+        self.store = ChunkStore(filename, max_chunks)
+        left, top, right, bottom = self.store.bounds()
+        self.origin_x = left
+        self.origin_y = top
+
+        attributes = self.store.map_attributes
+        if attributes.get('orientation', 'orthogonal') != 'orthogonal':
+            raise UnsupportedMapError(f"{attributes.get('orientation')} orientation")
+
+        base_dir = os.path.dirname(filename)
+        tilesets = [
+            read_tileset(ET.fromstring(match.group(0)), base_dir, load_images)
+            for match in TILESET_TAG.finditer(self.store.mmap)
+        ]
+        tilesets.sort(key=lambda tileset: tileset.firstgid)
+
+        super().__init__(filename, right - left, bottom - top,
+                         int(attributes['tilewidth']), int(attributes['tileheight']), tilesets, [])
+        self.layers = [
+            StreamedLayer(self, index, layer['name'], layer['visible'])
+            for index, layer in enumerate(self.store.layers)
+        ]
+
+    def prefetch(self, x, y):
+        """
+        Decode the chunks around the player in the background
+
+        Args:
+            x: Player tile column
+            y: Player tile row
+        """
+        self.store.prefetch(x + self.origin_x, y + self.origin_y)
+
+    def make_walkability_grid(self, wall_tiles):
+        """
+        Create the collision checks for the map (used by get_walkability_grid)
+
+        Args:
+            wall_tiles: Tile IDs from level.json that block movement
+
+        Returns:
+            A StreamedWalkabilityGrid
+        """
+        return StreamedWalkabilityGrid(self, wall_tiles)
+
+    def close(self):
+        """
+        Stop prefetching and drop decoded chunks
+        """
+        self.store.close()
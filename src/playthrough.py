@@ -0,0 +1,490 @@
+import argparse
+import concurrent.futures
+import json
+import multiprocessing
+import os
+import random
+import sys
+import time
+from collections import Counter, deque
+
+import pytmx
+
+from src.balance import MAX_TURNS
+from src.collision import get_walkability_grid
+from src.combat import (ATTACK, ENEMY, HEAL, PLAYER, CombatState, attack_policy, gold_reward,
+                        heal_when_low_policy, prepare_enemy, resolve_turn)
+from src.combat_solver import combat_solver
+from src.level_catalog import LEVELS_DIR, natural_key
+from src.map_renderer import UnsupportedMapError, load_tmx
+from src.map_stream import StreamedMap, is_infinite_map
+
+# Runs per level, the win rate is then within about 1% of the true one
+DEFAULT_RUNS = 10000
+
+# How a run ended
+VICTORY = "victory"
+DEFEAT = "defeat"
+STUCK = "stuck"          # enemies are left that can't be reached
+ABANDONED = "abandoned"  # a fight lasted more than max_turns
+
+# Difficulty labels by the lowest win rate they allow, easiest first. Labels are
+# checked against the solver policy, a player who plays every fight as well as the
+# rules allow (what --hints suggests).
+DIFFICULTY_BANDS = (('Easy', 0.7), ('Medium', 0.4), ('Hard', 0.15), ('Expert', 0.0))
+
+# Loot slots and the type names the loot screen uses for them
+LOOT_SLOTS = ('attack', 'defense', 'heal')
+
+
+def difficulty_label(win_rate):
+    """
+    Get the difficulty a level should be labelled with
+
+    Args:
+        win_rate: Fraction of simulated runs the player won
+
+    Returns:
+        One of the labels in DIFFICULTY_BANDS
+    """
+    for label, lowest in DIFFICULTY_BANDS:
+        if win_rate >= lowest:
+            return label
+    return DIFFICULTY_BANDS[-1][0]
+
+
+class PlayerPolicy:
+    """
+    Decisions of a simulated player: which enemy to walk to, what to do on each
+    combat turn and which loot to take.
+
+    The default plays like a careful player: it walks to the nearest enemy, heals at
+    ENEMY_HEAL_HEALTH or less and takes the loot that improves its items the most.
+    Subclass it, or pass another combat policy (see combat.attack_policy), to try
+    other strategies. Policies are sent to worker processes, so they must pickle.
+    Running from a fight is never chosen, as the enemy keeps its health and the
+    player's doesn't come back.
+    """
+    def __init__(self, combat_policy=heal_when_low_policy):
+        """
+        Initialize the PlayerPolicy
+
+        Args:
+            combat_policy: Function choosing ATTACK or HEAL from a CombatState
+        """
+        self.combat_policy = combat_policy
+
+    def choose_enemy(self, reachable, character_data):
+        """
+        Choose the next enemy to fight
+
+        Args:
+            reachable: List of (steps, enemy index, enemy data) of the enemies that
+                can be reached without walking into another one
+            character_data: The player's current data
+
+        Returns:
+            One of the entries of reachable
+        """
+        return min(reachable, key=lambda entry: (entry[0], entry[1]))
+
+    def choose_action(self, state):
+        """
+        Choose the player's combat action
+
+        Args:
+            state: Current CombatState
+
+        Returns:
+            ATTACK or HEAL
+        """
+        return self.combat_policy(state)
+
+    def choose_loot(self, loot, character_data):
+        """
+        Choose an item from a defeated enemy, the loot screen allows only one
+
+        Args:
+            loot: Dictionary of slot ('attack', 'defense', 'heal') to item with
+                'name' and 'modifier'
+            character_data: The player's current data
+
+        Returns:
+            The slot of the item to take, or None to take nothing
+        """
+        items = character_data['items']
+        best_slot = None
+        best_gain = 0
+        for slot, item in loot.items():
+            current = items.get(slot)
+            # Any healing item beats having none
+            gain = item['modifier'] - current['modifier'] if current else item['modifier'] + 1
+            if gain > best_gain:
+                best_slot, best_gain = slot, gain
+        return best_slot
+
+
+class SolverPolicy(PlayerPolicy):
+    """
+    Plays each turn with the combat solver's best action, the strongest player the
+    rules allow for a single fight.
+    """
+    def choose_action(self, state):
+        """
+        Choose the action with the best exact chance of winning the fight
+
+        Args:
+            state: Current CombatState
+
+        Returns:
+            ATTACK or HEAL
+        """
+        tables = combat_solver.solve(state, save=False)
+        player_health, enemy_health = state.player.health, state.enemy.health
+        attack = tables.win_probability(player_health, enemy_health, ATTACK)
+        heal = tables.win_probability(player_health, enemy_health, HEAL)
+        return HEAL if heal is not None and heal > attack else ATTACK
+
+
+# Player policies by the name used on the command line
+POLICIES = {
+    'attack': PlayerPolicy(attack_policy),
+    'heal-when-low': PlayerPolicy(),
+    'solver': SolverPolicy(),
+}
+
+
+def load_level(level_dir):
+    """
+    Read a level's definition and build its collision grid without loading images
+
+    Args:
+        level_dir: The level's directory
+
+    Returns:
+        Tuple of (level data, WalkabilityGrid)
+    """
+    with open(os.path.join(level_dir, "level.json"), 'r') as f:
+        level_data = json.load(f)
+
+    map_path = os.path.join(level_dir, level_data['path'])
+    if is_infinite_map(map_path):
+        tmx_data = StreamedMap(map_path, load_images=False)
+    else:
+        try:
+            tmx_data = load_tmx(map_path, load_images=False)
+        except UnsupportedMapError:
+            tmx_data = pytmx.TiledMap(map_path)
+    return level_data, get_walkability_grid(tmx_data, level_data.get('wall_tiles', []))
+
+
+class Routes:
+    """
+    Paths between the enemies of a level, the way the map screen moves.
+
+    Moving onto an enemy starts a fight with it, so the enemies still standing
+    block the way. The walk only depends on where the player is and which enemies
+    are left, not on the dice, so each search is done once and reused by every run.
+    """
+    def __init__(self, grid, enemies):
+        """
+        Initialize the Routes
+
+        Args:
+            grid: WalkabilityGrid of the map
+            enemies: List of enemy definitions with a 'position'
+        """
+        self.grid = grid
+        self.positions = {}
+        for i, enemy in enumerate(enemies):
+            position = enemy.get('position')
+            if position:
+                self.positions.setdefault((position['x'], position['y']), i)
+        self.found = {}
+
+    def find_enemies(self, start, remaining):
+        """
+        Find the enemies the player can walk to
+
+        Args:
+            start: (x, y) of the player
+            remaining: Tuple of the indices of the enemies still standing
+
+        Returns:
+            Dictionary of enemy index to (steps, (x, y) of the tile the fight starts from)
+        """
+        key = (start, remaining)
+        found = self.found.get(key)
+        if found is not None:
+            return found
+
+        positions = {position: i for position, i in self.positions.items() if i in remaining}
+        found = {}
+        distances = {start: 0}
+        queue = deque([start])
+        while queue and len(found) < len(positions):
+            tile = queue.popleft()
+            for neighbour in self.grid.neighbours(*tile):
+                if neighbour in distances:
+                    continue
+                distances[neighbour] = distances[tile] + 1
+                index = positions.get(neighbour)
+                if index is not None:
+                    found[index] = (distances[tile], tile)
+                else:
+                    queue.append(neighbour)
+        self.found[key] = found
+        return found
+
+
+def play_level(level_data, routes, policy, rng, max_turns=MAX_TURNS):
+    """
+    Play a level from the starting position until the player wins or loses
+
+    Follows the game: health carries over from fight to fight, the player gets the
+    enemy's gold and may take one of its items, and goes back to the tile it
+    stepped from after a win.
+
+    Args:
+        level_data: The level's definition, left unchanged
+        routes: Routes of the level's map and enemies
+        policy: PlayerPolicy making the player's decisions
+        rng: Source of randomness with randint(), e.g. a random.Random
+        max_turns: Turns after which a fight is abandoned
+
+    Returns:
+        Dictionary with the 'outcome' (VICTORY, DEFEAT, STUCK or ABANDONED), the
+        'enemy' the run ended at (None for a victory), the 'fights' won, the 'steps'
+        walked, the combat 'turns', the player's 'health' and 'currency' at the end
+    """
+    player = level_data.get('player', {})
+    character_data = {
+        'name': player.get('name', 'Player'),
+        'health': player.get('health', 5),
+        'items': {slot: dict(item) for slot, item in player.get('items', {}).items()},
+        'currency': player.get('currency', 0)
+    }
+    enemies = [prepare_enemy(dict(enemy)) for enemy in level_data.get('enemies', [])]
+    remaining = tuple(range(len(enemies)))
+    start = level_data.get('starting_position', {})
+    position = (start.get('x', 2), start.get('y', 2))
+    result = {'outcome': VICTORY, 'enemy': None, 'fights': 0, 'steps': 0, 'turns': 0}
+
+    while remaining:
+        found = routes.find_enemies(position, remaining)
+        if not found:
+            result['outcome'] = STUCK
+            break
+        steps, index, enemy_data = policy.choose_enemy(
+            [(steps, index, enemies[index]) for index, (steps, _) in found.items()], character_data)
+        result['steps'] += steps
+        position = found[index][1]
+
+        state = CombatState.from_game(character_data, enemy_data)
+        while state.winner is None and state.turn < max_turns:
+            resolve_turn(state, policy.choose_action(state), rng)
+        result['turns'] += state.turn
+        character_data['health'] = state.player.health
+        if state.winner != PLAYER:
+            result['outcome'] = DEFEAT if state.winner == ENEMY else ABANDONED
+            result['enemy'] = enemy_data['name']
+            break
+
+        result['fights'] += 1
+        character_data['currency'] += gold_reward(enemy_data)
+        remaining = tuple(i for i in remaining if i != index)
+
+        loot = {
+            slot: item for slot, item in enemy_data['items'].items()
+            if slot in LOOT_SLOTS and item.get('name')
+        }
+        if loot:
+            slot = policy.choose_loot(loot, character_data)
+            if slot is not None:
+                character_data['items'][slot] = {'name': loot[slot]['name'], 'modifier': loot[slot]['modifier']}
+
+    result['health'] = character_data['health']
+    result['currency'] = character_data['currency']
+    return result
+
+
+def _play_runs(level_dir, runs, seed, policy, max_turns):
+    # Worker: play some of a level's runs and total them, so only counts are sent back
+    level_data, grid = load_level(level_dir)
+    routes = Routes(grid, level_data.get('enemies', []))
+    rng = random.Random(seed)
+    totals = {'runs': runs, 'outcomes': Counter(), 'ended_at': Counter(), 'health': Counter(),
+              'fights': 0, 'steps': 0, 'turns': 0, 'currency': 0}
+    for _ in range(runs):
+        result = play_level(level_data, routes, policy, rng, max_turns)
+        totals['outcomes'][result['outcome']] += 1
+        if result['enemy'] is not None:
+            totals['ended_at'][result['enemy']] += 1
+        if result['outcome'] == VICTORY:
+            totals['health'][result['health']] += 1
+        for field in ('fights', 'steps', 'turns', 'currency'):
+            totals[field] += result[field]
+    return totals
+
+
+def summarize(level_data, totals):
+    """
+    Turn the totals of a level's runs into difficulty metrics
+
+    Args:
+        level_data: The level's definition
+        totals: Totals of the runs, as returned by the workers and added up
+
+    Returns:
+        Dictionary with the level's 'id', the 'runs', the rate of each outcome, where
+        runs ended ('ended_at', by enemy), the means of 'fights', 'steps', 'turns' and
+        'currency' per run, the player's health after a victory, and the 'labelled'
+        and 'measured' difficulty
+    """
+    runs = totals['runs']
+    victories = totals['outcomes'][VICTORY]
+    win_rate = victories / runs if runs else 0.0
+    return {
+        'level': level_data.get('id'),
+        'runs': runs,
+        'win_rate': round(win_rate, 4),
+        'outcomes': {outcome: round(count / runs, 4) for outcome, count in sorted(totals['outcomes'].items())},
+        'ended_at': {name: round(count / runs, 4) for name, count in totals['ended_at'].most_common()},
+        'fights_mean': round(totals['fights'] / runs, 3) if runs else 0.0,
+        'steps_mean': round(totals['steps'] / runs, 3) if runs else 0.0,
+        'turns_mean': round(totals['turns'] / runs, 3) if runs else 0.0,
+        'currency_mean': round(totals['currency'] / runs, 3) if runs else 0.0,
+        'victory_health': {str(health): round(count / victories, 4)
+                           for health, count in sorted(totals['health'].items())},
+        'labelled': level_data.get('difficulty'),
+        'measured': difficulty_label(win_rate)
+    }
+
+
+def find_levels(levels_dir=LEVELS_DIR, level_ids=None):
+    """
+    Find the level directories to simulate
+
+    Args:
+        levels_dir: Directory containing the level directories
+        level_ids: Ids of the levels to include, or None for all
+
+    Returns:
+        List of (level directory, level data) in level directory order
+    """
+    levels = []
+    for name in sorted(os.listdir(levels_dir), key=natural_key):
+        level_json_path = os.path.join(levels_dir, name, "level.json")
+        if not os.path.exists(level_json_path):
+            continue
+        with open(level_json_path, 'r') as f:
+            level_data = json.load(f)
+        if level_ids and level_data.get('id') not in level_ids:
+            continue
+        levels.append((os.path.join(levels_dir, name), level_data))
+    return levels
+
+
+def simulate_levels(levels, runs=DEFAULT_RUNS, policy=POLICIES['solver'], seed=None,
+                    max_turns=MAX_TURNS, workers=None):
+    """
+    Play many runs of each level, spread over a process pool
+
+    Each level's runs are split into one batch per worker. Every batch has its own
+    random stream derived from the seed, so results only depend on the seed and
+    the number of workers.
+
+    Args:
+        levels: List of (level directory, level data), see find_levels()
+        runs: Runs per level
+        policy: PlayerPolicy, see POLICIES
+        seed: Seed of the random number generators, or None for random seeds
+        max_turns: Turns after which a fight is abandoned
+        workers: Number of worker processes, defaults to the number of CPUs
+
+    Returns:
+        List of summaries (see summarize()) in the order of levels
+    """
+    workers = workers or os.cpu_count() or 1
+    batches = min(workers, runs)
+    with concurrent.futures.ProcessPoolExecutor(
+            workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+        futures = []
+        for level_dir, _ in levels:
+            level_futures = []
+            for batch in range(batches):
+                batch_runs = runs // batches + (1 if batch < runs % batches else 0)
+                batch_seed = None if seed is None else f"{seed}:{os.path.basename(level_dir)}:{batch}"
+                level_futures.append(executor.submit(_play_runs, level_dir, batch_runs, batch_seed, policy, max_turns))
+            futures.append(level_futures)
+
+        summaries = []
+        for (_, level_data), level_futures in zip(levels, futures):
+            totals = None
+            for future in level_futures:
+                batch = future.result()
+                if totals is None:
+                    totals = batch
+                    continue
+                for field, value in batch.items():
+                    totals[field] += value
+            summaries.append(summarize(level_data, totals))
+    return summaries
+
+
+def main(argv=None):
+    """
+    Simulate whole runs of the installed levels and check their difficulty labels
+
+    Args:
+        argv: Command line arguments, defaults to sys.argv[1:]
+
+    Returns:
+        0 if every level's difficulty label matches the simulated one, otherwise 1
+    """
+    parser = argparse.ArgumentParser(description='Whole-level playthrough simulator')
+    parser.add_argument('--levels-dir', default=LEVELS_DIR, help='Directory containing the level directories')
+    parser.add_argument('--level', action='append', help='Id of a level to simulate (repeatable, default: all)')
+    parser.add_argument('--runs', type=int, default=DEFAULT_RUNS, help='Runs per level')
+    parser.add_argument('--policy', choices=sorted(POLICIES), default='solver', help="The player's strategy")
+    parser.add_argument('--seed', type=int, help='Seed for reproducible results')
+    parser.add_argument('--max-turns', type=int, default=MAX_TURNS, help='Turns after which a fight is abandoned')
+    parser.add_argument('--workers', type=int, help='Worker processes (default: one per CPU)')
+    parser.add_argument('--output', help='Write the results as JSON to this file')
+    args = parser.parse_args(argv)
+
+    levels = find_levels(args.levels_dir, args.level)
+    if not levels:
+        print("No levels found!")
+        return 1
+
+    start = time.perf_counter()
+    summaries = simulate_levels(levels, args.runs, POLICIES[args.policy], args.seed, args.max_turns, args.workers)
+    elapsed = time.perf_counter() - start
+
+    mismatches = 0
+    for summary in summaries:
+        ended_at = ', '.join(f"{name} {fraction * 100:.1f}%" for name, fraction in summary['ended_at'].items())
+        status = "ok" if summary['labelled'] == summary['measured'] else "MISMATCH"
+        if status != "ok":
+            mismatches += 1
+        print(f"{summary['level']:12} win {summary['win_rate'] * 100:6.2f}%  fights {summary['fights_mean']:4.2f}  "
+              f"steps {summary['steps_mean']:6.1f}  turns {summary['turns_mean']:5.2f}  "
+              f"labelled {summary['labelled']}, plays {summary['measured']}: {status}")
+        if ended_at:
+            print(f"{'':12} runs ended at: {ended_at}")
+    print(f"{len(levels) * args.runs} runs in {elapsed:.2f} s")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'policy': args.policy, 'runs': args.runs, 'results': summaries}, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    if mismatches:
+        print(f"{mismatches} level(s) don't play at their labelled difficulty")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,313 @@
+import concurrent.futures
+import os
+import queue
+
+import pygame
+
+from src.asset_manager import asset_manager, convert_image, decode_image, decoded_surface
+from src.level_bundle import (LevelBundle, bundle_images, bundle_path, compile_level, get_level_bundle,
+                              read_level_bundle, register_level_bundle)
+from src.level_catalog import level_catalog
+from src.map_cache import map_cache
+from src.map_renderer import UnsupportedMapError, convert_tileset_image, load_tmx
+from src.map_stream import is_infinite_map
+
+# Posted when a background job finishes, so idle screens wake up to collect it
+PRELOAD_EVENT = pygame.event.custom_type()
+
+LEVELS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "levels")
+
+
+class Preloader:
+    """
+    Loads level data on worker threads while the title and level selection screens
+    are shown.
+
+    Workers only do thread-safe work: compiling level bundles, decoding images with
+    Pillow and parsing maps without their tileset images. The results are handed
+    back through a queue and turned into surfaces on the main thread by pump().
+    Starting a preload for a different level cancels the work queued for the old one.
+    """
+    def __init__(self, workers=2):
+        """
+        Initialize the Preloader
+
+        Args:
+            workers: Number of worker threads
+        """
+        self.workers = workers
+        self.executor = None
+        self.results = queue.Queue()
+        self.generation = 0
+        self.futures = []
+        self.pending = set()
+        self.image_sizes = {}
+        self.image_requests = {}
+        self.level_dir = None
+        self.done = 0
+        self.total = 0
+        self.progress_callback = None
+
+    def set_progress_callback(self, callback):
+        """
+        Set a function to call when preloading progresses, e.g. to draw a loading bar
+
+        Args:
+            callback: Function taking (done, total) job counts, or None
+        """
+        self.progress_callback = callback
+
+    def progress(self):
+        """
+        Get the progress of the current preload
+
+        Returns:
+            Tuple of (done, total) job counts
+        """
+        return self.done, self.total
+
+    def is_loading(self):
+        """
+        Check if there is queued or unfinished work
+
+        Returns:
+            True while jobs of the current preload are outstanding
+        """
+        return self.done < self.total
+
+    def preload_levels(self, levels_dir=LEVELS_DIR):
+        """
+        Compile missing or out of date level bundles in the background
+
+        Level selection then opens the bundles without compiling them on the main thread.
+
+        Args:
+            levels_dir: Directory containing the level directories
+        """
+        self.cancel()
+        if not os.path.exists(levels_dir):
+            return
+        for name in sorted(os.listdir(levels_dir)):
+            level_dir = os.path.join(levels_dir, name)
+            if os.path.exists(os.path.join(level_dir, "level.json")):
+                self._submit(('bundle', level_dir), self._compile_bundle, None, level_dir)
+
+    def preload_level(self, level_data):
+        """
+        Start loading a level's images and map, e.g. when it is hovered
+
+        Nothing is done if the level is already being preloaded. Work already covered
+        by an open level bundle or the map cache is skipped.
+
+        Args:
+            level_data: Level definition with its 'directory'
+        """
+        level_dir = level_data['directory']
+        if level_dir == self.level_dir:
+            return
+        self.cancel()
+        self.level_dir = level_dir
+        self._queue_level(level_data)
+
+    def preload_entry(self, entry):
+        """
+        Start loading a level from its catalog entry, e.g. when it is hovered
+
+        The level's bundle is opened and checked on a worker thread, without compiling
+        it if it is missing or stale, then the level is preloaded like preload_level().
+
+        Args:
+            entry: Level summary from the level catalog
+        """
+        level_dir = entry['directory']
+        if level_dir == self.level_dir:
+            return
+        self.cancel()
+        self.level_dir = level_dir
+        self._submit(('level', level_dir), self._read_level, self._add_level, entry)
+
+    def request_image(self, path, size):
+        """
+        Get a cached image, or start decoding it in the background if it isn't cached
+
+        Used for thumbnails, which are not part of a level preload and are not
+        cancelled when another level is hovered.
+
+        Args:
+            path: Path to the image file
+            size: (width, height) to scale the image to, or None for its own size
+
+        Returns:
+            The image, or None until it has been loaded (or if it can't be)
+        """
+        if asset_manager.has_image(path, size):
+            return asset_manager.load_image(path, size)
+
+        key = (path, size)
+        if key not in self.image_requests:
+            if self.executor is None:
+                self.executor = concurrent.futures.ThreadPoolExecutor(self.workers, thread_name_prefix="preload")
+            self.image_requests[key] = self.executor.submit(
+                self._run, None, ('thumbnail', path, size), decode_image, self._add_thumbnail, (path,))
+        return None
+
+    def cancel_image(self, path, size):
+        """
+        Stop loading an image requested with request_image, e.g. when it scrolled out of view
+
+        Args:
+            path: Path to the image file
+            size: Size the image was requested at
+        """
+        future = self.image_requests.get((path, size))
+        if future is not None and future.cancel():
+            del self.image_requests[(path, size)]
+
+    def pump(self):
+        """
+        Collect finished jobs and create their surfaces on the main thread
+        """
+        progressed = False
+        while True:
+            try:
+                generation, key, finish, result = self.results.get_nowait()
+            except queue.Empty:
+                break
+            if generation is None:
+                # Thumbnail request, failed ones are not retried
+                if result is not None:
+                    del self.image_requests[key[1:]]
+            elif generation != self.generation:
+                continue
+            else:
+                self.pending.discard(key)
+                self.done += 1
+                progressed = True
+            if finish is not None and result is not None:
+                try:
+                    finish(*key[1:], result)
+                except Exception as e:
+                    print(f"Error preloading {key[1]}: {e}")
+
+        if progressed and self.progress_callback is not None:
+            self.progress_callback(self.done, self.total)
+
+    def wait(self):
+        """
+        Block until the current preload has finished and collect its results
+        """
+        concurrent.futures.wait(self.futures)
+        self.pump()
+
+    def cancel(self):
+        """
+        Drop the current preload: queued jobs don't start and finished ones are ignored
+        """
+        self.generation += 1
+        for future in self.futures:
+            future.cancel()
+        self.futures = []
+        self.pending.clear()
+        self.image_sizes = {}
+        self.level_dir = None
+        self.done = 0
+        self.total = 0
+
+    def _queue_level(self, level_data):
+        # Queue the images and map of a level that aren't loaded yet
+        level_dir = level_data['directory']
+        for path, sizes in bundle_images(level_data).items():
+            path = os.path.join(level_dir, path)
+            needed = [size for size in sizes if not asset_manager.has_image(path, size)]
+            if needed and os.path.exists(path):
+                self.image_sizes[path] = needed
+                self._submit(('image', path), decode_image, self._add_image, path)
+
+        map_path = os.path.join(level_dir, level_data['path'])
+        if (get_level_bundle(level_dir) is None and os.path.exists(map_path)
+                and not map_cache.has(map_path) and not is_infinite_map(map_path)):
+            self._submit(('map', map_path), self._parse_map, self._add_map, map_path)
+
+    def _submit(self, key, job, finish, *args):
+        if key in self.pending:
+            return
+        if self.executor is None:
+            self.executor = concurrent.futures.ThreadPoolExecutor(self.workers, thread_name_prefix="preload")
+        self.pending.add(key)
+        self.total += 1
+        self.futures.append(self.executor.submit(self._run, self.generation, key, job, finish, args))
+
+    def _run(self, generation, key, job, finish, args):
+        # Worker thread: skip cancelled work, queue the result and wake the main loop
+        result = None
+        if generation is None or generation == self.generation:
+            try:
+                result = job(*args)
+            except Exception as e:
+                print(f"Error preloading {key[1]}: {e}")
+        self.results.put((generation, key, finish, result))
+        if pygame.display.get_init():
+            pygame.event.post(pygame.event.Event(PRELOAD_EVENT))
+
+    def _compile_bundle(self, level_dir):
+        # Worker thread: only compile bundles that are missing or stale
+        path = bundle_path(level_dir)
+        if os.path.exists(path):
+            try:
+                if LevelBundle(path).is_current():
+                    return None
+            except Exception:
+                pass
+        return compile_level(level_dir)
+
+    def _read_level(self, entry):
+        # Worker thread: open the registered or an up to date bundle and read the level
+        bundle = get_level_bundle(entry['directory'])
+        if bundle is None or not bundle.is_current():
+            bundle = read_level_bundle(entry['directory'])
+        return bundle, level_catalog.read_level(entry, bundle)
+
+    def _add_level(self, level_dir, result):
+        # Main thread: use the bundle (or drop a stale one), then queue the level's images and map
+        bundle, level_data = result
+        register_level_bundle(level_dir, bundle)
+        self._queue_level(level_data)
+
+    def _parse_map(self, map_path):
+        # Worker thread: parse the map and decode its tileset images
+        mtime = os.path.getmtime(map_path)
+        try:
+            tmx_data = load_tmx(map_path, load_images=False)
+        except UnsupportedMapError:
+            # Loaded with pytmx when the map screen opens
+            return None
+        return mtime, tmx_data, [decode_image(tileset.source) for tileset in tmx_data.tilesets]
+
+    def _add_image(self, path, decoded):
+        # Main thread: cache the image at the sizes it is drawn at
+        image = decoded_surface(decoded)
+        for size in self.image_sizes.pop(path, []):
+            if size is None:
+                # Drawn at a size that depends on the map zoom, keep the decoded image
+                asset_manager.add_packed_images({(path, None): image})
+            elif not asset_manager.has_image(path, size):
+                scaled = image if image.get_size() == size else pygame.transform.scale(image, size)
+                asset_manager.add_image(path, size, convert_image(scaled))
+
+    def _add_thumbnail(self, path, size, decoded):
+        # Main thread: cache the image at the requested size (or its own size for None)
+        image = decoded_surface(decoded)
+        if size is not None and image.get_size() != size:
+            image = pygame.transform.scale(image, size)
+        asset_manager.add_image(path, size, convert_image(image))
+
+    def _add_map(self, map_path, result):
+        # Main thread: convert the tileset images and put the map in the map cache
+        mtime, tmx_data, tileset_images = result
+        for tileset, decoded in zip(tmx_data.tilesets, tileset_images):
+            tileset.image = convert_tileset_image(decoded_surface(decoded), tileset.colorkey)
+        map_cache.add(map_path, tmx_data, mtime)
+
+
+# Shared preloader used by the menu screens
+preloader = Preloader()
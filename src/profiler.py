@@ -0,0 +1,343 @@
+import csv
+import json
+import time
+from array import array
+from collections import deque
+
+import pygame
+
+from src.ui import get_font, render_text
+
+# Colours of the phases in the overlay, in the order they run on the map screen
+PHASE_COLOURS = {
+    'input': (80, 160, 255),
+    'movement': (80, 220, 120),
+    'card': (255, 200, 60),
+    'map': (60, 200, 200),
+    'entities': (240, 100, 100),
+    'text': (200, 120, 255),
+    'overlay': (120, 120, 120),
+    'flip': (255, 140, 40),
+}
+
+# Phases that aren't listed above get this colour
+OTHER_COLOUR = (220, 220, 220)
+
+# Frame time at the top of the overlay graph, in milliseconds
+GRAPH_MS = 33.3
+
+
+def percentile(values, fraction):
+    """
+    Get a percentile of a list of numbers (nearest rank)
+
+    Args:
+        values: The numbers
+        fraction: Percentile as a fraction, e.g. 0.95
+
+    Returns:
+        The value at that percentile, or 0 for an empty list
+    """
+    if not values:
+        return 0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class FrameProfiler:
+    """
+    Times named phases of each frame for the --debug overlay and --profile-output.
+
+    Screens call start_frame() at the top of their loop, wrap each phase in
+    begin()/end() (or the scope() context manager) and call end_frame() after the
+    frame scheduler's tick, so the time not covered by a phase is the time spent
+    waiting for the next frame. Time blocked waiting for input is left out with
+    exclude(), so an idle screen doesn't report a low frame rate. When disabled
+    every call returns straight away.
+    """
+    def __init__(self, history=120):
+        """
+        Initialize the FrameProfiler
+
+        Args:
+            history: Number of recent frames shown in the overlay
+        """
+        self.enabled = False
+        self.history = deque(maxlen=history)
+        self.screen = None
+        self.frame_start = None
+        self.starts = {}
+        self.current = {}
+        self.panel = None
+
+        # Every frame of the session, as columns of milliseconds
+        self.screens = []
+        self.frame_screens = array('H')
+        self.frame_times = array('f')
+        self.phase_times = {}
+
+    def set_enabled(self, enabled):
+        """
+        Turn timing on or off
+
+        Args:
+            enabled: True to time frames
+        """
+        self.enabled = enabled
+        self.frame_start = None
+
+    def start_frame(self, screen):
+        """
+        Start timing a frame
+
+        Args:
+            screen: Name of the screen drawing the frame, e.g. 'map'
+        """
+        if not self.enabled:
+            return
+        self.screen = screen
+        self.starts = {}
+        self.current = {}
+        self.frame_start = time.perf_counter()
+
+    def begin(self, phase):
+        """
+        Start timing a phase of the current frame
+
+        Args:
+            phase: Name of the phase, e.g. 'input'
+        """
+        if self.enabled:
+            self.starts[phase] = time.perf_counter()
+
+    def end(self, phase):
+        """
+        Stop timing a phase, adding its time to the current frame
+
+        Nothing is recorded if the phase wasn't started, e.g. when an exception
+        skipped its begin().
+
+        Args:
+            phase: Name of the phase
+        """
+        if not self.enabled:
+            return
+        start = self.starts.pop(phase, None)
+        if start is not None:
+            self.current[phase] = self.current.get(phase, 0.0) + (time.perf_counter() - start) * 1000
+
+    def exclude(self, seconds):
+        """
+        Leave time out of the current frame and the phases running during it, e.g.
+        the time the frame scheduler was blocked waiting for input while idle
+
+        Args:
+            seconds: Time to leave out
+        """
+        if not self.enabled or self.frame_start is None or not seconds:
+            return
+        self.frame_start += seconds
+        for phase in self.starts:
+            self.starts[phase] += seconds
+
+    def scope(self, phase):
+        """
+        Time a block of code as a phase
+
+        Args:
+            phase: Name of the phase
+
+        Returns:
+            Context manager that calls begin() and end()
+        """
+        return _Scope(self, phase)
+
+    def end_frame(self):
+        """
+        Finish the current frame and add it to the history and the session
+        """
+        if not self.enabled or self.frame_start is None:
+            return
+        frame_ms = (time.perf_counter() - self.frame_start) * 1000
+        self.frame_start = None
+
+        if self.screen not in self.screens:
+            self.screens.append(self.screen)
+        frame = len(self.frame_times)
+        for phase, times in self.phase_times.items():
+            times.append(self.current.get(phase, 0.0))
+        for phase, ms in self.current.items():
+            if phase not in self.phase_times:
+                # First time this phase ran, earlier frames spent no time in it
+                self.phase_times[phase] = array('f', [0.0] * frame + [ms])
+        self.frame_screens.append(self.screens.index(self.screen))
+        self.frame_times.append(frame_ms)
+        self.history.append((frame_ms, self.current))
+
+    def fps(self):
+        """
+        Get the frame rate over the recent frames
+
+        Returns:
+            Frames per second, or 0 before any frame was timed
+        """
+        total = sum(frame_ms for frame_ms, _ in self.history)
+        return len(self.history) * 1000 / total if total else 0.0
+
+    def averages(self):
+        """
+        Get the average time of each phase over the recent frames
+
+        Returns:
+            Dictionary of phase name to milliseconds, in the order phases first ran
+        """
+        totals = {}
+        for _, phases in self.history:
+            for phase, ms in phases.items():
+                totals[phase] = totals.get(phase, 0.0) + ms
+        return {phase: total / len(self.history) for phase, total in totals.items()}
+
+    def overlay_rect(self, x, y, width=360, height=100):
+        """
+        Get the area of the screen draw_overlay() covers
+
+        Args:
+            x, y, width, height: The arguments draw_overlay() is called with
+
+        Returns:
+            pygame Rect
+        """
+        return pygame.Rect(x - 10, y - 10, width + 20, height + 30 + 20 * len(self.averages()))
+
+    def draw_overlay(self, surface, x, y, width=360, height=100):
+        """
+        Draw the recent frames as stacked phase bars, with the average of each phase and the FPS
+
+        Args:
+            surface: Surface to draw on
+            x: Left of the overlay
+            y: Top of the graph, the legend is drawn below it
+            width: Width of the graph, one pixel column per frame (scaled to fit)
+            height: Height of the graph, GRAPH_MS at the top
+        """
+        if not self.enabled:
+            return
+        averages = self.averages()
+        font = get_font(16)
+        panel_size = self.overlay_rect(x, y, width, height).size
+        if self.panel is None or self.panel.get_size() != panel_size:
+            self.panel = pygame.Surface(panel_size, pygame.SRCALPHA)
+            self.panel.fill((0, 0, 0, 170))
+        surface.blit(self.panel, (x - 10, y - 10))
+
+        # Rolling graph, newest frame on the right, grey where no phase was running
+        scale = height / GRAPH_MS
+        column_width = max(1, width // self.history.maxlen)
+        left = x + width - column_width * len(self.history)
+        for i, (frame_ms, phases) in enumerate(self.history):
+            column_x = left + i * column_width
+            bottom = y + height
+            pygame.draw.rect(surface, (60, 60, 60), (column_x, bottom - min(height, int(frame_ms * scale)),
+                                                     column_width, min(height, int(frame_ms * scale))))
+            for phase, ms in phases.items():
+                bar = min(bottom - y, int(round(ms * scale)))
+                if bar:
+                    pygame.draw.rect(surface, PHASE_COLOURS.get(phase, OTHER_COLOUR),
+                                     (column_x, bottom - bar, column_width, bar))
+                    bottom -= bar
+
+        # Line at the 60 FPS frame budget
+        budget_y = y + height - int(1000 / 60 * scale)
+        pygame.draw.line(surface, (200, 200, 200), (x, budget_y), (x + width, budget_y))
+        pygame.draw.rect(surface, (150, 150, 150), (x, y, width, height), 1)
+
+        # Average time of each phase as a bar and a label
+        text_y = y + height + 8
+        fps_text = render_text(font, f"FPS: {self.fps():.1f}", (200, 200, 200))
+        surface.blit(fps_text, (x, text_y))
+        for phase, ms in averages.items():
+            text_y += 20
+            colour = PHASE_COLOURS.get(phase, OTHER_COLOUR)
+            surface.blit(render_text(font, f"{phase} {ms:.2f} ms", (200, 200, 200)), (x, text_y))
+            pygame.draw.rect(surface, colour, (x + 140, text_y + 3, min(width - 140, int(ms * scale * 4)), 10))
+
+    def summary(self):
+        """
+        Summarise the session's frames per screen
+
+        Returns:
+            Dictionary of screen name to frame count, total seconds, FPS, and the
+            mean/p50/p95/max milliseconds of the whole frame and of each phase
+        """
+        summary = {}
+        for index, screen in enumerate(self.screens):
+            frames = [i for i, frame_screen in enumerate(self.frame_screens) if frame_screen == index]
+            frame_times = [self.frame_times[i] for i in frames]
+            total = sum(frame_times)
+            phases = {'frame': _stats(frame_times)}
+            for phase, times in self.phase_times.items():
+                values = [times[i] for i in frames]
+                if any(values):
+                    phases[phase] = _stats(values)
+            summary[screen] = {
+                'frames': len(frames),
+                'seconds': round(total / 1000, 3),
+                'fps': round(len(frames) * 1000 / total, 1) if total else 0.0,
+                'ms': phases
+            }
+        return summary
+
+    def export(self, path):
+        """
+        Write the session's timings to a file
+
+        A .csv path gets one row per frame with the screen, the frame time and each
+        phase's time, any other path gets the JSON summary().
+
+        Args:
+            path: File to write
+        """
+        if not self.frame_times:
+            return
+        try:
+            if path.lower().endswith('.csv'):
+                phases = list(self.phase_times)
+                with open(path, 'w', newline='') as f:
+                    writer = csv.writer(f)
+                    writer.writerow(['frame', 'screen', 'frame_ms'] + [phase + '_ms' for phase in phases])
+                    for i, frame_ms in enumerate(self.frame_times):
+                        writer.writerow([i, self.screens[self.frame_screens[i]], round(frame_ms, 3)] +
+                                        [round(self.phase_times[phase][i], 3) for phase in phases])
+            else:
+                with open(path, 'w') as f:
+                    json.dump(self.summary(), f, indent=2)
+            print(f"Wrote frame profile of {len(self.frame_times)} frames to {path}")
+        except OSError as e:
+            print(f"Error writing frame profile {path}: {e}")
+
+
+class _Scope:
+    # Context manager returned by FrameProfiler.scope()
+    def __init__(self, profiler, phase):
+        self.profiler = profiler
+        self.phase = phase
+
+    def __enter__(self):
+        self.profiler.begin(self.phase)
+
+    def __exit__(self, *exc_info):
+        self.profiler.end(self.phase)
+
+
+def _stats(values):
+    # Mean, median, 95th percentile and maximum, rounded for the export
+    return {
+        'mean': round(sum(values) / len(values), 3) if values else 0.0,
+        'p50': round(percentile(values, 0.5), 3),
+        'p95': round(percentile(values, 0.95), 3),
+        'max': round(max(values), 3) if values else 0.0
+    }
+
+
+# Shared profiler used by the map and combat screens
+profiler = FrameProfiler()
@@ -0,0 +1,288 @@
+import gzip
+import json
+import time
+
+import pygame
+
+from src.frame_scheduler import frame_scheduler
+from src.session import session_random
+
+RECORDING_VERSION = 1
+
+# Input events that are recorded, by the name stored in the file, with the attributes kept.
+# Other events (window, preloader) only cause redraws and are left out.
+INPUT_EVENTS = {
+    'quit': (pygame.QUIT, ()),
+    'keydown': (pygame.KEYDOWN, ('key', 'mod', 'unicode', 'scancode')),
+    'keyup': (pygame.KEYUP, ('key', 'mod', 'unicode', 'scancode')),
+    'motion': (pygame.MOUSEMOTION, ('pos', 'rel', 'buttons')),
+    'buttondown': (pygame.MOUSEBUTTONDOWN, ('pos', 'button')),
+    'buttonup': (pygame.MOUSEBUTTONUP, ('pos', 'button')),
+    'wheel': (pygame.MOUSEWHEEL, ('x', 'y', 'flipped')),
+}
+EVENT_NAMES = {event_type: name for name, (event_type, _) in INPUT_EVENTS.items()}
+
+# Attributes pygame gives as tuples, stored as JSON lists
+TUPLE_ATTRIBUTES = ('pos', 'rel', 'buttons')
+
+# Frames between flushes of a recording, so a crash loses at most about a second of input
+FLUSH_FRAMES = 60
+
+
+class ReplayFinished(BaseException):
+    """
+    Raised from the replayed event source when the recorded input runs out, a
+    BaseException so the screens' error handling doesn't catch it
+    """
+    pass
+
+
+class HeldKeys:
+    """
+    Stand-in for pygame.key.get_pressed() with a set of held keys
+    """
+    def __init__(self, held=()):
+        self.held = set(held)
+
+    def __getitem__(self, key):
+        return key in self.held
+
+
+def encode_event(event):
+    """
+    Convert an input event to the list stored in a recording
+
+    Args:
+        event: pygame event of one of the INPUT_EVENTS types
+
+    Returns:
+        List of the event's name and attribute values
+    """
+    name = EVENT_NAMES[event.type]
+    return [name] + [getattr(event, attribute) for attribute in INPUT_EVENTS[name][1]]
+
+
+def decode_event(data):
+    """
+    Convert a recorded event back to a pygame event
+
+    Args:
+        data: List returned by encode_event(), after a round trip through JSON
+
+    Returns:
+        pygame event
+    """
+    event_type, attributes = INPUT_EVENTS[data[0]]
+    values = {
+        attribute: tuple(value) if attribute in TUPLE_ATTRIBUTES else value
+        for attribute, value in zip(attributes, data[1:])
+    }
+    return pygame.event.Event(event_type, values)
+
+
+class _InputHooks:
+    """
+    Base of InputRecorder and InputPlayer.
+
+    While installed, frame_scheduler.get_events and tick, pygame.mouse.get_pos and
+    pygame.key.get_pressed are replaced. The held keys and mouse position are
+    worked out from the input events both when recording and when replaying, and
+    every frame advances timers by the same fixed step, so the game sees exactly
+    the same input either way. Frames are counted by get_events calls.
+
+    Subclasses provide the replacements, _get_events() and _tick(busy, animating).
+    """
+    def __init__(self):
+        self.frame = 0
+        self.frame_ms = 1000 // frame_scheduler.fps
+        self.mouse_pos = (0, 0)
+        self.keys = HeldKeys()
+        self.originals = None
+
+    def install(self):
+        """
+        Start feeding the game's input through this object
+        """
+        self.originals = (frame_scheduler.get_events, frame_scheduler.tick, pygame.mouse.get_pos, pygame.key.get_pressed)
+        frame_scheduler.get_events = self._get_events
+        frame_scheduler.tick = self._tick
+        pygame.mouse.get_pos = lambda: self.mouse_pos
+        pygame.key.get_pressed = lambda: self.keys
+
+    def uninstall(self):
+        """
+        Put the original input functions back
+        """
+        if self.originals is not None:
+            (frame_scheduler.get_events, frame_scheduler.tick,
+             pygame.mouse.get_pos, pygame.key.get_pressed) = self.originals
+            self.originals = None
+
+    def _track(self, events):
+        # Follow the held keys and the mouse position from the events
+        held = self.keys.held
+        for event in events:
+            if event.type == pygame.KEYDOWN:
+                held = held | {event.key}
+            elif event.type == pygame.KEYUP:
+                held = held - {event.key}
+            elif event.type in (pygame.MOUSEMOTION, pygame.MOUSEBUTTONDOWN, pygame.MOUSEBUTTONUP):
+                self.mouse_pos = event.pos
+        if held != self.keys.held:
+            # A new object, so key states a screen read earlier stay as they were
+            self.keys = HeldKeys(held)
+
+
+class InputRecorder(_InputHooks):
+    """
+    Records a session's input events with their frame numbers, and its seed, to a
+    gzipped JSON lines file (.qqr) that InputPlayer can play back.
+
+    The first line holds the seed and settings, then there is one line per frame
+    with input and, once the session ends, a line with the number of frames and a
+    hash of the random number generator's state to check replays against.
+    """
+    def __init__(self, path, seed, settings=None):
+        """
+        Initialize the InputRecorder, creating the recording file
+
+        Args:
+            path: File to write
+            seed: Seed of the session's random number generator
+            settings: Dictionary of game settings to replay with, e.g. {'hints': True}
+        """
+        super().__init__()
+        self.path = path
+        self.file = gzip.open(path, 'wt', encoding='utf-8')
+        self.last_flush = 0
+        self._write({'version': RECORDING_VERSION, 'seed': seed, 'settings': settings or {},
+                     'frame_ms': self.frame_ms})
+
+    def _write(self, item):
+        self.file.write(json.dumps(item, separators=(',', ':')) + "\n")
+
+    def _get_events(self):
+        events = self.originals[0]()
+        self.frame += 1
+        recorded = [encode_event(event) for event in events if event.type in EVENT_NAMES]
+        if recorded:
+            self._write([self.frame, recorded])
+            if self.frame - self.last_flush >= FLUSH_FRAMES:
+                self.file.flush()
+                self.last_flush = self.frame
+        self._track(events)
+        return events
+
+    def _tick(self, busy=False, animating=False):
+        self.originals[1](busy, animating)
+        frame_scheduler.frame_time = self.frame_ms
+
+    def close(self):
+        """
+        Finish the recording, called when the game exits
+        """
+        if self.file is None:
+            return
+        self.uninstall()
+        try:
+            self._write({'frames': self.frame, 'rng': session_random.digest()})
+            self.file.close()
+            print(f"Recorded {self.frame} frames to {self.path}")
+        except OSError as e:
+            print(f"Error writing recording {self.path}: {e}")
+        self.file = None
+
+
+class InputPlayer(_InputHooks):
+    """
+    Plays a recorded session back.
+
+    Real input is ignored and the recorded events are delivered on the frames they
+    were recorded on. Frames aren't capped or paced, so the session runs as fast as
+    the game can draw it. When the input runs out, ReplayFinished is raised from
+    get_events.
+    """
+    def __init__(self, path):
+        """
+        Initialize the InputPlayer, reading the recording
+
+        Args:
+            path: Recording written by InputRecorder
+
+        Raises:
+            ValueError: If the file isn't a recording this version can play
+        """
+        super().__init__()
+        self.path = path
+        self.inputs = {}
+        self.expected = None
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            header = json.loads(f.readline() or 'null')
+            if not isinstance(header, dict) or header.get('version') != RECORDING_VERSION:
+                raise ValueError(f"{path} is not a version {RECORDING_VERSION} recording")
+            for line in f:
+                item = json.loads(line)
+                if isinstance(item, dict):
+                    self.expected = item
+                else:
+                    self.inputs[item[0]] = item[1]
+
+        self.seed = header['seed']
+        self.settings = header.get('settings', {})
+        self.frame_ms = header.get('frame_ms', self.frame_ms)
+        # Recordings cut short (e.g. the game was killed) end after their last input
+        if self.expected is not None:
+            self.last_frame = self.expected['frames']
+        else:
+            self.last_frame = max(self.inputs, default=0)
+        self.start_time = None
+
+    def install(self):
+        """
+        Start playing the recorded input
+        """
+        super().install()
+        self.start_time = time.perf_counter()
+
+    def _get_events(self):
+        if self.frame >= self.last_frame:
+            raise ReplayFinished()
+        self.frame += 1
+
+        # Keep the game's own events (preloading, window), replace the input
+        events = [event for event in pygame.event.get() if event.type not in EVENT_NAMES]
+        events.extend(decode_event(data) for data in self.inputs.get(self.frame, ()))
+        self._track(events)
+        return events
+
+    def _tick(self, busy=False, animating=False):
+        # No frame cap and no waiting for input, but the same game time per frame
+        frame_scheduler.clock.tick()
+        frame_scheduler.frame_time = self.frame_ms
+        frame_scheduler.wait_timeout = 0
+        frame_scheduler.total_frames += 1
+
+    def finish(self):
+        """
+        Stop playing and check the replay ended the way the recording did
+
+        Returns:
+            True if the same number of frames was played and the random number
+            generator ended in the same state, or the recording has nothing to
+            check against
+        """
+        self.uninstall()
+        elapsed = time.perf_counter() - self.start_time if self.start_time is not None else 0.0
+        fps = self.frame / elapsed if elapsed else 0.0
+        print(f"Replayed {self.frame} of {self.last_frame} frames in {elapsed:.2f} s ({fps:.0f} FPS)")
+
+        if self.expected is None:
+            print("The recording was cut short, there is no outcome to check against")
+            return True
+        digest = session_random.digest()
+        if self.frame == self.expected['frames'] and digest == self.expected['rng']:
+            print("Replay matches the recording")
+            return True
+        print(f"Replay diverged from the recording: frames {self.frame} (recorded {self.expected['frames']}), "
+              f"random state {digest} (recorded {self.expected['rng']})")
+        return False
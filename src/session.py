@@ -0,0 +1,53 @@
+import hashlib
+import random
+
+# Seeds are picked from this range when none is given, so they are easy to type in
+SEED_RANGE = 2 ** 32
+
+
+class SessionRandom(random.Random):
+    """
+    Random number generator of a game session.
+
+    Everything random in the game (the combat dice) draws from session_random
+    rather than the global random module, so a session can be played again from
+    its seed. Code that runs outside a session (simulators, tools) passes its own
+    random.Random instead.
+    """
+    def __init__(self):
+        """
+        Initialize the SessionRandom with a random seed
+        """
+        self.session_seed = None
+        super().__init__()
+        self.start()
+
+    def start(self, seed=None):
+        """
+        Start a session, seeding the generator
+
+        Args:
+            seed: Integer seed, or None to pick one
+
+        Returns:
+            The seed
+        """
+        if seed is None:
+            seed = random.SystemRandom().randrange(SEED_RANGE)
+        self.session_seed = seed
+        self.seed(seed)
+        return seed
+
+    def digest(self):
+        """
+        Get a short hash of the generator's state, equal for two sessions only if
+        they drew the same numbers from the same seed
+
+        Returns:
+            Hex string
+        """
+        return hashlib.sha1(repr(self.getstate()).encode()).hexdigest()[:16]
+
+
+# Shared random number generator of the current session
+session_random = SessionRandom()
@@ -1,26 +1,30 @@
 import pygame
 import sys
-from src.ui import WIDTH, HEIGHT, WHITE, BLACK, DARK_GRAY, BLUE, LIGHT_BLUE, GREEN, RED, YELLOW, GRAY, HIGHLIGHT
+from src.frame_scheduler import frame_scheduler
+from src.preloader import preloader
+from src.ui import WIDTH, HEIGHT, WHITE, BLACK, DARK_GRAY, BLUE, LIGHT_BLUE, GREEN, RED, YELLOW, GRAY, HIGHLIGHT, get_gradient_surface, get_font, render_text
 
 # Function to display title screen
 def title_screen(screen):
-    title_font = pygame.font.SysFont('Arial', 64, bold=True)
-    subtitle_font = pygame.font.SysFont('Arial', 32)
-    instruction_font = pygame.font.SysFont('Arial', 24)
+    title_font = get_font(64, bold=True)
+    subtitle_font = get_font(32)
+    instruction_font = get_font(24)
 
-    title_text = title_font.render("Q-Quest!", True, WHITE)
-    subtitle_text = subtitle_font.render("An Epic Adventure", True, LIGHT_BLUE)
-    instruction_text = instruction_font.render("Press SPACE to start or ESC to quit", True, WHITE)
+    title_text = render_text(title_font, "Q-Quest!", WHITE)
+    subtitle_text = render_text(subtitle_font, "An Epic Adventure", LIGHT_BLUE)
+    instruction_text = render_text(instruction_font, "Press SPACE to start or ESC to quit", WHITE)
 
     title_rect = title_text.get_rect(center=(WIDTH//2, HEIGHT//3))
     subtitle_rect = subtitle_text.get_rect(center=(WIDTH//2, HEIGHT//2))
     instruction_rect = instruction_text.get_rect(center=(WIDTH//2, HEIGHT*3//4))
 
+    # Compile level bundles while the title is shown
+    preloader.preload_levels()
+
     in_title_screen = True
-    clock = pygame.time.Clock()
 
     while in_title_screen:
-        for event in pygame.event.get():
+        for event in frame_scheduler.get_events():
             if event.type == pygame.QUIT:
                 pygame.quit()
                 sys.exit()
@@ -31,11 +35,11 @@ def title_screen(screen):
                 if event.key == pygame.K_SPACE:
                     in_title_screen = False
 
+        preloader.pump()
+
         # Create a gradient background
-        for y in range(HEIGHT):
-            # Calculate color gradient from dark blue to black
-            color_value = max(0, 50 - y // 10)
-            pygame.draw.line(screen, (0, 0, color_value), (0, y), (WIDTH, y))
+        # Gradient from dark blue to black
+        screen.blit(get_gradient_surface((WIDTH, HEIGHT), (0, 0, 50)), (0, 0))
 
         # Draw a decorative border
         pygame.draw.rect(screen, LIGHT_BLUE, (20, 20, WIDTH-40, HEIGHT-40), 3)
@@ -51,4 +55,5 @@ def title_screen(screen):
         instruction_text = instruction_font.render("Press SPACE to start or ESC to quit", True, (pulse_value, pulse_value, pulse_value))
 
         pygame.display.flip()
-        clock.tick(60)
\ No newline at end of file
+        # Only the pulsing prompt animates, so it doesn't need the full frame rate
+        frame_scheduler.tick(animating=True)
\ No newline at end of file
@@ -1,5 +1,10 @@
+from collections import OrderedDict
+
+import numpy
 import pygame
 
+from src.asset_manager import asset_manager
+
 
 WIDTH = 1280
 HEIGHT = 720
@@ -17,6 +22,102 @@ GRAY = (100, 100, 100)
 HIGHLIGHT = (170, 170, 255)
 
 
+# Fonts resolved so far, keyed by (face, size, bold)
+_fonts = {}
+
+# Rendered text surfaces, keyed by (font, text, colour) in least recently used order
+_text_cache = OrderedDict()
+TEXT_CACHE_SIZE = 512
+
+
+# Function to get a font from the registry
+def get_font(size, bold=False, face='Arial'):
+    """
+    Get a system font, resolving each (face, size, bold) only once
+
+    Args:
+        size: Font size in points
+        bold: Whether to use the bold variant
+        face: System font name
+
+    Returns:
+        A pygame Font
+    """
+    key = (face, size, bold)
+    font = _fonts.get(key)
+    if font is None:
+        font = pygame.font.SysFont(face, size, bold=bold)
+        _fonts[key] = font
+    return font
+
+
+# Function to render text through the text cache
+def render_text(font, text, color):
+    """
+    Render antialiased text, reusing the surface if the same text was rendered before
+
+    Args:
+        font: A font from get_font
+        text: The text to render
+        color: RGB colour of the text
+
+    Returns:
+        A pygame Surface with the text rendered on it
+    """
+    key = (font, text, tuple(color))
+    text_surface = _text_cache.get(key)
+    if text_surface is None:
+        text_surface = font.render(text, True, color)
+        _text_cache[key] = text_surface
+        if len(_text_cache) > TEXT_CACHE_SIZE:
+            _text_cache.popitem(last=False)
+    else:
+        _text_cache.move_to_end(key)
+    return text_surface
+
+
+# Rendered character cards, keyed by the fields they display
+_card_cache = OrderedDict()
+CARD_CACHE_SIZE = 16
+
+# Gradient surfaces generated so far, keyed by size and colour ramp
+_gradient_cache = {}
+
+
+# Function to get a cached vertical gradient surface
+def get_gradient_surface(size, top_color, rows_per_step=10):
+    """
+    Get a vertical gradient that darkens each colour channel by 1 every rows_per_step rows
+
+    Each (size, colour ramp) gradient is generated once with a vectorized surfarray
+    fill and cached, so screens only need to blit it.
+
+    Args:
+        size: (width, height) of the gradient
+        top_color: RGB colour of the top row
+        rows_per_step: Number of rows between each darkening step
+
+    Returns:
+        A pygame Surface with the gradient drawn on it
+    """
+    key = (tuple(size), tuple(top_color), rows_per_step)
+    gradient = _gradient_cache.get(key)
+    if gradient is None:
+        width, height = size
+        steps = numpy.arange(height) // rows_per_step
+        ramp = numpy.clip(numpy.array(top_color)[numpy.newaxis, :] - steps[:, numpy.newaxis], 0, 255)
+
+        gradient = pygame.Surface((width, height))
+        pixels = pygame.surfarray.pixels3d(gradient)
+        pixels[:, :, :] = ramp.astype(numpy.uint8)[numpy.newaxis, :, :]
+        del pixels  # Unlock the surface
+
+        if pygame.display.get_surface() is not None:
+            gradient = gradient.convert()
+        _gradient_cache[key] = gradient
+    return gradient
+
+
 # Function to calculate the required card height
 def calculate_card_height(item_y_start, item_height, item_spacing):
     # Calculate the height needed for the card based on content
@@ -32,7 +133,7 @@ class Button:
         self.text = text
         self.color = color
         self.hover_color = tuple(min(c + 30, 255) for c in color)
-        self.font = pygame.font.SysFont('Arial', 24)
+        self.font = get_font(24)
         self.is_hovered = False
         self.is_selected = False
 
@@ -62,17 +163,70 @@ class Button:
         pygame.draw.rect(surface, WHITE, self.rect, 2)
 
         # Draw text
-        text_surface = self.font.render(self.text, True, WHITE)
+        text_surface = render_text(self.font, self.text, WHITE)
         text_rect = text_surface.get_rect(center=self.rect.center)
         surface.blit(text_surface, text_rect)
 
 
 # Function to draw character card with multiple items and currency
 def draw_character_card(surface, character_data, x, y, width, height, health_level=5, is_enemy=False, image_path=None):
+    """
+    Draw a character card, reusing the previously rendered card if nothing on it changed
+
+    The card is rendered into an offscreen surface keyed on the fields it displays
+    (name, portrait, health, items, gold and size). Changing any of them invalidates
+    the card and it is rendered again, otherwise the cached surface is just blitted.
+    """
+    key = character_card_key(character_data, width, height, health_level, is_enemy, image_path)
+    card = _card_cache.get(key)
+    if card is None:
+        # The surface is one pixel wider than the card because the background gradient
+        # covers x to x + width inclusive
+        card = pygame.Surface((width + 1, height))
+        if pygame.display.get_surface() is not None:
+            card = card.convert()
+        render_character_card(card, character_data, 0, 0, width, height, health_level, is_enemy, image_path)
+        _card_cache[key] = card
+        if len(_card_cache) > CARD_CACHE_SIZE:
+            _card_cache.popitem(last=False)
+    else:
+        _card_cache.move_to_end(key)
+    surface.blit(card, (x, y))
+
+
+# Function to build the cache key for a character card from the fields it displays
+def character_card_key(character_data, width, height, health_level=5, is_enemy=False, image_path=None):
+    if image_path is None:
+        level = character_data.get('level')
+        level_dir = level.get('directory', '') if isinstance(level, dict) else None
+        image_path = f"{level_dir}/{character_data.get('image', None)}"
+
+    items = character_data.get('items')
+    if isinstance(items, dict):
+        item_fields = tuple(
+            (slot, item.get('name'), item.get('modifier'))
+            for slot, item in sorted(items.items())
+            if isinstance(item, dict)
+        )
+    else:
+        item_fields = None
+
+    return (
+        character_data.get('name'), image_path, health_level, is_enemy,
+        item_fields, character_data.get('currency', 0), width, height
+    )
+
+
+# Function to drop all cached character cards, e.g. after portraits change on disk
+def invalidate_character_cards():
+    _card_cache.clear()
+
+
+# Function to render a character card from scratch
+def render_character_card(surface, character_data, x, y, width, height, health_level=5, is_enemy=False, image_path=None):
     # Draw card background with gradient
-    for i in range(height):
-        color_value = max(0, 30 - i // 10)
-        pygame.draw.line(surface, (0, 0, color_value), (x, y + i), (x + width, y + i))
+    # (the gradient covers x to x + width inclusive, like the original line-by-line fill)
+    surface.blit(get_gradient_surface((width + 1, height), (0, 0, 30)), (x, y))
 
     # Draw card border
     border_color = RED if is_enemy else LIGHT_BLUE
@@ -88,6 +242,7 @@ def draw_character_card(surface, character_data, x, y, width, height, health_lev
     portrait_x = x + (width - portrait_width) // 2
     portrait_y = y + 60  # Below the name
 
+    portrait = None
     try:
         # Get image path from character_data if not provided
         if image_path is None:
@@ -98,24 +253,25 @@ def draw_character_card(surface, character_data, x, y, width, height, health_lev
         if image_path is None:
             image_path = "images/placeholder.png"
 
-        # Load and display portrait
-        portrait = pygame.image.load(image_path)
+        # Load portrait (decoded and scaled once by the asset manager, failures are remembered)
+        portrait = asset_manager.load_image(image_path, (portrait_width, portrait_height))
+    except Exception as e:
+        print(f"Error loading portrait: {e}")
 
-        portrait = pygame.transform.scale(portrait, (portrait_width, portrait_height))
+    if portrait:
         surface.blit(portrait, (portrait_x, portrait_y))
 
         # Adjust y position for health bar to be below portrait
         health_y = portrait_y + portrait_height + 10
-    except Exception as e:
-        print(f"Error loading portrait: {e}")
+    else:
         # Use a placeholder rectangle if image can't be loaded
         portrait_width = width - 20
         portrait_height = height // 3
         pygame.draw.rect(surface, (100, 100, 100), (x + 10, y + 40, portrait_width, portrait_height))
         health_y = y + 40 + portrait_height + 10
 
-    name_font = pygame.font.SysFont('Arial', 28, bold=True)
-    name_text = name_font.render(character_data["name"], True, WHITE)
+    name_font = get_font(28, bold=True)
+    name_text = render_text(name_font, character_data["name"], WHITE)
     name_rect = name_text.get_rect(center=(x + width//2, y + 30))
     surface.blit(name_text, name_rect)
 
@@ -137,8 +293,8 @@ def draw_character_card(surface, character_data, x, y, width, height, health_lev
 
     # Draw "Items:" label
     items_label_y = health_y + 30
-    items_font = pygame.font.SysFont('Arial', 22, bold=True)
-    items_text = items_font.render("Items:", True, WHITE)
+    items_font = get_font(22, bold=True)
+    items_text = render_text(items_font, "Items:", WHITE)
     items_rect = items_text.get_rect(midleft=(x + 20, items_label_y + 10))
     surface.blit(items_text, items_rect)
 
@@ -169,8 +325,8 @@ def draw_character_card(surface, character_data, x, y, width, height, health_lev
                 # Draw empty attack slot
                 pygame.draw.rect(surface, DARK_GRAY, (x + 20, item_y_start, width - 40, item_height))
                 pygame.draw.rect(surface, GRAY, (x + 20, item_y_start, width - 40, item_height), 1)
-                slot_font = pygame.font.SysFont('Arial', 16)
-                slot_text = slot_font.render("Empty Slot", True, GRAY)
+                slot_font = get_font(16)
+                slot_text = render_text(slot_font, "Empty Slot", GRAY)
                 slot_rect = slot_text.get_rect(center=(x + width//2, item_y_start + item_height//2))
                 surface.blit(slot_text, slot_rect)
 
@@ -190,8 +346,8 @@ def draw_character_card(surface, character_data, x, y, width, height, health_lev
                 # Draw empty defense slot
                 pygame.draw.rect(surface, DARK_GRAY, (x + 20, item_y_start + (item_height + item_spacing), width - 40, item_height))
                 pygame.draw.rect(surface, GRAY, (x + 20, item_y_start + (item_height + item_spacing), width - 40, item_height), 1)
-                slot_font = pygame.font.SysFont('Arial', 16)
-                slot_text = slot_font.render("Empty Slot", True, GRAY)
+                slot_font = get_font(16)
+                slot_text = render_text(slot_font, "Empty Slot", GRAY)
                 slot_rect = slot_text.get_rect(center=(x + width//2, item_y_start + (item_height + item_spacing) + item_height//2))
                 surface.blit(slot_text, slot_rect)
 
@@ -211,8 +367,8 @@ def draw_character_card(surface, character_data, x, y, width, height, health_lev
                 # Draw empty heal slot
                 pygame.draw.rect(surface, DARK_GRAY, (x + 20, item_y_start + 2 * (item_height + item_spacing), width - 40, item_height))
                 pygame.draw.rect(surface, GRAY, (x + 20, item_y_start + 2 * (item_height + item_spacing), width - 40, item_height), 1)
-                slot_font = pygame.font.SysFont('Arial', 16)
-                slot_text = slot_font.render("Empty Slot", True, GRAY)
+                slot_font = get_font(16)
+                slot_text = render_text(slot_font, "Empty Slot", GRAY)
                 slot_rect = slot_text.get_rect(center=(x + width//2, item_y_start + 2 * (item_height + item_spacing) + item_height//2))
                 surface.blit(slot_text, slot_rect)
 
@@ -237,8 +393,8 @@ def draw_character_card(surface, character_data, x, y, width, height, health_lev
                 pygame.draw.rect(surface, GRAY, (x + 20, item_y_start + i * (item_height + item_spacing), width - 40, item_height), 1)
 
                 # Draw "Empty Slot" text
-                slot_font = pygame.font.SysFont('Arial', 16)
-                slot_text = slot_font.render("Empty Slot", True, GRAY)
+                slot_font = get_font(16)
+                slot_text = render_text(slot_font, "Empty Slot", GRAY)
                 slot_rect = slot_text.get_rect(center=(x + width//2, item_y_start + i * (item_height + item_spacing) + item_height//2))
                 surface.blit(slot_text, slot_rect)
     else:
@@ -260,8 +416,8 @@ def draw_character_card(surface, character_data, x, y, width, height, health_lev
             # Draw empty attack slot
             pygame.draw.rect(surface, DARK_GRAY, (x + 20, item_y_start, width - 40, item_height))
             pygame.draw.rect(surface, RED, (x + 20, item_y_start, width - 40, item_height), 1)
-            slot_font = pygame.font.SysFont('Arial', 16)
-            slot_text = slot_font.render("No Attack Item", True, RED)
+            slot_font = get_font(16)
+            slot_text = render_text(slot_font, "No Attack Item", RED)
             slot_rect = slot_text.get_rect(center=(x + width//2, item_y_start + item_height//2))
             surface.blit(slot_text, slot_rect)
 
@@ -282,8 +438,8 @@ def draw_character_card(surface, character_data, x, y, width, height, health_lev
             # Draw empty defend slot
             pygame.draw.rect(surface, DARK_GRAY, (x + 20, item_y_start + item_height + item_spacing, width - 40, item_height))
             pygame.draw.rect(surface, BLUE, (x + 20, item_y_start + item_height + item_spacing, width - 40, item_height), 1)
-            slot_font = pygame.font.SysFont('Arial', 16)
-            slot_text = slot_font.render("No Defend Item", True, BLUE)
+            slot_font = get_font(16)
+            slot_text = render_text(slot_font, "No Defend Item", BLUE)
             slot_rect = slot_text.get_rect(center=(x + width//2, item_y_start + item_height + item_spacing + item_height//2))
             surface.blit(slot_text, slot_rect)
 
@@ -304,14 +460,14 @@ def draw_character_card(surface, character_data, x, y, width, height, health_lev
             # Draw empty heal slot
             pygame.draw.rect(surface, DARK_GRAY, (x + 20, item_y_start + 2 * (item_height + item_spacing), width - 40, item_height))
             pygame.draw.rect(surface, GREEN, (x + 20, item_y_start + 2 * (item_height + item_spacing), width - 40, item_height), 1)
-            slot_font = pygame.font.SysFont('Arial', 16)
-            slot_text = slot_font.render("No Heal Item", True, GREEN)
+            slot_font = get_font(16)
+            slot_text = render_text(slot_font, "No Heal Item", GREEN)
             slot_rect = slot_text.get_rect(center=(x + width//2, item_y_start + 2 * (item_height + item_spacing) + item_height//2))
             surface.blit(slot_text, slot_rect)
 
     # Draw currency at the bottom with "Gold: " label
-    currency_font = pygame.font.SysFont('Arial', 24, bold=True)
-    currency_text = currency_font.render(f"Gold: {character_data.get('currency', 0)}", True, YELLOW)
+    currency_font = get_font(24, bold=True)
+    currency_text = render_text(currency_font, f"Gold: {character_data.get('currency', 0)}", YELLOW)
 
     # Position currency 30px below the heal item
     currency_y = item_y_start + 3 * (item_height + item_spacing) + 30
@@ -334,8 +490,8 @@ def draw_item_button(surface, x, y, width, height, item_name, item_modifier, ite
     pygame.draw.rect(surface, WHITE, (x, y, width, height), 2)
 
     # Draw button text
-    font = pygame.font.SysFont('Arial', 20)
-    text = font.render(f"{item_name} (+{item_modifier})", True, WHITE)
+    font = get_font(20)
+    text = render_text(font, f"{item_name} (+{item_modifier})", WHITE)
     text_rect = text.get_rect(center=(x + width//2, y + height//2))
     surface.blit(text, text_rect)
 